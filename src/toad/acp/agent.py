@@ -3,7 +3,7 @@ import asyncio
 import json
 import os
 from pathlib import Path
-from typing import Any, cast, NamedTuple
+from typing import Any, Callable, cast, NamedTuple
 from copy import deepcopy
 
 import rich.repr
@@ -24,9 +24,20 @@ from toad.acp import messages
 from toad.acp.prompt import build as build_prompt
 from toad import constants
 from toad.answer import Answer
+from toad.acp.terminal import Command, TerminalProcess
+from toad.ansi import to_plain_text
+from toad.process_stats import ProcessSampler
+from toad.pty_pool import PTYPool
+from toad.session_store import SessionRecorder
 
 PROTOCOL_VERSION = 1
 
+RESOURCES_META_KEY = "toad/resources"
+"""Key in `_meta` for resources used by a terminal."""
+
+TERMINAL_SUMMARY_BYTES = 2048
+"""Bytes from the end of a terminal's output to keep in the recorded summary."""
+
 
 class Mode(NamedTuple):
     """An agent mode."""
@@ -40,12 +51,25 @@ class Mode(NamedTuple):
 class Agent(AgentBase):
     """An agent that speaks the APC (https://agentclientprotocol.com/overview/introduction) protocol."""
 
-    def __init__(self, project_root: Path, agent: AgentData) -> None:
+    def __init__(
+        self,
+        project_root: Path,
+        agent: AgentData,
+        *,
+        pty_pool: PTYPool | None = None,
+        get_terminal_size: Callable[[], tuple[int, int]] | None = None,
+        session_recorder: SessionRecorder | None = None,
+    ) -> None:
         """
 
         Args:
             project_root: Project root path.
             command: Command to launch agent.
+            pty_pool: Pool of pre-spawned terminals for agent commands, or `None` to
+                spawn terminals on demand.
+            get_terminal_size: Callable which returns the size of new terminals
+                (columns, rows), or `None` for 80x24.
+            session_recorder: Records the session, or `None` to not record.
         """
         super().__init__(project_root)
 
@@ -73,6 +97,12 @@ class Agent(AgentBase):
         self._message_target: MessagePump | None = None
 
         self._terminal_count: int = 0
+        self.terminals: dict[str, TerminalProcess] = {}
+        """Terminals created by the agent, which haven't been released."""
+        self._get_terminal_size = get_terminal_size
+        self.pty_pool = pty_pool
+        self.process_sampler = ProcessSampler()
+        self.session_recorder = session_recorder
 
     @property
     def command(self) -> str | None:
@@ -80,6 +110,13 @@ class Agent(AgentBase):
         acp_command = toad.get_os_matrix(self._agent_data["run_command"])
         return acp_command
 
+    @property
+    def terminal_size(self) -> tuple[int, int]:
+        """Size of new terminals (columns, rows)."""
+        if self._get_terminal_size is None:
+            return (80, 24)
+        return self._get_terminal_size()
+
     def __rich_repr__(self) -> rich.repr.Result:
         yield self.project_root_path
         yield self.command
@@ -111,6 +148,16 @@ class Agent(AgentBase):
         """Create a request object."""
         return API.request(self.send)
 
+    def record(self, kind: str, data: dict[str, Any]) -> None:
+        """Record an event in the session, if it is being recorded.
+
+        Args:
+            kind: The kind of event.
+            data: JSON serializable event data.
+        """
+        if self.session_recorder is not None:
+            self.session_recorder.record(kind, data)
+
     def post_message(self, message: Message) -> bool:
         """Post a message to the message target (the Conversation).
 
@@ -135,6 +182,23 @@ class Agent(AgentBase):
 
         https://agentclientprotocol.com/protocol/schema
         """
+        recorded_update: dict[str, Any] = update
+        match update:
+            case {
+                "sessionUpdate": "tool_call_update",
+                "toolCallId": tool_call_id,
+                "content": content,
+            } if (
+                content is not None
+                and (tool_call := self.tool_calls.get(tool_call_id)) is not None
+                and tool_call.get("content") == content
+            ):
+                # Updates are merged on replay, so don't store unchanged content
+                # (which may contain large diffs) again
+                recorded_update = {
+                    key: value for key, value in update.items() if key != "content"
+                }
+        self.record("update", recorded_update)
         status_line: str | None = None
         if _meta and (field_meta := _meta.get("field_meta")) is not None:
             if (
@@ -225,12 +289,15 @@ class Agent(AgentBase):
         """
         result_future: asyncio.Future[Answer] = asyncio.Future()
         tool_call_id = toolCall["toolCallId"]
+        recorded: dict[str, Any] = {"toolCallId": tool_call_id}
         if tool_call_id not in self.tool_calls:
             permission_tool_call = toolCall.copy()
             permission_tool_call.pop("sessionUpdate", None)
             tool_call = cast(protocol.ToolCall, permission_tool_call)
             self.tool_calls[tool_call_id] = deepcopy(tool_call)
+            recorded["toolCall"] = tool_call
         else:
+            # Already recorded in updates, so refer to it by ID
             tool_call = deepcopy(self.tool_calls[tool_call_id])
 
         message = messages.RequestPermission(options, tool_call, result_future)
@@ -238,6 +305,9 @@ class Agent(AgentBase):
         self.post_message(message)
         await result_future
         ask_result = result_future.result()
+        self.record(
+            "permission", {**recorded, "options": options, "optionId": ask_result.id}
+        )
 
         request_permission_outcome: protocol.OutcomeSelected = {
             "optionId": ask_result.id,
@@ -280,6 +350,23 @@ class Agent(AgentBase):
         write_path = self.project_root_path / path
         write_path.write_text(content, encoding="utf-8", errors="ignore")
 
+    def get_terminal(self, terminal_id: str) -> TerminalProcess:
+        """Get a terminal from its id.
+
+        Args:
+            terminal_id: ID of the terminal.
+
+        Raises:
+            jsonrpc.InvalidParams: If there is no terminal with the given id.
+
+        Returns:
+            Terminal process.
+        """
+        try:
+            return self.terminals[terminal_id]
+        except KeyError:
+            raise jsonrpc.InvalidParams(f"No terminal with id {terminal_id!r}") from None
+
     # https://agentclientprotocol.com/protocol/schema#createterminalrequest
     @jsonrpc.expose("terminal/create")
     async def rpc_terminal_create(
@@ -299,21 +386,27 @@ class Agent(AgentBase):
         terminal_env = (
             {variable["name"]: variable["value"] for variable in env} if env else {}
         )
-        result_future: asyncio.Future[bool] = asyncio.Future()
-        self.post_message(
-            messages.CreateTerminal(
-                terminal_id,
-                command=command,
-                args=args,
-                cwd=cwd,
-                env=terminal_env,
-                output_byte_limit=outputByteLimit,
-                result_future=result_future,
-            )
+        terminal_command = Command(
+            command,
+            args or [],
+            terminal_env,
+            cwd or str(self.project_root_path),
         )
-        await result_future
-        if not result_future.result():
+        terminal = TerminalProcess(
+            terminal_id,
+            terminal_command,
+            output_byte_limit=outputByteLimit,
+            size=self.terminal_size,
+            pty_pool=self.pty_pool,
+            process_sampler=self.process_sampler,
+        )
+        try:
+            await terminal.start()
+        except Exception as error:
+            log.error("Failed to create terminal", error)
             raise jsonrpc.JSONRPCError("Failed to create a terminal.")
+        self.terminals[terminal_id] = terminal
+        self.post_message(messages.TerminalCreated(terminal))
         return {"terminalId": terminal_id}
 
     # https://agentclientprotocol.com/protocol/schema#killterminalcommandrequest
@@ -321,7 +414,7 @@ class Agent(AgentBase):
     def rpc_terminal_kill(
         self, sessionID: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.KillTerminalCommandResponse:
-        self.post_message(messages.KillTerminal(terminalId))
+        self.get_terminal(terminalId).kill()
         return {}
 
     # https://agentclientprotocol.com/protocol/schema#terminal%2Foutput
@@ -329,22 +422,21 @@ class Agent(AgentBase):
     async def rpc_terminal_output(
         self, sessionId: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.TerminalOutputResponse:
-        from toad.widgets.terminal_tool import ToolState
-
-        result_future: asyncio.Future[ToolState] = asyncio.Future()
-
-        if not self.post_message(messages.GetTerminalState(terminalId, result_future)):
-            raise RuntimeError("Unable to get terminal output")
-
-        await result_future
-        terminal_state = result_future.result()
+        terminal = self.get_terminal(terminalId)
+        # The output may be large, and read from disk
+        terminal_state = await asyncio.to_thread(lambda: terminal.tool_state)
 
         result: protocol.TerminalOutputResponse = {
             "output": terminal_state.output,
             "truncated": terminal_state.truncated,
         }
-        if (return_code := terminal_state.return_code) is not None:
-            result["exitStatus"] = {"exitCode": return_code}
+        if terminal_state.return_code is not None or terminal_state.signal is not None:
+            result["exitStatus"] = {
+                "exitCode": terminal_state.return_code,
+                "signal": terminal_state.signal,
+            }
+        if (process_stats := terminal_state.process_stats) is not None:
+            result["_meta"] = {RESOURCES_META_KEY: process_stats.to_meta()}
         return result
 
     # https://agentclientprotocol.com/protocol/schema#terminal%2Frelease
@@ -352,7 +444,9 @@ class Agent(AgentBase):
     def rpc_terminal_release(
         self, sessionId: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.ReleaseTerminalResponse:
-        self.post_message(messages.ReleaseTerminal(terminalId))
+        if (terminal := self.terminals.pop(terminalId, None)) is not None:
+            self.record_terminal(terminal)
+            terminal.release()
         return {}
 
     # https://agentclientprotocol.com/protocol/schema#terminal%2Fwait-for-exit
@@ -360,15 +454,39 @@ class Agent(AgentBase):
     async def rpc_terminal_wait_for_exit(
         self, sessionId: str, terminalId: str, _meta: dict | None = None
     ) -> protocol.WaitForTerminalExitResponse:
-        result_future: asyncio.Future[tuple[int, str | None]] = asyncio.Future()
-        if not self.post_message(
-            messages.WaitForTerminalExit(terminalId, result_future)
-        ):
-            raise RuntimeError("Unable to wait for terminal exit; no terminal found")
+        terminal = self.get_terminal(terminalId)
+        return_code, signal = await terminal.wait_for_exit()
+        result: protocol.WaitForTerminalExitResponse = {
+            "exitCode": return_code,
+            "signal": signal,
+        }
+        if (process_stats := terminal.process_stats) is not None:
+            result["_meta"] = {RESOURCES_META_KEY: process_stats.to_meta()}
+        return result
 
-        await result_future
-        return_code, signal = result_future.result()
-        return {"exitCode": return_code, "signal": signal}
+    def record_terminal(self, terminal: TerminalProcess) -> None:
+        """Record a summary of a terminal in the session.
+
+        Args:
+            terminal: A terminal created by the agent.
+        """
+        if self.session_recorder is None:
+            return
+        summary: dict[str, Any] = {
+            "terminalId": terminal.terminal_id,
+            "command": str(terminal.command),
+            "cwd": terminal.command.cwd,
+            "exitCode": terminal.exit_code,
+            "signal": terminal.signal,
+            "outputBytes": terminal.output.size,
+            "outputLines": terminal.output.line_count,
+            "output": to_plain_text(
+                terminal.output.tail(TERMINAL_SUMMARY_BYTES).decode("utf-8", "replace")
+            ),
+        }
+        if (process_stats := terminal.process_stats) is not None:
+            summary["resources"] = process_stats.to_meta()
+        self.record("terminal", summary)
 
     async def _run_agent(self) -> None:
         """Task to communicate with the agent subprocess."""
@@ -489,6 +607,12 @@ class Agent(AgentBase):
 
     async def stop(self) -> None:
         """Gracefully stop the process."""
+        for terminal in self.terminals.values():
+            self.record_terminal(terminal)
+            terminal.release()
+        self.terminals.clear()
+        if self.pty_pool is not None:
+            self.pty_pool.close()
         if self._process is not None:
             self._process.terminate()
 
@@ -520,6 +644,7 @@ class Agent(AgentBase):
         Args:
             prompt: Prompt text.
         """
+        self.record("prompt", {"text": prompt})
         prompt_content_blocks = await asyncio.to_thread(
             build_prompt, self.project_root_path, prompt
         )
@@ -563,6 +688,9 @@ class Agent(AgentBase):
         response = await session_new_response.wait()
         assert response is not None
         self.session_id = response["sessionId"]
+        self.record(
+            "session", {"sessionId": self.session_id, "agent": self._agent_data["name"]}
+        )
         if (modes := response.get("modes", None)) is not None:
             current_mode = modes["currentModeId"]
             available_modes = modes["availableModes"]
@@ -587,7 +715,9 @@ class Agent(AgentBase):
             session_prompt = api.session_prompt(prompt, self.session_id)
         result = await session_prompt.wait()
         assert result is not None
-        return result.get("stopReason")
+        stop_reason = result.get("stopReason")
+        self.record("stop", {"stopReason": stop_reason})
+        return stop_reason
 
     async def acp_session_set_mode(self, mode_id: str) -> str | None:
         """Update the current mode with the agent."""
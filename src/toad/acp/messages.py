@@ -3,7 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 from asyncio import Future
-from typing import Any, Mapping, TYPE_CHECKING
+from typing import Any, TYPE_CHECKING
 from textual.message import Message
 
 import rich.repr
@@ -14,7 +14,7 @@ from toad.acp.encode_tool_call_id import encode_tool_call_id
 from toad.acp.agent import Mode
 
 if TYPE_CHECKING:
-    from toad.widgets.terminal_tool import ToolState
+    from toad.acp.terminal import TerminalProcess
 
 
 class AgentMessage(Message):
@@ -80,46 +80,15 @@ class AvailableCommandsUpdate(AgentMessage):
 
 
 @dataclass
-class CreateTerminal(AgentMessage):
-    """Request a terminal in the conversation."""
+class TerminalCreated(AgentMessage):
+    """The agent created a terminal, which may be displayed in the conversation."""
 
-    terminal_id: str
-    command: str
-    result_future: Future[bool]
-    args: list[str] | None = None
-    cwd: str | None = None
-    env: Mapping[str, str] | None = None
-    output_byte_limit: int | None = None
+    process: TerminalProcess
 
-
-@dataclass
-class KillTerminal(AgentMessage):
-    """Kill a terminal process."""
-
-    terminal_id: str
-
-
-@dataclass
-class GetTerminalState(AgentMessage):
-    """Get the state of the terminal."""
-
-    terminal_id: str
-    result_future: Future[ToolState]
-
-
-@dataclass
-class ReleaseTerminal(AgentMessage):
-    """Release the terminal."""
-
-    terminal_id: str
-
-
-@dataclass
-class WaitForTerminalExit(AgentMessage):
-    """Wait for the terminal to exit."""
-
-    terminal_id: str
-    result_future: Future[tuple[int, str | None]]
+    @property
+    def terminal_id(self) -> str:
+        """ID of the terminal."""
+        return self.process.terminal_id
 
 
 @rich.repr.auto
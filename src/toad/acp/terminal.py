@@ -0,0 +1,393 @@
+"""
+Terminals created by the agent (https://agentclientprotocol.com/protocol/terminals).
+
+The process, its output, and its exit status are owned by the ACP layer, so the
+JSON-RPC handlers may respond without a round-trip through the UI. Widgets subscribe to
+the output for display only.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+from asyncio.subprocess import Process
+from dataclasses import dataclass
+import fcntl
+import os
+import pty
+import shlex
+import signal
+import struct
+import termios
+from typing import Mapping, TYPE_CHECKING
+
+from textual import log
+
+from toad.output_spool import OutputSpool
+from toad.process_stats import ProcessStats
+from toad.shell_read import shell_read
+
+if TYPE_CHECKING:
+    from toad.process_stats import ProcessSampler
+    from toad.pty_pool import PTYPool
+
+
+SPOOL_MEMORY_LIMIT = 1024 * 1024
+"""Maximum output (in bytes) to keep in memory; the remainder is on disk."""
+
+READ_BUFFER_SIZE = 64 * 1024 * 2
+"""Size of the buffer used to read from the pty."""
+
+
+@dataclass
+class Command:
+    """A command and corresponding environment."""
+
+    command: str
+    """Command to run."""
+    args: list[str]
+    """List of arguments."""
+    env: Mapping[str, str]
+    """Environment variables."""
+    cwd: str
+    """Current working directory."""
+
+    def __str__(self) -> str:
+        command_str = shlex.join([self.command, *self.args]).strip("'")
+        return command_str
+
+
+@dataclass
+class ToolState:
+    """Current state of the terminal."""
+
+    output: str
+    truncated: bool
+    return_code: int | None = None
+    signal: str | None = None
+    process_stats: ProcessStats | None = None
+
+
+def resize_pty(fd: int, columns: int, rows: int) -> None:
+    """Resize a pseudo terminal.
+
+    Args:
+        fd: File descriptor.
+        columns: Columns (width).
+        rows: Rows (height).
+    """
+    # Pack the dimensions into the format expected by TIOCSWINSZ
+    size = struct.pack("HHHH", rows, columns, 0, 0)
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
+
+
+class TerminalProcess:
+    """A command running in a pseudo terminal, on behalf of the agent."""
+
+    def __init__(
+        self,
+        terminal_id: str,
+        command: Command,
+        *,
+        output_byte_limit: int | None = None,
+        size: tuple[int, int] = (80, 24),
+        pty_pool: PTYPool | None = None,
+        process_sampler: ProcessSampler | None = None,
+    ) -> None:
+        """
+
+        Args:
+            terminal_id: ID of the terminal, as reported to the agent.
+            command: Command to run.
+            output_byte_limit: Maximum bytes of output to report to the agent, or `None` for no limit.
+            size: Initial size of the terminal (columns, rows).
+            pty_pool: Pool of pre-spawned terminals, or `None` to spawn a new terminal.
+            process_sampler: Sampler for resource usage, or `None` for no sampling.
+        """
+        self.terminal_id = terminal_id
+        self.command = command
+        self.output_byte_limit = output_byte_limit
+        self.size = size
+        self._pty_pool = pty_pool
+        self._process_sampler = process_sampler
+
+        self.output = OutputSpool(SPOOL_MEMORY_LIMIT)
+        self._process: Process | None = None
+        self._master_fd: int | None = None
+        self._task: asyncio.Task | None = None
+        self._return_code: int | None = None
+        self._process_stats: ProcessStats | None = None
+        self._released = False
+        self._display_count = 0
+        self._output_condition = asyncio.Condition()
+        self._eof = False
+        self._exit_event = asyncio.Event()
+
+    def __repr__(self) -> str:
+        return f"TerminalProcess({self.terminal_id!r}, {str(self.command)!r})"
+
+    @property
+    def return_code(self) -> int | None:
+        """The command return code, or `None` if not yet exited."""
+        return self._return_code
+
+    @property
+    def signal(self) -> str | None:
+        """Name of the signal which terminated the process, or `None`."""
+        if self._return_code is None or self._return_code >= 0:
+            return None
+        try:
+            return signal.Signals(-self._return_code).name
+        except ValueError:
+            return None
+
+    @property
+    def exit_code(self) -> int | None:
+        """The exit code as reported to the agent (`None` if terminated by a signal)."""
+        if self._return_code is None or self._return_code < 0:
+            return None
+        return self._return_code
+
+    @property
+    def has_exited(self) -> bool:
+        """Has the process exited?"""
+        return self._exit_event.is_set()
+
+    @property
+    def released(self) -> bool:
+        """Has the terminal been released by the agent?"""
+        return self._released
+
+    @property
+    def process_stats(self) -> ProcessStats | None:
+        """Resources used by the process, or `None` if not yet sampled."""
+        return self._process_stats
+
+    @property
+    def tool_state(self) -> ToolState:
+        """Get the current terminal state."""
+        output, truncated = self.get_output()
+        return ToolState(
+            output=output,
+            truncated=truncated,
+            return_code=self.exit_code,
+            signal=self.signal,
+            process_stats=self.process_stats,
+        )
+
+    async def start(self) -> None:
+        """Start the process.
+
+        Returns once the process is running, and output is being read in the background.
+        """
+        master, process = await self._spawn()
+        self._master_fd = master
+        self._process = process
+        if self._process_sampler is not None:
+            self._process_sampler.add(process.pid, self._update_process_stats)
+        self._task = asyncio.create_task(
+            self._run(master, process), name=f"Terminal {self.command}"
+        )
+
+    async def _spawn(self) -> tuple[int, Process]:
+        """Spawn the process in a pty.
+
+        Returns:
+            A tuple of the master file descriptor, and the process.
+        """
+        command = self.command
+        if " " in command.command:
+            run_command = command.command
+        else:
+            run_command = f"{command.command} {shlex.join(command.args)}"
+        columns, rows = self.size
+
+        if self._pty_pool is not None:
+            pooled_terminal = await self._pty_pool.acquire()
+            # Resize before exec, so the command sees the correct size
+            resize_pty(pooled_terminal.master, columns, rows)
+            pooled_terminal.exec(run_command, command.cwd, command.env)
+            return pooled_terminal.master, pooled_terminal.process
+
+        shell = os.environ.get("SHELL", "sh")
+        run_command = shlex.join([shell, "-c", run_command])
+
+        master, slave = pty.openpty()
+        flags = fcntl.fcntl(master, fcntl.F_GETFL)
+        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        resize_pty(master, columns, rows)
+        try:
+            process = await asyncio.create_subprocess_shell(
+                run_command,
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                env=os.environ | command.env,
+                cwd=command.cwd,
+            )
+        except Exception:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        return master, process
+
+    async def _run(self, master: int, process: Process) -> None:
+        """Read output until the process exits."""
+        reader = asyncio.StreamReader(READ_BUFFER_SIZE)
+        protocol = asyncio.StreamReaderProtocol(reader)
+        loop = asyncio.get_running_loop()
+        try:
+            transport, _ = await loop.connect_read_pipe(
+                lambda: protocol, os.fdopen(master, "rb", 0)
+            )
+            try:
+                while data := await shell_read(reader, READ_BUFFER_SIZE):
+                    self.output.write(data)
+                    async with self._output_condition:
+                        self._output_condition.notify_all()
+            finally:
+                transport.close()
+            self._return_code = await process.wait()
+        except Exception as error:
+            log.error(f"{self!r} failed", error)
+            if self._return_code is None:
+                self._return_code = process.returncode
+        finally:
+            if self._process_sampler is not None:
+                if (
+                    process_stats := self._process_sampler.remove(process.pid)
+                ) is not None:
+                    self._process_stats = process_stats
+            self._eof = True
+            async with self._output_condition:
+                self._output_condition.notify_all()
+            self._exit_event.set()
+
+    def _update_process_stats(self, process_stats: ProcessStats) -> None:
+        """Called by the process sampler with new stats.
+
+        Args:
+            process_stats: Resources used by the process tree.
+        """
+        self._process_stats = process_stats
+
+    async def read(self, offset: int, size: int = READ_BUFFER_SIZE) -> bytes:
+        """Read output, waiting for more if required.
+
+        Multiple readers may read concurrently, each with their own offset.
+
+        Args:
+            offset: Offset in the output to read from.
+            size: Maximum number of bytes to read.
+
+        Returns:
+            Bytes, or empty bytes if there will be no more output.
+        """
+        output = self.output
+        if offset >= output.size and not self._eof:
+            async with self._output_condition:
+                await self._output_condition.wait_for(
+                    lambda: offset < output.size or self._eof
+                )
+        return output.read(offset, offset + size)
+
+    async def wait_for_exit(self) -> tuple[int | None, str | None]:
+        """Wait for the process to exit.
+
+        Returns:
+            A tuple of the exit code and signal name.
+        """
+        if self._task is None:
+            return None, None
+        await self._exit_event.wait()
+        return self.exit_code, self.signal
+
+    def resize(self, columns: int, rows: int) -> None:
+        """Resize the terminal.
+
+        Args:
+            columns: Columns (width).
+            rows: Rows (height).
+        """
+        self.size = (columns, rows)
+        if self._master_fd is not None and not self.has_exited:
+            try:
+                resize_pty(self._master_fd, columns, rows)
+            except OSError:
+                pass
+
+    def kill(self) -> bool:
+        """Kill the process.
+
+        Returns:
+            Returns `True` if the process was killed, or `False` if there
+                was no running process.
+        """
+        if self._process is None or self.has_exited:
+            return False
+        try:
+            self._process.kill()
+        except Exception:
+            return False
+        return True
+
+    def release(self) -> None:
+        """Release the terminal (may no longer be used from ACP).
+
+        The output is discarded once there are no displays attached.
+        """
+        self.kill()
+        self._released = True
+        self._check_close()
+
+    def attach_display(self) -> None:
+        """Keep the output while it is being displayed."""
+        self._display_count += 1
+
+    def detach_display(self) -> None:
+        """The output is no longer being displayed."""
+        self._display_count -= 1
+        self._check_close()
+
+    def _check_close(self) -> None:
+        """Discard the output if it is no longer required."""
+        if self._released and self._display_count <= 0:
+            self.output.close()
+
+    def get_output(self) -> tuple[str, bool]:
+        """Get the output, truncated to the output byte limit.
+
+        Returns:
+            A tuple of the output and a bool to indicate if the output was truncated.
+        """
+        output_limit = self.output_byte_limit
+        if output_limit is None:
+            output_bytes = self.output.read()
+        else:
+            output_bytes = self.output.tail(output_limit)
+
+        def is_continuation(byte_value: int) -> bool:
+            """Check if the given byte is a utf-8 continuation byte.
+
+            Args:
+                byte_value: Ordinal of the byte.
+
+            Returns:
+                `True` if the byte is a continuation, or `False` if it is the start of a character.
+            """
+            return (byte_value & 0b11000000) == 0b10000000
+
+        truncated = False
+        if output_limit is not None and self.output.size > output_limit:
+            truncated = True
+            # Must start on a utf-8 boundary
+            # Discard initial bytes that aren't a utf-8 continuation byte.
+            for offset, byte_value in enumerate(output_bytes):
+                if not is_continuation(byte_value):
+                    if offset:
+                        output_bytes = output_bytes[offset:]
+                    break
+
+        output = output_bytes.decode("utf-8", "replace")
+        return output, truncated
@@ -1 +1,3 @@
 from toad.ansi._ansi import TerminalState as TerminalState
+from toad.ansi._plain_text import PlainTextDecoder as PlainTextDecoder
+from toad.ansi._plain_text import to_plain_text as to_plain_text
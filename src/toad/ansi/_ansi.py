@@ -337,6 +337,56 @@ class ANSIWorkingDirectory(NamedTuple):
         yield self.path
 
 
+# Not technically part of the terminal protocol
+@rich.repr.auto
+class ANSICommandMarker(NamedTuple):
+    """A shell command started or finished (OSC 133 "C" and "D" markers)."""
+
+    marker: Literal["start", "end"]
+    """Start or end of the command."""
+    command_id: int | None = None
+    """ID of the command, if it was sent with one."""
+    exit_code: int | None = None
+    """Exit code of the command (end marker only)."""
+    timestamp: float | None = None
+    """Time in seconds from the shell's clock, if it has one."""
+
+    def __rich_repr__(self) -> rich.repr.Result:
+        yield self.marker
+        yield "command_id", self.command_id, None
+        yield "exit_code", self.exit_code, None
+        yield "timestamp", self.timestamp, None
+
+    @classmethod
+    def from_fields(
+        cls, marker: Literal["start", "end"], fields: list[str], exit_code: str = ""
+    ) -> ANSICommandMarker:
+        """Build a marker from the OSC fields.
+
+        Args:
+            marker: Start or end of the command.
+            fields: Fields after the exit code, in the form "key=value".
+            exit_code: Exit code field.
+
+        Returns:
+            A new marker.
+        """
+        options: dict[str, str] = {}
+        for field in fields:
+            key, equals, value = field.partition("=")
+            if equals:
+                options[key] = value
+        command_id = options.get("id", "")
+        # Decimal separator may be a comma in some locales
+        timestamp = options.get("t", "").replace(",", ".")
+        return cls(
+            marker,
+            int(command_id) if command_id.isdigit() else None,
+            int(exit_code) if exit_code.lstrip("-").isdigit() else None,
+            float(timestamp) if timestamp.replace(".", "", 1).isdigit() else None,
+        )
+
+
 @rich.repr.auto
 class ANSICharacterSet(NamedTuple):
     """Updated character set state."""
@@ -359,6 +409,7 @@ type ANSICommand = (
     | ANSIScrollMargin
     | ANSIScroll
     | ANSIWorkingDirectory
+    | ANSICommandMarker
     | ANSICharacterSet
     | ANSIFeatures
     | ANSIMouseTracking
@@ -654,6 +705,10 @@ class ANSIStream:
                     case ["2025", current_directory, *_]:
                         self.current_directory = current_directory
                         yield ANSIWorkingDirectory(current_directory)
+                    case ["133", "C", *fields]:
+                        yield ANSICommandMarker.from_fields("start", fields)
+                    case ["133", "D", exit_code, *fields]:
+                        yield ANSICommandMarker.from_fields("end", fields, exit_code)
 
             case ["csi", csi]:
                 if csi.endswith("m"):
@@ -888,6 +943,38 @@ class Buffer:
         self.max_line_width = 0
         self.updates = updates
 
+    def trim_start(self, line_count: int) -> int:
+        """Remove lines from the start of the buffer.
+
+        Args:
+            line_count: Number of (unfolded) lines to remove.
+
+        Returns:
+            Number of folded lines removed.
+        """
+        line_count = min(line_count, len(self.lines))
+        if line_count <= 0:
+            return 0
+        if line_count < len(self.lines):
+            fold_count = self.line_to_fold[line_count]
+        else:
+            fold_count = len(self.folded_lines)
+        del self.lines[:line_count]
+        del self.line_to_fold[:line_count]
+        folded_lines: list[LineFold] = []
+        for line_record in self.lines:
+            line_record.folds[:] = [
+                fold._replace(line_no=fold.line_no - line_count)
+                for fold in line_record.folds
+            ]
+            folded_lines.extend(line_record.folds)
+        self.folded_lines[:] = folded_lines
+        self.line_to_fold[:] = [offset - fold_count for offset in self.line_to_fold]
+        self.cursor_line = max(0, self.cursor_line - fold_count)
+        self._updated_lines = None
+        self.updates += 1
+        return fold_count
+
     def remove_last_line(self) -> None:
         if not self.lines:
             return
@@ -963,11 +1050,14 @@ class TerminalState:
         *,
         width: int = 80,
         height: int = 24,
+        max_scrollback_lines: int | None = None,
     ) -> None:
         """
         Args:
             width: Initial width.
             height: Initial height.
+            max_scrollback_lines: Maximum number of lines in the scrollback buffer,
+                or `None` for no maximum.
         """
         self._write_stdin = write_stdin
 
@@ -996,6 +1086,8 @@ class TerminalState:
         """Should content wrap?"""
         self.current_directory: str = ""
         """Current working directory."""
+        self.command_markers: list[ANSICommandMarker] = []
+        """Shell command markers, to be consumed by the shell."""
         self.scrollback_buffer = Buffer("scrollback")
         """Scrollbar buffer lines."""
         self.alternate_buffer = Buffer("alternate")
@@ -1004,6 +1096,10 @@ class TerminalState:
         """The DEC (character set) state."""
         self.mouse_tracking: MouseTracking | None = None
         """The mouse tracking state."""
+        self.max_scrollback_lines = max_scrollback_lines
+        """Maximum lines in the scrollback buffer, or `None` for no maximum."""
+        self.trimmed_lines = 0
+        """Number of lines removed from the start of the scrollback buffer."""
 
         self._updates: int = 0
         """Incrementing integer used in caching."""
@@ -1186,6 +1282,16 @@ class TerminalState:
             for ansi_command in self._ansi_stream.feed(text):
                 await self._handle_ansi_command(ansi_command)
 
+        if (max_lines := self.max_scrollback_lines) is not None:
+            # Trim in batches, as trimming renumbers the remaining lines
+            cursor_line_no, _ = scrollback_buffer.cursor
+            excess_lines = min(
+                scrollback_buffer.line_count - max_lines, cursor_line_no
+            )
+            if excess_lines > max_lines // 4:
+                scrollback_buffer.trim_start(excess_lines)
+                self.trimmed_lines += excess_lines
+
         # Get deltas
         scrollback_updates = (
             None
@@ -1489,6 +1595,9 @@ class TerminalState:
             case ANSIWorkingDirectory(path):
                 self.current_directory = path
 
+            case ANSICommandMarker():
+                self.command_markers.append(ansi_command)
+
             case ANSIMouseTracking(tracking, format, focus_events, alternate_scroll):
                 if tracking == "none":
                     self.mouse_tracking = None
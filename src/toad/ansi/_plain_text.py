@@ -0,0 +1,78 @@
+"""
+Convert terminal output to plain text.
+
+"""
+
+from __future__ import annotations
+
+import codecs
+import re
+
+ESCAPE_SEQUENCE = re.compile(
+    r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)?|[ -/]*[0-~])"
+)
+"""Matches terminal escape sequences (CSI, OSC, and other escape sequences)."""
+
+OVERWRITTEN_TEXT = re.compile(r"[^\n]*\r(?=[^\r\n])")
+"""Matches text on a line which is overwritten after a carriage return."""
+
+MAX_PENDING_LINE = 64 * 1024
+"""Maximum characters of an incomplete line to hold back while decoding."""
+
+MAX_ESCAPE_LENGTH = 4096
+"""Maximum length of an escape sequence split from a very long line."""
+
+
+def to_plain_text(text: str) -> str:
+    """Convert terminal output to plain text.
+
+    Escape sequences are removed, and a line rewritten after a carriage return (such
+    as a progress bar) is replaced with the text written last.
+
+    Args:
+        text: Terminal output.
+
+    Returns:
+        Plain text.
+    """
+    text = ESCAPE_SEQUENCE.sub("", text).replace("\r\n", "\n")
+    return OVERWRITTEN_TEXT.sub("", text).replace("\r", "")
+
+
+class PlainTextDecoder:
+    """Incrementally decode UTF-8 terminal output to plain text (see `to_plain_text`).
+
+    Incomplete lines are held back until the next chunk, so that escape sequences and
+    carriage returns split across chunks are handled.
+    """
+
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._line = ""
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        """Decode a chunk of output.
+
+        Args:
+            data: Bytes from the terminal.
+            final: Set to `True` for the last chunk.
+
+        Returns:
+            Plain text.
+        """
+        text = self._line + self._decoder.decode(data, final)
+        if final:
+            self._line = ""
+            return to_plain_text(text)
+        line_end = text.rfind("\n") + 1
+        text, line = text[:line_end], text[line_end:]
+        # Text before the last carriage return is overwritten
+        if (carriage_return := line.rfind("\r", 0, len(line) - 1)) != -1:
+            line = line[carriage_return + 1 :]
+        if len(line) > MAX_PENDING_LINE:
+            # A very long line; only hold back what may be a partial escape sequence
+            if (split := line.rfind("\x1b", len(line) - MAX_ESCAPE_LENGTH)) == -1:
+                split = len(line)
+            text, line = text + line[:split], line[split:]
+        self._line = line
+        return to_plain_text(text)
@@ -1,3 +1,4 @@
+import asyncio
 from importlib.resources import files
 from datetime import datetime, timezone
 from functools import cached_property
@@ -30,6 +31,10 @@ if TYPE_CHECKING:
     from toad.screens.main import MainScreen
     from toad.screens.settings import SettingsScreen
     from toad.screens.store import StoreScreen
+    from toad.directory_cache import DirectoryCache
+    from toad.project_index import ProjectIndex
+    from toad.project_watcher import ProjectChanges, ProjectWatcher
+    from toad.session_store import SessionStore
 
 
 DRACULA_TERMINAL_THEME = terminal_theme.TerminalTheme(
@@ -261,6 +266,9 @@ class ToadApp(App, inherit_bindings=False):
             agent: Agent identity or shor name.
         """
         self.settings_changed_signal = Signal(self, "settings_changed")
+        self.project_changed_signal: Signal[ProjectChanges] = Signal(
+            self, "project_changed"
+        )
         self.agent_data = agent_data
         self.project_dir = (
             None if project_dir is None else Path(project_dir).expanduser().resolve()
@@ -268,6 +276,8 @@ class ToadApp(App, inherit_bindings=False):
         self._initial_mode = mode
         self.version_meta: VersionMeta | None = None
         self._supports_pyperclip: bool | None = None
+        self._project_indexes: dict[Path, ProjectIndex] = {}
+        self._project_watchers: dict[Path, ProjectWatcher] = {}
 
         super().__init__()
 
@@ -297,6 +307,80 @@ class ToadApp(App, inherit_bindings=False):
             self.settings_schema, self._settings, on_set_callback=self.setting_updated
         )
 
+    @cached_property
+    def session_store(self) -> SessionStore:
+        """Recorded sessions, shared by all conversations."""
+        from toad.session_store import SessionStore
+
+        max_age = self.settings.get("sessions.max_age", int)
+        max_size = self.settings.get("sessions.max_size", int)
+        return SessionStore(
+            paths.get_data() / "sessions.db",
+            max_age=max_age * 24 * 60 * 60 if max_age else None,
+            max_size=max_size * 1024 * 1024 if max_size else None,
+        )
+
+    @cached_property
+    def directory_cache(self) -> DirectoryCache:
+        """Directory listings, shared by path completion and the path picker."""
+        from toad.directory_cache import DirectoryCache
+
+        return DirectoryCache()
+
+    def get_project_index(self, project_path: Path) -> ProjectIndex:
+        """Get the index of files in a project, shared by the path picker and completion.
+
+        Where supported, the project is watched for changes, which are published with
+        `project_changed_signal`.
+
+        Args:
+            project_path: Path to the project.
+
+        Returns:
+            A project index (call `ProjectIndex.load` from a thread to populate it).
+        """
+        from toad.project_index import ProjectIndex
+        from toad.project_watcher import ProjectWatcher
+
+        project_path = project_path.resolve()
+        if (project_index := self._project_indexes.get(project_path)) is None:
+            project_index = ProjectIndex(
+                project_path, paths.get_project_data(project_path) / "files.index"
+            )
+            self._project_indexes[project_path] = project_index
+            if ProjectWatcher.is_supported():
+                watcher = ProjectWatcher(project_index, self._publish_project_changes)
+                self._project_watchers[project_path] = watcher
+                watcher.start()
+        return project_index
+
+    def is_project_watched(self, project_path: Path) -> bool:
+        """Is every directory in a project being watched for changes?
+
+        If not, consumers of the project index should refresh it when the project may
+        have changed.
+
+        Args:
+            project_path: Path to the project.
+
+        Returns:
+            `True` if changes are published with `project_changed_signal`.
+        """
+        watcher = self._project_watchers.get(project_path.resolve())
+        return watcher is not None and watcher.is_complete
+
+    def _publish_project_changes(self, changes: ProjectChanges) -> None:
+        """Publish changes from a project watcher (called from the watcher's thread).
+
+        Args:
+            changes: A batch of changes.
+        """
+        try:
+            self.call_from_thread(self.project_changed_signal.publish, changes)
+        except RuntimeError:
+            # App is closing
+            pass
+
     @cached_property
     def anon_id(self) -> str:
         """An anonymous ID for usage collection."""
@@ -484,6 +568,13 @@ class ToadApp(App, inherit_bindings=False):
 
         self.set_timer(1, self.run_version_check)
 
+    async def on_unmount(self) -> None:
+        for watcher in self._project_watchers.values():
+            await asyncio.to_thread(watcher.stop)
+        if "session_store" in self.__dict__:
+            # Write any events still queued
+            await asyncio.to_thread(self.session_store.close)
+
     @on(events.TextSelected)
     async def on_text_selected(self) -> None:
         if self.settings.get("ui.auto_copy", bool):
@@ -14,12 +14,29 @@ def write(path: str, content: str) -> None:
         content: Content to write.
 
     """
+    _write(path, content, "w", "utf-8")
+
+
+def write_bytes(path: str, content: bytes) -> None:
+    """Write a binary file in an atomic manner.
+
+    Args:
+        path: Path of new file.
+        content: Bytes to write.
+
+    """
+    _write(path, content, "wb")
+
+
+def _write(
+    path: str, content: str | bytes, mode: str, encoding: str | None = None
+) -> None:
     path = os.path.abspath(path)
     dir_name = os.path.dirname(path) or "."
     try:
         with tempfile.NamedTemporaryFile(
-            mode="w",
-            encoding="utf-8",
+            mode=mode,
+            encoding=encoding,
             delete=False,
             dir=dir_name,
             prefix=f".{os.path.basename(path)}_tmp_",
@@ -1,5 +1,30 @@
+from __future__ import annotations
+
+from pathlib import Path
 import sqlite3
 
+BUSY_TIMEOUT = 5.0
+"""Seconds to wait for a lock held by another connection."""
+
+
+def connect(path: str | Path, *, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Connect to a SQLite database, in WAL mode.
+
+    Write-ahead logging allows readers to proceed while another connection (typically
+    a background thread) is writing.
+
+    Args:
+        path: Path to the database.
+        check_same_thread: Only allow the connection to be used in the thread which
+            created it.
 
-def connect(path: str) -> sqlite3.Connection:
-    return sqlite3.connect(path)
+    Returns:
+        A connection.
+    """
+    connection = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    # Durable on application crash (not power loss), without an fsync per commit
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
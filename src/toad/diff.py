@@ -0,0 +1,354 @@
+"""
+Line-level diffs, with character-level refinement of changed lines.
+
+Lines are matched with a patience diff: lines which occur once in both ranges are used as
+anchors, and the ranges between anchors are diffed recursively. Where there are no unique
+lines, the least frequent line is used (a histogram heuristic), and small ranges without
+any anchors fall back to `difflib`.
+
+Character-level differences are only calculated within replaced lines, so the cost is
+proportional to the size of the edit rather than the size of the file.
+
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import difflib
+from typing import Sequence
+
+type Opcode = tuple[str, int, int, int, int]
+"""A `difflib` style opcode: (TAG, A START, A END, B START, B END)."""
+
+type LineChanges = dict[int, list[tuple[int, int]]]
+"""Character-level changes: line index mapped on to (START, END) offsets in the line."""
+
+HISTOGRAM_MAX_OCCURRENCES = 64
+"""Lines occurring more often than this are not used as anchors."""
+
+FALLBACK_MAX_CELLS = 250_000
+"""Maximum product of range lengths to diff with `difflib` (when there are no anchors)."""
+
+REFINE_MAX_CHARACTERS = 20_000
+"""Maximum size of a replaced region (in characters) to refine."""
+
+
+def _get_anchors(
+    lines_a: Sequence[str],
+    a_start: int,
+    a_end: int,
+    lines_b: Sequence[str],
+    b_start: int,
+    b_end: int,
+) -> list[tuple[int, int]]:
+    """Find lines to anchor a diff.
+
+    Args:
+        lines_a: Lines before.
+        a_start: Start of the range in `lines_a`.
+        a_end: End of the range in `lines_a`.
+        lines_b: Lines after.
+        b_start: Start of the range in `lines_b`.
+        b_end: End of the range in `lines_b`.
+
+    Returns:
+        Pairs of matching line indices, increasing in both.
+    """
+    counts_a = Counter(lines_a[a_start:a_end])
+    counts_b = Counter(lines_b[b_start:b_end])
+
+    # Patience: lines which occur exactly once in both ranges
+    unique_b = {
+        line: index
+        for index, line in enumerate(lines_b[b_start:b_end], b_start)
+        if counts_b[line] == 1
+    }
+    candidates = [
+        (index, unique_b[line])
+        for index, line in enumerate(lines_a[a_start:a_end], a_start)
+        if counts_a[line] == 1 and line in unique_b
+    ]
+    if candidates:
+        # Longest increasing subsequence of positions in b (patience sorting)
+        tails: list[int] = []
+        tail_indices: list[int] = []
+        previous: list[int] = []
+        for candidate_index, (_, b_index) in enumerate(candidates):
+            position = bisect_left(tails, b_index)
+            if position == len(tails):
+                tails.append(b_index)
+                tail_indices.append(candidate_index)
+            else:
+                tails[position] = b_index
+                tail_indices[position] = candidate_index
+            previous.append(tail_indices[position - 1] if position else -1)
+        anchors: list[tuple[int, int]] = []
+        candidate_index = tail_indices[-1]
+        while candidate_index != -1:
+            anchors.append(candidates[candidate_index])
+            candidate_index = previous[candidate_index]
+        anchors.reverse()
+        return anchors
+
+    # Histogram: the least frequent line common to both ranges
+    common = [
+        (counts_a[line] + counts_b[line], line)
+        for line in counts_a.keys() & counts_b.keys()
+        if max(counts_a[line], counts_b[line]) <= HISTOGRAM_MAX_OCCURRENCES
+    ]
+    if not common:
+        return []
+    _, anchor_line = min(common)
+    positions_a = [
+        index
+        for index, line in enumerate(lines_a[a_start:a_end], a_start)
+        if line == anchor_line
+    ]
+    positions_b = [
+        index
+        for index, line in enumerate(lines_b[b_start:b_end], b_start)
+        if line == anchor_line
+    ]
+    return list(zip(positions_a, positions_b))
+
+
+def match_lines(
+    lines_a: Sequence[str], lines_b: Sequence[str]
+) -> list[tuple[int, int]]:
+    """Find matching lines.
+
+    Args:
+        lines_a: Lines before.
+        lines_b: Lines after.
+
+    Returns:
+        Sorted pairs of matching line indices.
+    """
+    matches: list[tuple[int, int]] = []
+    stack = [(0, len(lines_a), 0, len(lines_b))]
+    while stack:
+        a_start, a_end, b_start, b_end = stack.pop()
+        # Common prefix
+        while (
+            a_start < a_end
+            and b_start < b_end
+            and lines_a[a_start] == lines_b[b_start]
+        ):
+            matches.append((a_start, b_start))
+            a_start += 1
+            b_start += 1
+        # Common suffix
+        while (
+            a_start < a_end
+            and b_start < b_end
+            and lines_a[a_end - 1] == lines_b[b_end - 1]
+        ):
+            a_end -= 1
+            b_end -= 1
+            matches.append((a_end, b_end))
+        if a_start == a_end or b_start == b_end:
+            continue
+
+        # A single line (common when every line has been edited) matches at most once
+        if a_end - a_start == 1:
+            line = lines_a[a_start]
+            for b_index in range(b_start, b_end):
+                if lines_b[b_index] == line:
+                    matches.append((a_start, b_index))
+                    break
+            continue
+        if b_end - b_start == 1:
+            line = lines_b[b_start]
+            for a_index in range(a_start, a_end):
+                if lines_a[a_index] == line:
+                    matches.append((a_index, b_start))
+                    break
+            continue
+
+        if anchors := _get_anchors(lines_a, a_start, a_end, lines_b, b_start, b_end):
+            previous_a, previous_b = a_start, b_start
+            for a_index, b_index in anchors:
+                matches.append((a_index, b_index))
+                stack.append((previous_a, a_index, previous_b, b_index))
+                previous_a, previous_b = a_index + 1, b_index + 1
+            stack.append((previous_a, a_end, previous_b, b_end))
+        elif (a_end - a_start) * (b_end - b_start) <= FALLBACK_MAX_CELLS:
+            sequence_matcher = difflib.SequenceMatcher(
+                None, lines_a[a_start:a_end], lines_b[b_start:b_end], autojunk=False
+            )
+            for a_index, b_index, size in sequence_matcher.get_matching_blocks():
+                matches.extend(
+                    (a_start + a_index + offset, b_start + b_index + offset)
+                    for offset in range(size)
+                )
+        # Otherwise the entire range is replaced
+
+    matches.sort()
+    return matches
+
+
+def diff_lines(lines_a: Sequence[str], lines_b: Sequence[str]) -> list[Opcode]:
+    """Diff two lists of lines.
+
+    Args:
+        lines_a: Lines before.
+        lines_b: Lines after.
+
+    Returns:
+        Opcodes, in the same format as `difflib.SequenceMatcher.get_opcodes`.
+    """
+    opcodes: list[Opcode] = []
+    a_index = b_index = 0
+
+    def add_equal(a_start: int, a_end: int, b_start: int, b_end: int) -> None:
+        if opcodes and opcodes[-1][0] == "equal":
+            _, previous_a_start, _, previous_b_start, _ = opcodes[-1]
+            opcodes[-1] = ("equal", previous_a_start, a_end, previous_b_start, b_end)
+        else:
+            opcodes.append(("equal", a_start, a_end, b_start, b_end))
+
+    matches = match_lines(lines_a, lines_b)
+    matches.append((len(lines_a), len(lines_b)))
+    for match_a, match_b in matches:
+        if a_index < match_a and b_index < match_b:
+            opcodes.append(("replace", a_index, match_a, b_index, match_b))
+        elif a_index < match_a:
+            opcodes.append(("delete", a_index, match_a, b_index, b_index))
+        elif b_index < match_b:
+            opcodes.append(("insert", a_index, a_index, b_index, match_b))
+        if match_a < len(lines_a):
+            add_equal(match_a, match_a + 1, match_b, match_b + 1)
+        a_index, b_index = match_a + 1, match_b + 1
+    return opcodes
+
+
+def group_opcodes(opcodes: list[Opcode], context: int = 3) -> list[list[Opcode]]:
+    """Group opcodes in to hunks, with lines of context.
+
+    Equivalent to `difflib.SequenceMatcher.get_grouped_opcodes`.
+
+    Args:
+        opcodes: Opcodes from `diff_lines`.
+        context: Number of lines of context around changes.
+
+    Returns:
+        A list of groups of opcodes.
+    """
+    codes = list(opcodes)
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    # Fixup leading and trailing groups if they show no changes.
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    context_size = context + context
+    groups: list[list[Opcode]] = []
+    group: list[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        # End the current group and start a new one whenever
+        # there is a large range with no changes.
+        if tag == "equal" and i2 - i1 > context_size:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _get_line_offsets(lines: Sequence[str]) -> list[int]:
+    """Get the offset of the start of each line, when joined with newlines."""
+    offsets: list[int] = []
+    offset = 0
+    for line in lines:
+        offsets.append(offset)
+        offset += len(line) + 1
+    offsets.append(offset)
+    return offsets
+
+
+def _add_change(
+    changes: LineChanges, offsets: list[int], first_line: int, start: int, end: int
+) -> None:
+    """Add a change, relative to the start of its line.
+
+    Args:
+        changes: Changes to update.
+        offsets: Line offsets of the hunk.
+        first_line: Index of the first line in the hunk.
+        start: Start offset within the hunk.
+        end: End offset within the hunk.
+    """
+    line = bisect_right(offsets, start) - 1
+    line_offset = offsets[line]
+    changes.setdefault(first_line + line, []).append(
+        (start - line_offset, end - line_offset)
+    )
+
+
+def refine_hunk(
+    lines_a: Sequence[str], lines_b: Sequence[str], opcode: Opcode
+) -> tuple[LineChanges, LineChanges]:
+    """Find character-level changes within a replaced hunk.
+
+    Args:
+        lines_a: Lines before.
+        lines_b: Lines after.
+        opcode: A line opcode from `diff_lines`.
+
+    Returns:
+        A pair of removed characters in `lines_a`, and added characters in `lines_b`.
+    """
+    removed: LineChanges = {}
+    added: LineChanges = {}
+    tag, i1, i2, j1, j2 = opcode
+    if tag != "replace":
+        return removed, added
+    hunk_a = lines_a[i1:i2]
+    hunk_b = lines_b[j1:j2]
+    size = sum(map(len, hunk_a)) + len(hunk_a) + sum(map(len, hunk_b)) + len(hunk_b)
+    if size > REFINE_MAX_CHARACTERS:
+        return removed, added
+    # Include the following newline, so changes at the end of a line are detected
+    text_a = "\n".join(hunk_a) + "\n"
+    text_b = "\n".join(hunk_b) + "\n"
+    offsets_a = _get_line_offsets(hunk_a)
+    offsets_b = _get_line_offsets(hunk_b)
+    sequence_matcher = difflib.SequenceMatcher(
+        lambda character: character in " \t", text_a, text_b, autojunk=True
+    )
+    for char_tag, a_start, a_end, b_start, b_end in sequence_matcher.get_opcodes():
+        if char_tag == "delete" and "\n" not in text_a[a_start : a_end + 1]:
+            _add_change(removed, offsets_a, i1, a_start, a_end)
+        elif char_tag == "insert" and "\n" not in text_b[b_start : b_end + 1]:
+            _add_change(added, offsets_b, j1, b_start, b_end)
+    return removed, added
+
+
+def refine(
+    lines_a: Sequence[str], lines_b: Sequence[str], opcodes: list[Opcode]
+) -> tuple[LineChanges, LineChanges]:
+    """Find character-level changes within replaced lines.
+
+    Args:
+        lines_a: Lines before.
+        lines_b: Lines after.
+        opcodes: Line opcodes from `diff_lines`.
+
+    Returns:
+        A pair of removed characters in `lines_a`, and added characters in `lines_b`.
+    """
+    removed: LineChanges = {}
+    added: LineChanges = {}
+    for opcode in opcodes:
+        hunk_removed, hunk_added = refine_hunk(lines_a, lines_b, opcode)
+        removed.update(hunk_removed)
+        added.update(hunk_added)
+    return removed, added
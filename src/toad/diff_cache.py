@@ -0,0 +1,306 @@
+"""
+A process-wide cache of diffs, and their syntax highlighted lines.
+
+The same edit is typically displayed several times (as a tool call, when asking for
+permission, and again when the diff view is rebuilt). Diffs are keyed on a hash of the
+paths and the code (which also determine the languages), so every `DiffView` for the
+same edit shares the work.
+
+Syntax highlighting and character-level refinement are done lazily, in chunks of lines,
+so only the lines which are displayed are processed.
+
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+import hashlib
+from itertools import islice
+from threading import Lock
+from typing import Literal
+
+from rich.cells import cell_len
+
+from textual import highlight
+from textual.cache import LRUCache
+from textual.content import Content, Span
+
+from toad.diff import LineChanges, Opcode, diff_lines, group_opcodes, refine_hunk
+
+type Side = Literal[0, 1]
+"""The code before (0) or after (1)."""
+
+MAX_BYTES = 64 * 1024 * 1024
+"""Approximate memory budget for the cache."""
+
+LINE_BYTES = 120
+"""Estimated overhead per line (the strings, Content, and list slots)."""
+
+SPAN_BYTES = 80
+"""Estimated size of a span."""
+
+HIGHLIGHT_CHUNK_LINES = 256
+"""Number of lines highlighted at a time."""
+
+HIGHLIGHT_CONTEXT_LINES = 64
+"""Lines before a chunk which are also highlighted, to give the highlighter context."""
+
+HIGHLIGHT_CACHE_CHUNKS = 16
+"""Maximum number of highlighted chunks to keep, per diff."""
+
+REMOVED_STYLE = "on $error 40%"
+ADDED_STYLE = "on $success 40%"
+
+
+@dataclass(frozen=True, eq=False)
+class DiffData:
+    """A computed diff. Immutable, so may be shared by any number of widgets."""
+
+    paths: tuple[str, str]
+    """Paths before and after."""
+    languages: tuple[str, str]
+    """Languages used to highlight the code before and after."""
+    text_lines: tuple[list[str], list[str]]
+    """Lines of the code before and after."""
+    opcodes: list[Opcode]
+    """Line-level opcodes."""
+    grouped_opcodes: list[list[Opcode]]
+    """Opcodes grouped in to hunks."""
+    _highlighted_chunks: LRUCache[tuple[Side, int], list[Content]] = field(
+        default_factory=lambda: LRUCache(HIGHLIGHT_CACHE_CHUNKS),
+        init=False,
+        repr=False,
+    )
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    @cached_property
+    def max_line_width(self) -> int:
+        """Width of the longest line, in cells."""
+        lines_a, lines_b = self.text_lines
+        return max(map(cell_len, (*lines_a, *lines_b)), default=0)
+
+    @cached_property
+    def size(self) -> int:
+        """Estimated memory used by the diff, in bytes."""
+        size = 0
+        for lines in self.text_lines:
+            size += len(lines) * LINE_BYTES + sum(map(len, lines))
+        size += len(self.opcodes) * SPAN_BYTES
+        # Highlighted lines are bounded by the number of cached chunks
+        highlighted_lines = min(
+            sum(map(len, self.text_lines)),
+            HIGHLIGHT_CACHE_CHUNKS * HIGHLIGHT_CHUNK_LINES,
+        )
+        size += highlighted_lines * (LINE_BYTES + SPAN_BYTES)
+        return size
+
+    @cached_property
+    def _replace_opcodes(self) -> tuple[list[Opcode], list[int], list[int]]:
+        """Replace opcodes, with the first line of each (before and after)."""
+        replace_opcodes = [opcode for opcode in self.opcodes if opcode[0] == "replace"]
+        return (
+            replace_opcodes,
+            [i1 for _, i1, _, _, _ in replace_opcodes],
+            [j1 for _, _, _, j1, _ in replace_opcodes],
+        )
+
+    def get_changes(self, side: Side, start: int, end: int) -> LineChanges:
+        """Get character-level changes within a range of lines.
+
+        Args:
+            side: Removed characters before (0) or added characters after (1).
+            start: First line index.
+            end: Last line index (exclusive).
+
+        Returns:
+            Changes within the given lines.
+        """
+        replace_opcodes, starts_a, starts_b = self._replace_opcodes
+        starts = starts_b if side else starts_a
+        first_opcode = max(0, bisect_right(starts, start) - 1)
+        lines_a, lines_b = self.text_lines
+        changes: LineChanges = {}
+        for opcode in islice(replace_opcodes, first_opcode, None):
+            _, i1, i2, j1, j2 = opcode
+            hunk_start, hunk_end = (j1, j2) if side else (i1, i2)
+            if hunk_start >= end:
+                break
+            if hunk_end > start:
+                changes.update(refine_hunk(lines_a, lines_b, opcode)[side])
+        return changes
+
+    def get_highlighted_line(self, side: Side, line_index: int) -> Content:
+        """Get a syntax highlighted line, with intra-line changes.
+
+        Args:
+            side: Code before (0) or after (1).
+            line_index: Index of the line.
+
+        Returns:
+            Highlighted line.
+        """
+        chunk = line_index // HIGHLIGHT_CHUNK_LINES
+        with self._lock:
+            lines = self._highlighted_chunks.get((side, chunk))
+        if lines is None:
+            lines = self._highlight_chunk(side, chunk)
+            with self._lock:
+                self._highlighted_chunks[(side, chunk)] = lines
+        return lines[line_index - chunk * HIGHLIGHT_CHUNK_LINES]
+
+    def _highlight_chunk(self, side: Side, chunk: int) -> list[Content]:
+        """Highlight a chunk of lines.
+
+        Args:
+            side: Code before (0) or after (1).
+            chunk: Index of the chunk.
+
+        Returns:
+            Highlighted lines.
+        """
+        text_lines = self.text_lines[side]
+        start = chunk * HIGHLIGHT_CHUNK_LINES
+        end = min(start + HIGHLIGHT_CHUNK_LINES, len(text_lines))
+        context_start = max(0, start - HIGHLIGHT_CONTEXT_LINES)
+        code = highlight.highlight(
+            "\n".join(text_lines[context_start:end]),
+            language=self.languages[side],
+            path=self.paths[side],
+        )
+        lines = code.split("\n", allow_blank=True)[start - context_start :]
+        changes = self.get_changes(side, start, end)
+        style = ADDED_STYLE if side else REMOVED_STYLE
+        for offset, line_index in enumerate(range(start, end)):
+            if (spans := changes.get(line_index)) is not None:
+                lines[offset] = lines[offset].add_spans(
+                    [Span(*span, style) for span in spans]
+                )
+        return lines
+
+
+def make_key(path1: str, path2: str, code_before: str, code_after: str) -> bytes:
+    """Make a cache key.
+
+    The languages are guessed from the paths and the code, so are not included (guessing
+    the language can be more expensive than the lookup).
+
+    Args:
+        path1: Path before.
+        path2: Path after.
+        code_before: Code before.
+        code_after: Code after.
+
+    Returns:
+        A digest of the arguments.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for value in (path1, path2, code_before, code_after):
+        encoded = value.encode("utf-8", "surrogatepass")
+        # Length prefix, so that boundaries between values are unambiguous
+        hasher.update(len(encoded).to_bytes(8, "little"))
+        hasher.update(encoded)
+    return hasher.digest()
+
+
+def compute_diff(path1: str, path2: str, code_before: str, code_after: str) -> DiffData:
+    """Diff code (highlighting and refinement are deferred until lines are requested).
+
+    Args:
+        path1: Path before.
+        path2: Path after.
+        code_before: Code before.
+        code_after: Code after.
+
+    Returns:
+        Diff data.
+    """
+    languages = (
+        highlight.guess_language(code_before, path1),
+        highlight.guess_language(code_after, path2),
+    )
+    text_lines_a = code_before.splitlines()
+    text_lines_b = code_after.splitlines()
+    opcodes = diff_lines(text_lines_a, text_lines_b)
+    return DiffData(
+        (path1, path2),
+        languages,
+        (text_lines_a, text_lines_b),
+        opcodes,
+        group_opcodes(opcodes),
+    )
+
+
+class DiffCache:
+    """A least recently used cache of diffs, bounded by (estimated) memory."""
+
+    def __init__(self, max_bytes: int = MAX_BYTES) -> None:
+        """
+
+        Args:
+            max_bytes: Approximate memory budget, in bytes.
+        """
+        self.max_bytes = max_bytes
+        self._diffs: OrderedDict[bytes, DiffData] = OrderedDict()
+        self._bytes = 0
+        # Diffs are often prepared in a thread
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._diffs)
+
+    @property
+    def total_bytes(self) -> int:
+        """Estimated memory used by cached diffs."""
+        return self._bytes
+
+    def clear(self) -> None:
+        """Remove all diffs."""
+        with self._lock:
+            self._diffs.clear()
+            self._bytes = 0
+
+    def get_diff(
+        self, path1: str, path2: str, code_before: str, code_after: str
+    ) -> DiffData:
+        """Get a diff, computing it if it isn't in the cache.
+
+        Args:
+            path1: Path before.
+            path2: Path after.
+            code_before: Code before.
+            code_after: Code after.
+
+        Returns:
+            Diff data.
+        """
+        key = make_key(path1, path2, code_before, code_after)
+        with self._lock:
+            if (diff := self._diffs.get(key)) is not None:
+                self._diffs.move_to_end(key)
+                self.hits += 1
+                return diff
+            self.misses += 1
+
+        # Computed outside of the lock; the same diff may occasionally be computed twice
+        diff = compute_diff(path1, path2, code_before, code_after)
+        size = diff.size
+        if size > self.max_bytes:
+            return diff
+        with self._lock:
+            if (previous_diff := self._diffs.pop(key, None)) is not None:
+                self._bytes -= previous_diff.size
+            self._diffs[key] = diff
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted_diff = self._diffs.popitem(last=False)
+                self._bytes -= evicted_diff.size
+        return diff
+
+
+diff_cache = DiffCache()
+"""Cache shared by all diff views."""
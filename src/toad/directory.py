@@ -1,90 +1,286 @@
 from __future__ import annotations
 
 import asyncio
-from itertools import filterfalse
-from typing import Callable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+from threading import Condition, Lock
+from typing import AsyncIterator, Callable, Generic, Iterable, TypeVar
 from time import time
 from os import PathLike
 from pathlib import Path
 
-from textual._partition import partition
-
 from toad.path_filter import PathFilter
 
+T = TypeVar("T")
+
+
+class ChunkBuffer(Generic[T]):
+    """Collects items from several threads, and emits them in chunks."""
+
+    def __init__(self, emit: Callable[[list[T]], None], chunk_size: int) -> None:
+        """Chunk buffer.
 
-class ScanJob:
-    """A single directory scanning job."""
+        Args:
+            emit: Callable which receives a chunk of items.
+            chunk_size: Number of items in a chunk (except the last).
+        """
+        self._emit = emit
+        self._chunk_size = chunk_size
+        self._items: list[T] = []
+        self._lock = Lock()
+
+    def add(self, items: Iterable[T]) -> None:
+        """Add items, and emit a chunk if there are enough.
+
+        Args:
+            items: Items to add.
+        """
+        with self._lock:
+            self._items.extend(items)
+            if len(self._items) < self._chunk_size:
+                return
+            chunk, self._items = self._items, []
+        self._emit(chunk)
+
+    def flush(self) -> None:
+        """Emit any remaining items."""
+        with self._lock:
+            chunk, self._items = self._items, []
+        if chunk:
+            self._emit(chunk)
+
+
+class Walker(Generic[T]):
+    """Walks a tree of directories with a pool of threads.
+
+    Each thread takes directories from the end of its own queue (so it walks depth
+    first, which keeps the queues short), and when its queue is empty it steals from
+    the start of another thread's queue (where the directories nearest the root are,
+    which have the most work beneath them).
+
+    `os.scandir` releases the GIL while it reads the directory, so the threads run in
+    parallel while waiting on the file system.
+    """
 
     def __init__(
         self,
-        name: str,
-        queue: asyncio.Queue[Path],
-        results: list[Path],
-        path_filter: PathFilter | None = None,
-        add_directories=False,
+        visit: Callable[[T], Iterable[T]],
+        max_workers: int = 8,
+        cancelled: Callable[[], bool] | None = None,
     ) -> None:
-        self.queue = queue
-        self.results = results
-        self.name = name
-        self.path_filter = path_filter
-        self.add_directories = add_directories
+        """Walker.
 
-    def start(self) -> None:
-        self._task = asyncio.create_task(self.run())
+        Args:
+            visit: Callable which visits a directory (called from the pool), and
+                returns its subdirectories to visit.
+            max_workers: Number of threads.
+            cancelled: Callable which returns `True` to stop walking.
+        """
+        self.visit = visit
+        self.max_workers = max_workers
+        self.cancelled = cancelled
+        self._queues: list[deque[T]] = []
+        self._pending = 0
+        self._idle = 0
+        self._condition = Condition()
+        self._error: BaseException | None = None
+
+    def walk(self, directories: Iterable[T]) -> None:
+        """Walk directories, and everything beneath them (blocks until complete).
 
-    async def run(self) -> None:
-        queue = self.queue
-        results = self.results
-        add_directories = self.add_directories
+        Args:
+            directories: Directories to visit first.
+
+        Raises:
+            Exception: Any exception raised by `visit`.
+        """
+        self._queues = queues = [deque() for _ in range(self.max_workers)]
+        for index, directory in enumerate(directories):
+            queues[index % self.max_workers].append(directory)
+        self._pending = sum(map(len, queues))
+        self._error = None
+        if not self._pending:
+            return
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="walk") as pool:
+            for index in range(self.max_workers):
+                pool.submit(self._work, index)
+        if self._error is not None:
+            raise self._error
+
+    def _steal(self, index: int) -> T | None:
+        """Take a directory from the start of another thread's queue.
+
+        Args:
+            index: Index of the thread which is stealing.
+
+        Returns:
+            A directory, or `None` if every queue is empty.
+        """
+        queues = self._queues
+        for offset in range(1, len(queues)):
+            try:
+                return queues[(index + offset) % len(queues)].popleft()
+            except IndexError:
+                pass
+        return None
+
+    def _work(self, index: int) -> None:
+        """Visit directories until there are none left.
+
+        Args:
+            index: Index of the thread.
+        """
+        queue = self._queues[index]
+        condition = self._condition
+        visit = self.visit
+        cancelled = self.cancelled
         while True:
             try:
-                scan_path = await queue.get()
-            except asyncio.QueueShutDown:
-                break
-            paths, dir_paths = await asyncio.to_thread(
-                self._scan_directory, scan_path, self.path_filter
-            )
-            if add_directories:
-                results.extend(dir_paths)
-            results.extend(paths)
+                directory = queue.pop()
+            except IndexError:
+                if (directory := self._steal(index)) is None:
+                    with condition:
+                        if not self._pending or self._error is not None:
+                            return
+                        self._idle += 1
+                        condition.wait(0.05)
+                        self._idle -= 1
+                    continue
+            subdirectories: list[T] = []
             try:
-                for path in dir_paths:
-                    await queue.put(path)
-            except asyncio.QueueShutDown:
-                break
-            queue.task_done()
+                if self._error is None and not (cancelled is not None and cancelled()):
+                    subdirectories = list(visit(directory))
+            except BaseException as error:
+                self._error = error
+            queue.extend(subdirectories)
+            with condition:
+                self._pending += len(subdirectories) - 1
+                if self._idle and (len(subdirectories) > 1 or not self._pending):
+                    condition.notify_all()
+
+
+def scan_directories(
+    root: Path,
+    emit: Callable[[list[str]], None],
+    *,
+    path_filter: PathFilter | None = None,
+    add_directories: bool = False,
+    max_workers: int = 8,
+    chunk_size: int = 1000,
+    cancelled: Callable[[], bool] | None = None,
+) -> None:
+    """Scan a directory for paths, in a pool of threads (blocks until complete).
 
-    def _scan_directory(
-        self, root: Path, path_filter: PathFilter | None = None
-    ) -> tuple[list[Path], list[Path]]:
-        """Perform a directory scan (done in a thread).
+    Symlinks to directories are reported (as directories) but not followed.
+
+    Args:
+        root: Root directory to scan.
+        emit: Callable which receives chunks of paths (from the pool's threads).
+        path_filter: Path filter object.
+        add_directories: Also collect directories?
+        max_workers: Number of threads.
+        chunk_size: Number of paths per chunk.
+        cancelled: Callable which returns `True` to stop scanning.
+    """
+    root_path = os.fspath(root)
+    buffer = ChunkBuffer(emit, chunk_size)
+    match = None if path_filter is None else path_filter.match
+
+    def visit(relative_path: str) -> list[str]:
+        """List a directory.
 
         Args:
-            root: Path to scan.
-            path_filter: PathFilter object.
+            relative_path: Path relative to the root ("" for the root).
 
         Returns:
-            A tuple of lists of paths (FILES, DIRECTORIES)
+            Subdirectories to visit.
         """
+        prefix = f"{relative_path}/" if relative_path else ""
+        paths: list[str] = []
+        subdirectories: list[str] = []
         try:
-            paths = list(root.iterdir())
-        except IOError:
-            paths = []
-        if path_filter is not None:
-            paths = list(filterfalse(path_filter.match, paths))
+            with os.scandir(os.path.join(root_path, relative_path)) as entries:
+                for entry in entries:
+                    try:
+                        # Uses the type from the directory listing (no stat required)
+                        is_directory = entry.is_dir()
+                    except OSError:
+                        is_directory = False
+                    if match is not None and match(entry.path, is_directory):
+                        continue
+                    if not is_directory:
+                        paths.append(prefix + entry.name)
+                        continue
+                    if add_directories:
+                        paths.append(f"{prefix}{entry.name}/")
+                    if not entry.is_symlink():
+                        subdirectories.append(prefix + entry.name)
+        except OSError:
+            pass
+        if paths:
+            buffer.add(paths)
+        return subdirectories
+
+    Walker(visit, max_workers, cancelled).walk([""])
+    buffer.flush()
+
+
+async def scan_chunks(
+    root: Path,
+    *,
+    path_filter: PathFilter | None = None,
+    add_directories: bool = False,
+    max_workers: int = 8,
+    chunk_size: int = 1000,
+) -> AsyncIterator[list[str]]:
+    """Scan a directory for paths, yielding chunks as they are found.
 
+    Args:
+        root: Root directory to scan.
+        path_filter: Path filter object.
+        add_directories: Also collect directories (with a trailing "/")?
+        max_workers: Number of threads.
+        chunk_size: Number of paths per chunk.
+
+    Returns:
+        Chunks of paths, relative to the root.
+    """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue[list[str] | None] = asyncio.Queue()
+    stopped = False
+
+    def emit(chunk: list[str]) -> None:
+        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+    async def run_scan() -> None:
         try:
-            paths, dir_paths = partition(Path.is_dir, paths)
-        except IOError:
-            paths = []
-            dir_paths = []
-        return paths, dir_paths
+            await asyncio.to_thread(
+                scan_directories,
+                root,
+                emit,
+                path_filter=path_filter,
+                add_directories=add_directories,
+                max_workers=max_workers,
+                chunk_size=chunk_size,
+                cancelled=lambda: stopped,
+            )
+        finally:
+            await chunks.put(None)
+
+    scan_task = asyncio.create_task(run_scan(), name=f"scan {str(root)!r}")
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+    finally:
+        stopped = True
+        await scan_task
 
 
 async def scan(
     root: Path,
     *,
-    max_simultaneous: int = 5,
+    max_simultaneous: int = 8,
     path_filter: PathFilter | None = None,
     add_directories: bool = False,
     max_duration: float | None = 5.0,
@@ -93,7 +289,7 @@ async def scan(
 
     Args:
         root: Root directory to scan.
-        max_simultaneous: Maximum number of scan jobs.
+        max_simultaneous: Maximum number of threads.
         path_filter: Path filter object.
         add_directories: Also collect directories?
         max_duration: Maximum time in seconds to scan for, or `None` for no maximum.
@@ -101,33 +297,21 @@ async def scan(
     Returns:
         A list of Paths.
     """
-    queue: asyncio.Queue[Path] = asyncio.Queue()
     results: list[Path] = []
-    jobs = [
-        ScanJob(
-            f"scan-job #{index}",
-            queue,
-            results,
-            path_filter=path_filter,
-            add_directories=add_directories,
-        )
-        for index in range(max_simultaneous)
-    ]
+    chunks = scan_chunks(
+        root,
+        path_filter=path_filter,
+        add_directories=add_directories,
+        max_workers=max_simultaneous,
+    )
     try:
-        await queue.put(root)
-        for job in jobs:
-            job.start()
-        if max_duration is not None:
-            try:
-                async with asyncio.timeout(max_duration):
-                    await queue.join()
-            except asyncio.TimeoutError:
-                pass
-        else:
-            await queue.join()
-    except asyncio.CancelledError:
-        await queue.join()
-    queue.shutdown(immediate=True)
+        async with asyncio.timeout(max_duration):
+            async for chunk in chunks:
+                results.extend(root / path for path in chunk)
+    except TimeoutError:
+        pass
+    finally:
+        await chunks.aclose()
     return results
 
 
@@ -0,0 +1,182 @@
+"""
+A bounded cache of directory listings, shared by path completion and the path picker.
+
+Listings are checked against the modification time of their directory when they are
+retrieved (adding, removing, or renaming an entry updates it), so a stale listing is
+never returned. The least recently used listings are discarded when the cache holds
+more than a maximum number of directories or entries.
+
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Iterable
+
+MAX_DIRECTORIES = 256
+"""Maximum number of directories to cache."""
+
+MAX_ENTRIES = 200_000
+"""Maximum number of entries to cache, over all directories."""
+
+EARLY_CUTOFF = 5_000
+"""Number of entries to read before a listing may stop at the requested matches."""
+
+
+@dataclass(frozen=True)
+class DirectoryListing:
+    """The entries in a directory."""
+
+    path: Path
+    """Path to the directory."""
+    mtime_ns: int
+    """Modification time of the directory when it was listed."""
+    entries: list[tuple[str, bool]]
+    """The name of each entry, and if it is a directory (in the order listed)."""
+    complete: bool = True
+    """Were all entries read? (`False` if the listing stopped early.)"""
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class DirectoryCache:
+    """A least recently used cache of directory listings.
+
+    Methods may be called from any thread, but list directories in the calling thread.
+    """
+
+    def __init__(
+        self, max_directories: int = MAX_DIRECTORIES, max_entries: int = MAX_ENTRIES
+    ) -> None:
+        """Directory cache.
+
+        Args:
+            max_directories: Maximum number of directories to cache.
+            max_entries: Maximum number of entries to cache, over all directories.
+        """
+        self.max_directories = max_directories
+        self.max_entries = max_entries
+        self._listings: OrderedDict[Path, DirectoryListing] = OrderedDict()
+        self._entry_count = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    def get(self, path: Path) -> DirectoryListing | None:
+        """Get a cached listing, if the directory hasn't changed since it was listed.
+
+        Args:
+            path: Absolute (resolved) path to a directory.
+
+        Returns:
+            A listing, or `None` if it isn't cached or is stale.
+        """
+        with self._lock:
+            if (listing := self._listings.get(path)) is None:
+                return None
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        with self._lock:
+            if mtime_ns != listing.mtime_ns:
+                self._discard(path)
+                return None
+            if path in self._listings:
+                self._listings.move_to_end(path)
+        return listing
+
+    def list_directory(
+        self, path: Path, prefix: str = "", max_matches: int | None = None
+    ) -> DirectoryListing:
+        """List a directory, from the cache if possible.
+
+        If `max_matches` is set, a large directory may stop being read once it has
+        found that many entries starting with `prefix`. Such a listing will have
+        `complete` set to `False`, and isn't cached.
+
+        Args:
+            path: Absolute (resolved) path to a directory.
+            prefix: Prefix of the entries required.
+            max_matches: Number of matching entries required, or `None` to read the
+                entire directory.
+
+        Returns:
+            The directory listing (empty if it can't be read).
+        """
+        if (listing := self.get(path)) is not None:
+            return listing
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return DirectoryListing(path, 0, [])
+        entries: list[tuple[str, bool]] = []
+        add_entry = entries.append
+        match_count = 0
+        try:
+            with os.scandir(path) as directory_entries:
+                for entry in directory_entries:
+                    try:
+                        # Uses the type from the directory listing (no stat required)
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    add_entry((name := entry.name, is_dir))
+                    if max_matches is None or not name.startswith(prefix):
+                        continue
+                    match_count += 1
+                    if match_count >= max_matches and len(entries) >= EARLY_CUTOFF:
+                        return DirectoryListing(path, mtime_ns, entries, False)
+        except OSError:
+            return DirectoryListing(path, mtime_ns, [])
+        listing = DirectoryListing(path, mtime_ns, entries)
+        self._add(listing)
+        return listing
+
+    def invalidate(self, paths: Iterable[Path] | None = None) -> None:
+        """Discard cached listings.
+
+        Args:
+            paths: Paths of changed directories, or `None` for all.
+        """
+        with self._lock:
+            if paths is None:
+                self._listings.clear()
+                self._entry_count = 0
+                return
+            for path in paths:
+                self._discard(path)
+
+    def _add(self, listing: DirectoryListing) -> None:
+        """Add a listing, and discard the least recently used if over the limits.
+
+        Args:
+            listing: A complete listing.
+        """
+        if len(listing) > self.max_entries:
+            return
+        with self._lock:
+            self._discard(listing.path)
+            self._listings[listing.path] = listing
+            self._entry_count += len(listing)
+            while (
+                len(self._listings) > self.max_directories
+                or self._entry_count > self.max_entries
+            ):
+                _path, discarded_listing = self._listings.popitem(last=False)
+                self._entry_count -= len(discarded_listing)
+
+    def _discard(self, path: Path) -> None:
+        """Discard a listing (must be called with the lock held).
+
+        Args:
+            path: Path to the directory.
+        """
+        if (listing := self._listings.pop(path, None)) is not None:
+            self._entry_count -= len(listing)
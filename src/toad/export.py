@@ -0,0 +1,384 @@
+"""
+Export a conversation to Markdown, JSONL, or HTML.
+
+Blocks in the conversation provide an `ExportBlock` (see `ExportProtocol`), which
+references the block's data rather than copying it. Parked blocks keep their
+`ExportBlock` in their model, so the whole conversation may be exported without
+rebuilding any widgets.
+
+Each format is a generator of strings, which is written to disk a chunk at a time (in
+a thread). Large text (such as terminal output) is read in chunks, so the memory used
+doesn't grow with the size of the conversation.
+
+"""
+
+from __future__ import annotations
+
+import codecs
+from dataclasses import dataclass, field
+import difflib
+import html
+import json
+from pathlib import Path
+import re
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping, Sequence
+
+if TYPE_CHECKING:
+    from toad.ansi import PlainTextDecoder
+
+CHUNK_SIZE = 64 * 1024
+"""Size of chunks (in characters or bytes) when reading large text."""
+
+PROGRESS_INTERVAL = 0.1
+"""Minimum seconds between progress reports."""
+
+STREAM_FENCE = "`" * 10
+"""Markdown fence for text which is read in chunks (too long to appear in the text)."""
+
+HTML_STYLE = """\
+body {
+    font-family: system-ui, sans-serif;
+    max-width: 60rem;
+    margin: 2rem auto;
+    padding: 0 1rem;
+    line-height: 1.5;
+    color: #e0e0e0;
+    background: #1e1e1e;
+}
+section { margin: 1rem 0; }
+pre {
+    padding: 0.5rem 1rem;
+    overflow-x: auto;
+    background: #2a2a2a;
+    white-space: pre-wrap;
+}
+.prompt {
+    padding: 0.5rem 1rem;
+    border-left: 4px solid #d67ff9;
+    background: #2e2433;
+    white-space: pre-wrap;
+}
+.thought { color: #a0a0a0; border-left: 4px solid #555; padding-left: 1rem; }
+.tool-call .title, .shell .command { font-family: monospace; font-weight: bold; }
+.status { color: #a0a0a0; }
+.failed, .error { color: #f07178; }
+"""
+
+
+@dataclass(frozen=True)
+class ExportBlock:
+    """The data in a block, to be exported."""
+
+    kind: str
+    """The kind of block (e.g. "prompt", "response", or "tool_call")."""
+    text: str = ""
+    """The text of the block."""
+    data: Mapping[str, Any] = field(default_factory=dict)
+    """Additional JSON serializable data, depending on the kind of block."""
+    read: Callable[[], Iterable[str]] | None = None
+    """Callable which reads the text in chunks, or `None` to use `text`."""
+
+    def iter_text(self) -> Iterable[str]:
+        """Iterate over the text in chunks.
+
+        Returns:
+            Chunks of text.
+        """
+        if self.read is not None:
+            yield from self.read()
+            return
+        text = self.text
+        for offset in range(0, len(text), CHUNK_SIZE):
+            yield text[offset : offset + CHUNK_SIZE]
+
+
+def read_bytes(
+    read: Callable[[int, int], bytes],
+    start: int,
+    end: int,
+    *,
+    plain_text: bool = False,
+) -> Iterator[str]:
+    """Decode a range of bytes in chunks.
+
+    Args:
+        read: Callable which reads bytes from an offset to an end offset.
+        start: First offset.
+        end: Last offset (exclusive).
+        plain_text: Convert terminal output to plain text (see `to_plain_text`).
+
+    Returns:
+        Chunks of text.
+    """
+    decoder: PlainTextDecoder | codecs.IncrementalDecoder
+    if plain_text:
+        from toad.ansi import PlainTextDecoder
+
+        decoder = PlainTextDecoder()
+    else:
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    for offset in range(start, end, CHUNK_SIZE):
+        yield decoder.decode(read(offset, min(offset + CHUNK_SIZE, end)))
+    yield decoder.decode(b"", final=True)
+
+
+def read_diff(path1: str, path2: str, before: str, after: str) -> Iterator[str]:
+    """Generate a unified diff.
+
+    Args:
+        path1: Path of the original file.
+        path2: Path of the modified file.
+        before: Original text.
+        after: Modified text.
+
+    Returns:
+        Lines of the diff.
+    """
+    for line in difflib.unified_diff(
+        before.splitlines(keepends=True),
+        after.splitlines(keepends=True),
+        path1,
+        path2,
+    ):
+        yield line if line.endswith("\n") else f"{line}\n"
+
+
+def get_fence(text: str) -> str:
+    """Get a Markdown fence which is longer than any run of backticks in the text.
+
+    Args:
+        text: Text to be fenced.
+
+    Returns:
+        A fence.
+    """
+    longest_run = max(map(len, re.findall(r"`+", text)), default=0)
+    return "`" * max(3, longest_run + 1)
+
+
+def get_tool_call_text(tool_call: Mapping[str, Any]) -> Iterator[ExportBlock]:
+    """Get the text and diffs in a tool call.
+
+    Args:
+        tool_call: A tool call, from ACP.
+
+    Returns:
+        Blocks with the kind "text" or "diff".
+    """
+    for item in tool_call.get("content") or []:
+        match item:
+            case {"type": "content", "content": {"type": "text", "text": str(text)}}:
+                yield ExportBlock("text", text)
+            case {"type": "diff", "path": str(path), "newText": str(new_text)}:
+                old_text = item.get("oldText") or ""
+                yield ExportBlock(
+                    "diff",
+                    data={"path": path},
+                    read=lambda: read_diff(path, path, old_text, new_text),
+                )
+
+
+def export_markdown(blocks: Iterable[ExportBlock]) -> Iterator[str]:
+    """Export blocks to Markdown.
+
+    Args:
+        blocks: Blocks to export.
+
+    Returns:
+        Chunks of Markdown.
+    """
+    for block in blocks:
+        data = block.data
+        match block.kind:
+            case "prompt":
+                yield "> "
+                for chunk in block.iter_text():
+                    yield chunk.replace("\n", "\n> ")
+                yield "\n\n"
+            case "response" | "markdown":
+                yield from block.iter_text()
+                yield "\n\n"
+            case "thought":
+                yield "<details><summary>Thought</summary>\n\n"
+                yield from block.iter_text()
+                yield "\n\n</details>\n\n"
+            case "tool_call":
+                status = data.get("status") or ""
+                yield f"**🔧 {block.text}** _{status}_\n\n"
+                for item in get_tool_call_text(data.get("toolCall") or {}):
+                    if item.kind == "diff":
+                        yield f"{STREAM_FENCE}diff\n"
+                        yield from item.iter_text()
+                        yield f"{STREAM_FENCE}\n\n"
+                    else:
+                        fence = get_fence(item.text)
+                        yield f"{fence}\n{item.text}\n{fence}\n\n"
+            case "shell":
+                fence = get_fence(block.text)
+                yield f"{fence}console\n$ {block.text}\n{fence}\n\n"
+                if exit_code := data.get("exitCode"):
+                    yield f"_Exit code {exit_code}_\n\n"
+            case "terminal" | "shell_output":
+                if command := data.get("command"):
+                    yield f"**Terminal** `{command}`\n\n"
+                yield f"{STREAM_FENCE}\n"
+                yield from block.iter_text()
+                yield f"\n{STREAM_FENCE}\n\n"
+                if exit_code := data.get("exitCode"):
+                    yield f"_Exit code {exit_code}_\n\n"
+            case "diff":
+                yield f"{STREAM_FENCE}diff\n"
+                yield from block.iter_text()
+                yield f"{STREAM_FENCE}\n\n"
+            case "plan":
+                for entry in data.get("entries", []):
+                    check = "x" if entry["status"] == "completed" else " "
+                    yield f"- [{check}] {entry['content']}\n"
+                yield "\n"
+            case _:
+                yield from block.iter_text()
+                yield "\n\n"
+
+
+def export_jsonl(blocks: Iterable[ExportBlock]) -> Iterator[str]:
+    """Export blocks to JSON lines (one object per block).
+
+    Args:
+        blocks: Blocks to export.
+
+    Returns:
+        Chunks of JSON lines.
+    """
+    for block in blocks:
+        header = json.dumps({"kind": block.kind, **block.data}, default=str)
+        # Stream the text as the last value in the object
+        yield f'{header[:-1]}, "text": "'
+        for chunk in block.iter_text():
+            yield json.dumps(chunk)[1:-1]
+        yield '"}\n'
+
+
+def export_html(blocks: Iterable[ExportBlock], title: str = "Toad") -> Iterator[str]:
+    """Export blocks to a self-contained HTML page.
+
+    Args:
+        blocks: Blocks to export.
+        title: Title of the page.
+
+    Returns:
+        Chunks of HTML.
+    """
+    from markdown_it import MarkdownIt
+
+    # Raw HTML in Markdown is escaped, as it may come from untrusted content
+    markdown = MarkdownIt("gfm-like", {"html": False})
+    escape = html.escape
+
+    def escape_text(block: ExportBlock) -> Iterator[str]:
+        for chunk in block.iter_text():
+            yield escape(chunk, quote=False)
+
+    yield (
+        f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset='utf-8'>\n"
+        f"<title>{escape(title)}</title>\n<style>\n{HTML_STYLE}</style>\n"
+        "</head>\n<body>\n"
+    )
+    for block in blocks:
+        data = block.data
+        kind = block.kind
+        yield f"<section class='{kind.replace('_', '-')}'>\n"
+        match kind:
+            case "prompt":
+                yield "<div class='prompt'>"
+                yield from escape_text(block)
+                yield "</div>\n"
+            case "response" | "markdown" | "thought":
+                # Rendered a block at a time (Markdown can't be rendered in chunks)
+                yield markdown.render("".join(block.iter_text()))
+            case "tool_call":
+                status = escape(str(data.get("status") or ""))
+                yield (
+                    f"<p><span class='title'>🔧 {escape(block.text)}</span> "
+                    f"<span class='status {status}'>{status}</span></p>\n"
+                )
+                for item in get_tool_call_text(data.get("toolCall") or {}):
+                    yield "<pre>"
+                    yield from escape_text(item)
+                    yield "</pre>\n"
+            case "shell":
+                yield f"<pre class='command'>$ {escape(block.text)}</pre>\n"
+                if exit_code := data.get("exitCode"):
+                    yield f"<p class='error'>Exit code {exit_code}</p>\n"
+            case "terminal" | "shell_output" | "diff":
+                if command := data.get("command"):
+                    yield f"<p class='command'>{escape(command)}</p>\n"
+                yield "<pre>"
+                yield from escape_text(block)
+                yield "</pre>\n"
+                if exit_code := data.get("exitCode"):
+                    yield f"<p class='error'>Exit code {exit_code}</p>\n"
+            case "plan":
+                yield "<ul>\n"
+                for entry in data.get("entries", []):
+                    check = "☑" if entry["status"] == "completed" else "☐"
+                    yield f"<li>{check} {escape(entry['content'])}</li>\n"
+                yield "</ul>\n"
+            case _:
+                yield "<p>"
+                yield from escape_text(block)
+                yield "</p>\n"
+        yield "</section>\n"
+    yield "</body>\n</html>\n"
+
+
+FORMATS: dict[str, tuple[str, Callable[[Iterable[ExportBlock]], Iterator[str]]]] = {
+    "markdown": (".md", export_markdown),
+    "jsonl": (".jsonl", export_jsonl),
+    "html": (".html", export_html),
+}
+"""Export formats, mapped on to the file extension and a generator of the export."""
+
+
+def export(
+    blocks: Sequence[ExportBlock],
+    format: str,
+    path: Path,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Export blocks to a file (blocks, so call from a thread).
+
+    The export is written to a temporary file, which replaces `path` when complete.
+
+    Args:
+        blocks: Blocks to export.
+        format: One of the keys in `FORMATS`.
+        path: Path of the file to write.
+        progress: Callable which receives the number of blocks exported, and the total.
+
+    Returns:
+        Number of characters written.
+    """
+    _, generate = FORMATS[format]
+    total = len(blocks)
+
+    def iter_blocks() -> Iterator[ExportBlock]:
+        last_report = monotonic()
+        for index, block in enumerate(blocks):
+            if progress is not None and monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = monotonic()
+                progress(index, total)
+            yield block
+        if progress is not None:
+            progress(total, total)
+
+    part_path = path.with_name(f"{path.name}.part")
+    written = 0
+    try:
+        with part_path.open("w", encoding="utf-8", newline="") as export_file:
+            for chunk in generate(iter_blocks()):
+                written += export_file.write(chunk)
+        part_path.replace(path)
+    finally:
+        part_path.unlink(missing_ok=True)
+    return written
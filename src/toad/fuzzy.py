@@ -7,35 +7,152 @@ This class is used by the [command palette](/guide/command_palette) to match sea
 
 from __future__ import annotations
 
-from functools import lru_cache
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache, partial
+import heapq
 from operator import itemgetter
 from re2 import finditer
-from typing import Iterable, Sequence
+from threading import Lock
+from time import monotonic
+from typing import Callable, Iterable, Sequence
 
 
 from textual.cache import LRUCache
 
+CHARACTER_BITS: dict[str, int] = {
+    **{chr(code): 1 << (36 + code % 28) for code in range(128)},
+    **{
+        character: 1 << bit
+        for bit, character in enumerate("abcdefghijklmnopqrstuvwxyz0123456789")
+    },
+}
+"""Bit for each character in a character mask. Other characters share the top bits."""
+
+
+MATCH_CHUNK_SIZE = 256
+"""Number of candidates to match between checks for cancellation."""
+
+PROGRESS_INTERVAL = 0.1
+"""Minimum seconds between reports of partial matches."""
+
+
+class MatchCancelled(Exception):
+    """Matching a table was cancelled."""
+
+
+def get_character_mask(text: str) -> int:
+    """Get a 64 bit mask of the characters in the text.
+
+    If a query has a bit that is not in a candidate's mask, the candidate can't match.
+    Characters may share a bit, so the reverse is not true.
+
+    Args:
+        text: Text (lower cased if the match is not case sensitive).
+
+    Returns:
+        Mask of characters.
+    """
+    mask = 0
+    character_bits = CHARACTER_BITS
+    for character in set(text):
+        mask |= character_bits.get(character) or 1 << (36 + ord(character) % 28)
+    return mask
+
+
+@dataclass(frozen=True, eq=False)
+class CandidateTable:
+    """Candidates prepared once, to be matched against many queries.
+
+    Create with `FuzzySearch.make_table`.
+    """
+
+    candidates: Sequence[str]
+    """Candidates, lower cased if the match is not case sensitive."""
+    masks: array[int]
+    """Mask of characters in each candidate (see `get_character_mask`)."""
+    first_letters: array[int]
+    """Offsets of first letters, for every candidate in turn."""
+    first_letter_index: array[int]
+    """Index of each candidate's first offset in `first_letters` (plus the end)."""
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def get_first_letters(self, index: int) -> frozenset[int]:
+        """Get the offsets of first letters in a candidate.
+
+        Args:
+            index: Index of the candidate.
+
+        Returns:
+            Offsets.
+        """
+        start, end = self.first_letter_index[index : index + 2]
+        return frozenset(self.first_letters[start:end])
+
+
+@dataclass(frozen=True)
+class TableMatches:
+    """The candidates in a table which match a query."""
+
+    query: str
+    """The query (lower cased if the match is not case sensitive)."""
+    indices: array[int]
+    """Indices of matching candidates, in table order."""
+    scores: array[float]
+    """Score of each matching candidate."""
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def get_best(self, count: int) -> list[tuple[int, float]]:
+        """Get the best matches, keeping only `count` in a heap (rather than sorting).
+
+        Args:
+            count: Maximum number of matches.
+
+        Returns:
+            A list of (candidate index, score), best first. Equal scores are in table
+                order.
+        """
+        indices, scores = self.indices, self.scores
+        best = heapq.nlargest(count, range(len(scores)), key=scores.__getitem__)
+        return [(indices[match], scores[match]) for match in best]
+
 
 class FuzzySearch:
     """Performs a fuzzy search.
 
-    Unlike a regex solution, this will finds all possible matches.
+    Unlike a regex solution, this will find the best possible match.
     """
 
     def __init__(
-        self, case_sensitive: bool = False, *, cache_size: int = 1024 * 4
+        self,
+        case_sensitive: bool = False,
+        *,
+        cache_size: int = 1024 * 4,
+        table_cache_size: int = 2_000_000,
     ) -> None:
         """Initialize fuzzy search.
 
         Args:
             case_sensitive: Is the match case sensitive?
             cache_size: Number of queries to cache.
+            table_cache_size: Total number of matching candidates to cache, over all
+                queries matched against a table.
         """
 
         self.case_sensitive = case_sensitive
         self.cache: LRUCache[tuple[str, str], tuple[float, Sequence[int]]] = LRUCache(
             cache_size
         )
+        self.table_cache_size = table_cache_size
+        self._table: CandidateTable | None = None
+        self._table_matches: OrderedDict[str, TableMatches] = OrderedDict()
+        self._table_matches_size = 0
+        self._table_lock = Lock()
 
     def match(self, query: str, candidate: str) -> tuple[float, Sequence[int]]:
         """Match against a query.
@@ -56,21 +173,203 @@ class FuzzySearch:
         self.cache[cache_key] = result
         return result
 
+    def make_table(self, candidates: Iterable[str]) -> CandidateTable:
+        """Prepare candidates to be matched with `match_table`.
+
+        This may take a while for many candidates, so consider calling it in a thread.
+
+        Args:
+            candidates: Candidates to match.
+
+        Returns:
+            A table of candidates.
+        """
+        if self.case_sensitive:
+            folded_candidates = list(candidates)
+        else:
+            folded_candidates = [candidate.lower() for candidate in candidates]
+        masks = array("Q")
+        first_letters = array("I")
+        first_letter_index = array("I", [0])
+        find_first_letters = self.find_first_letters
+        for candidate in folded_candidates:
+            masks.append(get_character_mask(candidate))
+            first_letters.extend(find_first_letters(candidate))
+            first_letter_index.append(len(first_letters))
+        return CandidateTable(
+            folded_candidates, masks, first_letters, first_letter_index
+        )
+
+    def match_table(
+        self,
+        query: str,
+        table: CandidateTable,
+        *,
+        cancelled: Callable[[], bool] | None = None,
+        progress: Callable[[TableMatches], None] | None = None,
+    ) -> TableMatches:
+        """Match a query against every candidate in a table.
+
+        Candidates which don't contain every character in the query are rejected by
+        their character mask, without matching. Matches are cached per query (until
+        a different table is matched). A candidate which doesn't match a query can't
+        match a longer query with the same prefix, so an extended query matches only
+        the candidates which matched the longest cached prefix.
+
+        May be called from threads, but only one match runs at a time.
+
+        Args:
+            query: The fuzzy query.
+            table: Candidates from `make_table`.
+            cancelled: Callable which returns `True` to abandon the match. Checked
+                every `MATCH_CHUNK_SIZE` candidates.
+            progress: Callable which receives the matches so far, at most every
+                `PROGRESS_INTERVAL` seconds (called from the matching thread).
+
+        Raises:
+            MatchCancelled: If `cancelled` returned `True`.
+
+        Returns:
+            The matching candidates, with their scores.
+        """
+        with self._table_lock:
+            return self._match_table(query, table, cancelled, progress)
+
+    def _match_table(
+        self,
+        query: str,
+        table: CandidateTable,
+        cancelled: Callable[[], bool] | None,
+        progress: Callable[[TableMatches], None] | None,
+    ) -> TableMatches:
+        if not self.case_sensitive:
+            query = query.lower()
+        cached_matches = self._table_matches
+        if table is not self._table:
+            self._table = table
+            cached_matches.clear()
+            self._table_matches_size = 0
+        if (matches := cached_matches.get(query)) is not None:
+            cached_matches.move_to_end(query)
+            return matches
+        if not query:
+            return TableMatches(query, array("I"), array("d"))
+
+        candidate_indices: Iterable[int] = range(len(table))
+        for prefix_length in range(len(query) - 1, 0, -1):
+            prefix_matches = cached_matches.get(query[:prefix_length])
+            if prefix_matches is not None:
+                candidate_indices = prefix_matches.indices
+                break
+
+        query_mask = get_character_mask(query)
+        masks = table.masks
+        candidates = table.candidates
+        get_first_letters = table.get_first_letters
+        align = self._align
+        no_match: tuple[float, Sequence[int]] = (0.0, ())
+        indices = array("I")
+        scores = array("d")
+        matches = TableMatches(query, indices, scores)
+        filtered_indices = [
+            index
+            for index in candidate_indices
+            if masks[index] & query_mask == query_mask
+        ]
+        report_time = monotonic() + PROGRESS_INTERVAL
+        for start in range(0, len(filtered_indices), MATCH_CHUNK_SIZE):
+            if cancelled is not None and cancelled():
+                raise MatchCancelled()
+            if progress is not None and monotonic() >= report_time:
+                progress(matches)
+                report_time = monotonic() + PROGRESS_INTERVAL
+            for index in filtered_indices[start : start + MATCH_CHUNK_SIZE]:
+                score, _ = max(
+                    align(query, candidates[index], partial(get_first_letters, index)),
+                    key=itemgetter(0),
+                    default=no_match,
+                )
+                if score:
+                    indices.append(index)
+                    scores.append(score)
+
+        if len(matches) <= self.table_cache_size:
+            cached_matches[query] = matches
+            self._table_matches_size += len(matches)
+            while self._table_matches_size > self.table_cache_size:
+                _, evicted_matches = cached_matches.popitem(last=False)
+                self._table_matches_size -= len(evicted_matches)
+        return matches
+
+    def get_table_offsets(
+        self, query: str, table: CandidateTable, index: int
+    ) -> Sequence[int]:
+        """Get the offsets of the best match of a query in a candidate from a table.
+
+        Args:
+            query: The fuzzy query.
+            table: Candidates from `make_table`.
+            index: Index of the candidate.
+
+        Returns:
+            Offsets of the query letters (for highlighting), or empty if no match.
+        """
+        if not self.case_sensitive:
+            query = query.lower()
+        _, offsets = max(
+            self._align(
+                query, table.candidates[index], partial(table.get_first_letters, index)
+            ),
+            key=itemgetter(0),
+            default=(0.0, ()),
+        )
+        return offsets
+
     @classmethod
     @lru_cache(maxsize=1024)
     def get_first_letters(cls, candidate: str) -> frozenset[int]:
-        return frozenset({match.start() for match in finditer(r"\w+", candidate)})
+        return frozenset(cls.find_first_letters(candidate))
+
+    @classmethod
+    def find_first_letters(cls, candidate: str) -> Iterable[int]:
+        """Find the offsets of the letters which start a word.
+
+        Args:
+            candidate: A candidate.
+
+        Returns:
+            Offsets, in order.
+        """
+        return [match.start() for match in finditer(r"\w+", candidate)]
 
     def score(self, candidate: str, positions: Sequence[int]) -> float:
         """Score a search.
 
+        The search doesn't score every alignment of the query. For each number of
+        groups (runs of consecutive offsets), it scores only the alignment with the
+        most first letters. An override finds the best match only if its score depends
+        on just those two counts, increasing with first letters and decreasing with
+        groups.
+
+        Args:
+            candidate: The candidate.
+            positions: Offsets of the query letters within the candidate.
+
+        Returns:
+            Score.
+        """
+        return self._score(positions, self.get_first_letters(candidate))
+
+    def _score(self, positions: Sequence[int], first_letters: frozenset[int]) -> float:
+        """Score a search, with the first letters of the candidate (see `score`).
+
         Args:
-            search: Search object.
+            positions: Offsets of the query letters within the candidate.
+            first_letters: Offsets of first letters in the candidate.
 
         Returns:
             Score.
         """
-        first_letters = self.get_first_letters(candidate)
         # This is a heuristic, and can be tweaked for better results
         # Boost first letter matches
         offset_count = len(positions)
@@ -91,50 +390,137 @@ class FuzzySearch:
     def _match(
         self, query: str, candidate: str
     ) -> Iterable[tuple[float, Sequence[int]]]:
-        letter_positions: list[list[int]] = []
-        position = 0
-
         if not self.case_sensitive:
             candidate = candidate.lower()
             query = query.lower()
+        return self._align(query, candidate, partial(self.get_first_letters, candidate))
 
-        score = self.score
-
-        for offset, letter in enumerate(query):
-            last_index = len(candidate) - offset
-            positions: list[int] = []
-            letter_positions.append(positions)
-            index = position
-            while (location := candidate.find(letter, index)) != -1:
-                positions.append(location)
-                index = location + 1
-                if index >= last_index:
-                    break
-            if not positions:
-                yield (0.0, ())
-                return
-            position = positions[0] + 1
-
-        possible_offsets: list[list[int]] = []
-        query_length = len(query)
-
-        def get_offsets(offsets: list[int], positions_index: int) -> None:
-            """Recursively match offsets.
+    def _align(
+        self,
+        query: str,
+        candidate: str,
+        get_first_letters: Callable[[], frozenset[int]],
+    ) -> Iterable[tuple[float, Sequence[int]]]:
+        """Find the best alignments of the query within the candidate.
 
-            Args:
-                offsets: A list of offsets.
-                positions_index: Index of query letter.
+        The score is assumed to depend only on the number of offsets that are first
+        letters (more is better), and the number of groups of consecutive offsets
+        (fewer is better); see `score`. Rather than scoring every alignment, a dynamic
+        program finds the most first letters for each possible number of groups, in
+        O(len(query)² × len(candidate)) (each state holds a count per number of
+        groups). Only those alignments are scored.
 
-            """
-            for offset in letter_positions[positions_index]:
-                if not offsets or offset > offsets[-1]:
-                    new_offsets = [*offsets, offset]
-                    if len(new_offsets) == query_length:
-                        possible_offsets.append(new_offsets)
-                    else:
-                        get_offsets(new_offsets, positions_index + 1)
+        Args:
+            query: The fuzzy query (lower cased if the match is not case sensitive).
+            candidate: A candidate to check (likewise lower cased).
+            get_first_letters: Callable which gets the offsets of first letters in the
+                candidate (called only if the query matches).
 
-        get_offsets([], 0)
+        Returns:
+            Pairs of (score, offsets), or a single `(0, ())` if there is no match.
+        """
+        query_length = len(query)
+        if not query_length:
+            return
 
-        for offsets in possible_offsets:
-            yield score(candidate, offsets), offsets
+        # Range of possible offsets for each letter, from the first and last matches
+        earliest: list[int] = []
+        position = 0
+        for letter in query:
+            if (position := candidate.find(letter, position)) == -1:
+                yield (0.0, ())
+                return
+            earliest.append(position)
+            position += 1
+        latest: list[int] = [0] * query_length
+        position = len(candidate)
+        for query_index in range(query_length - 1, -1, -1):
+            position = candidate.rfind(query[query_index], 0, position)
+            latest[query_index] = position
+
+        first_letters = get_first_letters()
+        state_size = query_length + 1
+        # Remains negative after adding a first letter for every query letter
+        no_alignment = -state_size
+
+        # For each query letter, maps an offset on to a list indexed by the number of
+        # groups, of the most first letters in an alignment ending at that offset
+        # (negative if there is no such alignment).
+        states: list[dict[int, list[int]]] = []
+        for query_index, letter in enumerate(query):
+            offsets: list[int] = []
+            position = earliest[query_index]
+            end = latest[query_index] + 1
+            while position != -1:
+                offsets.append(position)
+                position = candidate.find(letter, position + 1, end)
+
+            letter_states: dict[int, list[int]] = {}
+            states.append(letter_states)
+            if not query_index:
+                for offset in offsets:
+                    first_letter_count = [no_alignment] * state_size
+                    first_letter_count[1] = int(offset in first_letters)
+                    letter_states[offset] = first_letter_count
+                continue
+
+            previous_states = states[query_index - 1]
+            previous_items = iter(previous_states.items())
+            next_previous = next(previous_items, None)
+            # Most first letters in alignments ending before the current gap
+            best_count = [no_alignment] * state_size
+            for offset in offsets:
+                while next_previous is not None and next_previous[0] < offset - 1:
+                    best_count = list(map(max, best_count, next_previous[1]))
+                    next_previous = next(previous_items, None)
+                # Start a new group (so one more group than the previous alignment)
+                first_letter_count = [no_alignment, *best_count[:-1]]
+                if (contiguous := previous_states.get(offset - 1)) is not None:
+                    # Extend the last group
+                    first_letter_count = list(
+                        map(max, first_letter_count, contiguous)
+                    )
+                if max(first_letter_count) < 0:
+                    continue
+                if offset in first_letters:
+                    first_letter_count = [count + 1 for count in first_letter_count]
+                letter_states[offset] = first_letter_count
+
+        score: Callable[[Sequence[int]], float]
+        if type(self).score is FuzzySearch.score:
+            score = partial(self._score, first_letters=first_letters)
+        else:
+            # An overridden score gets the candidate, and finds the first letters
+            score = partial(self.score, candidate)
+
+        # Score the alignments which have more first letters than any with fewer groups
+        most_first_letters = -1
+        for groups in range(1, query_length + 1):
+            best_end = -1
+            for offset, first_letter_count in states[-1].items():
+                if first_letter_count[groups] > most_first_letters:
+                    most_first_letters = first_letter_count[groups]
+                    best_end = offset
+            if best_end == -1:
+                continue
+            # Work backwards to find an alignment with that many first letters
+            positions = [best_end]
+            offset = best_end
+            count = most_first_letters
+            alignment_groups = groups
+            for previous_states in reversed(states[:-1]):
+                count -= offset in first_letters
+                contiguous = previous_states.get(offset - 1)
+                if contiguous is not None and contiguous[alignment_groups] == count:
+                    offset -= 1
+                else:
+                    alignment_groups -= 1
+                    offset = next(
+                        previous_offset
+                        for previous_offset, previous_count in previous_states.items()
+                        if previous_offset < offset - 1
+                        and previous_count[alignment_groups] == count
+                    )
+                positions.append(offset)
+            positions.reverse()
+            yield score(positions), positions
@@ -0,0 +1,335 @@
+"""
+Incremental syntax highlighting.
+
+The state of the lexer is recorded at the start of every line (where no token spans the
+line break). When the text changes, lexing resumes from a recorded state just before the
+first changed line, and stops as soon as it reaches a line in the unchanged tail with the
+same state as before. Highlighted lines outside of that range are reused.
+
+This is only exact if the lexer's rules don't depend on text more than a couple of lines
+after the line where they match. That holds for Markdown, if the text ends with a closing
+fence (so any open fence is terminated). It doesn't hold for Bash, where an unterminated
+quote may match up to a quote added many lines later. Only Pygments lexers derived from
+`RegexLexer` can be resumed; other lexers (or `resumable=False`) re-highlight the entire
+text.
+
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Iterable, Sequence
+
+from pygments.lexer import RegexLexer
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Error, Whitespace, _TokenType
+from pygments.util import ClassNotFound
+
+from textual.content import Content, Span
+from textual.highlight import HighlightTheme, highlight
+
+type LexerState = tuple[str, ...]
+"""The lexer's stack of states."""
+
+ROOT_STATE: LexerState = ("root",)
+
+RELEX_CONTEXT_LINES = 2
+"""Lines before an edit which are always re-lexed, as some rules span a line break (such
+as Setext headings in Markdown)."""
+
+
+def _lex(
+    lexer: RegexLexer, text: str, stack: LexerState
+) -> Iterable[tuple[_TokenType | None, str, LexerState | None]]:
+    """Lex text, reporting the state of the lexer after each line break.
+
+    This follows `RegexLexer.get_tokens_unprocessed`, with the addition of the state.
+
+    Args:
+        lexer: A regex lexer.
+        text: Text to lex.
+        stack: The initial lexer state.
+
+    Returns:
+        An iterable of (TOKEN TYPE, VALUE, None) for tokens, or (None, "", STATE) when
+            the lexer is at the start of a line.
+    """
+    pos = 0
+    text_length = len(text)
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while True:
+        for rexmatch, action, new_state in statetokens:
+            if (match := rexmatch(text, pos)) is None:
+                continue
+            if action is not None:
+                if type(action) is _TokenType:
+                    yield action, match.group(), None
+                else:
+                    for _, token_type, value in action(lexer, match):
+                        yield token_type, value, None
+            pos = match.end()
+            if new_state is not None:
+                if isinstance(new_state, tuple):
+                    for state in new_state:
+                        if state == "#pop":
+                            if len(statestack) > 1:
+                                statestack.pop()
+                        elif state == "#push":
+                            statestack.append(statestack[-1])
+                        else:
+                            statestack.append(state)
+                elif isinstance(new_state, int):
+                    if abs(new_state) >= len(statestack):
+                        del statestack[1:]
+                    else:
+                        del statestack[new_state:]
+                elif new_state == "#push":
+                    statestack.append(statestack[-1])
+                statetokens = tokendefs[statestack[-1]]
+            break
+        else:
+            if pos >= text_length:
+                break
+            if text[pos] == "\n":
+                # At EOL, reset state to "root"
+                statestack = ["root"]
+                statetokens = tokendefs["root"]
+                yield Whitespace, "\n", None
+                yield None, "", ROOT_STATE
+            else:
+                yield Error, text[pos], None
+            pos += 1
+            continue
+        if pos and text[pos - 1] == "\n":
+            yield None, "", tuple(statestack)
+
+
+class IncrementalHighlighter:
+    """Highlights lines of text, re-lexing only what may have changed."""
+
+    def __init__(
+        self,
+        language: str,
+        *,
+        theme: type[HighlightTheme] = HighlightTheme,
+        post_process: Callable[[Content], Content] | None = None,
+        resumable: bool = True,
+    ) -> None:
+        """
+
+        Args:
+            language: The language to highlight.
+            theme: A HighlightTheme class (type not instance).
+            post_process: Optional callable to apply additional highlights to a line.
+            resumable: Resume lexing from the edit, if `True`. Otherwise re-highlight
+                everything on each update.
+        """
+        self.language = language
+        self.theme = theme
+        self.post_process = post_process
+        # Tabs are not expanded, so that spans line up with the text
+        try:
+            lexer = get_lexer_by_name(language, stripnl=False, ensurenl=True)
+        except ClassNotFound:
+            lexer = get_lexer_by_name("text", stripnl=False, ensurenl=True)
+        self._lexer: RegexLexer | None = (
+            lexer
+            if resumable
+            and isinstance(lexer, RegexLexer)
+            and type(lexer).get_tokens_unprocessed
+            is RegexLexer.get_tokens_unprocessed
+            and not lexer.filters
+            else None
+        )
+        self._styles: dict[_TokenType, str | None] = {}
+        self._lines: list[str] = []
+        self._highlighted: list[Content] = []
+        self._states: list[LexerState | None] = []
+        self.lexed_lines = 0
+        """Number of lines lexed by the last update."""
+
+    @property
+    def highlighted_lines(self) -> list[Content]:
+        """Lines from the last update."""
+        return self._highlighted
+
+    def _get_style(self, token_type: _TokenType) -> str | None:
+        """Get the style for a token type.
+
+        Args:
+            token_type: Pygments token type.
+
+        Returns:
+            A style, or `None` for no style.
+        """
+        try:
+            return self._styles[token_type]
+        except KeyError:
+            pass
+        styles = self.theme.STYLES
+        style: str | None = None
+        parent_type: _TokenType | None = token_type
+        while parent_type is not None:
+            if style := styles.get(parent_type):
+                break
+            parent_type = parent_type.parent
+        self._styles[token_type] = style or None
+        return style or None
+
+    def _get_unchanged(self, lines: Sequence[str]) -> tuple[int, int]:
+        """Count the lines which are unchanged since the last update.
+
+        Args:
+            lines: New lines.
+
+        Returns:
+            A tuple of the number of unchanged lines at the start, and at the end.
+        """
+        old_lines = self._lines
+        limit = min(len(old_lines), len(lines))
+        prefix = 0
+        while prefix < limit and old_lines[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < limit - prefix
+            and old_lines[-1 - suffix] == lines[-1 - suffix]
+        ):
+            suffix += 1
+        return prefix, suffix
+
+    def patch(self, lines: Sequence[str]) -> list[Content]:
+        """Get lines without lexing, reusing highlighted lines which haven't changed.
+
+        Changed lines are unhighlighted. The state of the highlighter is not updated.
+
+        Args:
+            lines: New lines.
+
+        Returns:
+            Lines of content.
+        """
+        prefix, suffix = self._get_unchanged(lines)
+        highlighted = self._highlighted
+        return [
+            *highlighted[:prefix],
+            *[
+                Content(line).stylize_before("$text")
+                for line in lines[prefix : len(lines) - suffix]
+            ],
+            *highlighted[len(highlighted) - suffix :],
+        ]
+
+    def update(self, lines: Sequence[str]) -> list[Content]:
+        """Highlight lines, re-lexing only lines which may have changed.
+
+        Args:
+            lines: New lines.
+
+        Returns:
+            Highlighted lines.
+        """
+        lines = list(lines)
+        old_lines = self._lines
+        old_states = self._states
+        old_highlighted = self._highlighted
+        prefix, suffix = self._get_unchanged(lines)
+        if prefix == len(lines) == len(old_lines):
+            self.lexed_lines = 0
+            return old_highlighted
+        if self._lexer is None:
+            return self._highlight_all(lines)
+
+        # Resume from the last known state before the change
+        start = max(0, min(prefix - RELEX_CONTEXT_LINES, len(old_lines) - 1))
+        while start > 0 and old_states[start] is None:
+            start -= 1
+        stack = old_states[start] if old_states else ROOT_STATE
+        assert stack is not None
+
+        highlighted = old_highlighted[:start]
+        states = old_states[:start]
+        states.append(stack)
+        line_delta = len(lines) - len(old_lines)
+        unchanged_start = len(lines) - suffix
+
+        text = "\n".join(lines[start:]) + "\n"
+        post_process = self.post_process
+        get_style = self._get_style
+
+        line_index = start
+        line_start = 0
+        offset = 0
+        spans: list[Span] = []
+        stopped = False
+
+        for token_type, value, state in _lex(self._lexer, text, stack):
+            if token_type is None:
+                # Start of a line
+                if offset != line_start or line_index >= len(lines):
+                    continue
+                states[-1] = state
+                if line_index >= unchanged_start:
+                    old_index = line_index - line_delta
+                    if old_states[old_index] == state:
+                        # The rest of the text will lex exactly as before
+                        highlighted.extend(old_highlighted[old_index:])
+                        states.extend(old_states[old_index + 1 :])
+                        stopped = True
+                        break
+                continue
+            style = get_style(token_type)
+            for part_index, part in enumerate(value.split("\n")):
+                if part_index:
+                    # Line break
+                    content = Content(lines[line_index], spans).stylize_before("$text")
+                    if post_process is not None:
+                        content = post_process(content)
+                    highlighted.append(content)
+                    spans = []
+                    offset += 1
+                    line_start = offset
+                    line_index += 1
+                    states.append(None)
+                if part:
+                    if style:
+                        spans.append(
+                            Span(
+                                offset - line_start,
+                                offset - line_start + len(part),
+                                style,
+                            )
+                        )
+                    offset += len(part)
+
+        if not stopped:
+            del states[len(lines) :]
+        self.lexed_lines = line_index - start
+        self._lines = lines
+        self._states = states
+        self._highlighted = highlighted
+        return highlighted
+
+    def _highlight_all(self, lines: list[str]) -> list[Content]:
+        """Highlight lines without recording state.
+
+        Args:
+            lines: Lines to highlight.
+
+        Returns:
+            Highlighted lines.
+        """
+        content = highlight(
+            "\n".join(lines),
+            language=self.language,
+            theme=self.theme,
+            tab_size=0,
+        )
+        highlighted = content.split("\n", allow_blank=True)
+        if self.post_process is not None:
+            highlighted = [self.post_process(line) for line in highlighted]
+        self.lexed_lines = len(lines)
+        self._lines = lines
+        self._highlighted = highlighted
+        return highlighted
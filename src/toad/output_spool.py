@@ -0,0 +1,217 @@
+"""
+An output spool, which keeps a bounded tail of a byte stream in memory, and the complete
+stream on disk.
+
+"""
+
+from __future__ import annotations
+
+from array import array
+from itertools import accumulate
+import mmap
+import tempfile
+from threading import RLock
+from typing import IO
+
+LINE_INDEX_STEP = 256
+"""Number of lines between entries in the line index."""
+
+
+class OutputSpool:
+    """Stores a stream of bytes with a hard cap on memory.
+
+    Output is kept in memory until it exceeds `memory_limit`, at which point the
+    complete stream is written to a temporary file. Reads outside of the in-memory
+    tail are made through a memory map of the file.
+
+    Once the spool is closed, further writes are discarded.
+
+    Methods may be called from any thread. Large reads from disk are copied without
+    holding the lock, so they don't block writes.
+
+    """
+
+    def __init__(self, memory_limit: int = 1024 * 1024) -> None:
+        """
+
+        Args:
+            memory_limit: Maximum number of bytes to keep in memory.
+        """
+        self.memory_limit = memory_limit
+        self._tail = bytearray()
+        """The end of the stream (the complete stream until it is spooled)."""
+        self._size = 0
+        self._closed = False
+        self._lock = RLock()
+        self._file: IO[bytes] | None = None
+        self._mmap: mmap.mmap | None = None
+        self._line_count = 0
+        self._line_index = array("Q", [0])
+        """Offset of the start of every `LINE_INDEX_STEP` lines."""
+
+    @property
+    def size(self) -> int:
+        """Total number of bytes written."""
+        return self._size
+
+    @property
+    def line_count(self) -> int:
+        """Number of complete lines (newlines) written."""
+        return self._line_count
+
+    @property
+    def is_closed(self) -> bool:
+        """Has the spool been closed?"""
+        return self._closed
+
+    @property
+    def is_spooled(self) -> bool:
+        """Has the output been written to disk?"""
+        return self._file is not None
+
+    def write(self, data: bytes) -> None:
+        """Write bytes to the end of the spool.
+
+        Args:
+            data: Bytes to write.
+        """
+        if not data:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._index_lines(data, self._size)
+            self._size += len(data)
+            tail = self._tail
+            if self._file is not None:
+                self._file.write(data)
+            elif len(tail) + len(data) > self.memory_limit:
+                self._file = tempfile.TemporaryFile(prefix="toad-", buffering=0)
+                self._file.write(tail)
+                self._file.write(data)
+
+            tail += data
+            if len(tail) > self.memory_limit:
+                # Keep the most recent half, so trimming is amortized over many writes
+                del tail[: len(tail) - self.memory_limit // 2]
+
+    def _index_lines(self, data: bytes, offset: int) -> None:
+        """Update the line index.
+
+        Args:
+            data: New data.
+            offset: Offset of the data within the stream.
+        """
+        newline_count = data.count(b"\n")
+        if not newline_count:
+            return
+        line_count = self._line_count
+        next_indexed_line = len(self._line_index) * LINE_INDEX_STEP
+        if line_count + newline_count >= next_indexed_line:
+            # Offset of the end of each line within the data
+            line_ends = list(accumulate(map(len, data.split(b"\n"))))
+            line_index = self._line_index
+            while next_indexed_line <= line_count + newline_count:
+                data_line = next_indexed_line - line_count - 1
+                line_index.append(offset + line_ends[data_line] + data_line + 1)
+                next_indexed_line += LINE_INDEX_STEP
+        self._line_count += newline_count
+
+    def _get_view(self) -> bytearray | mmap.mmap:
+        """Get a view of the complete stream.
+
+        Returns:
+            The in-memory buffer if the stream isn't spooled, otherwise a memory map.
+        """
+        if self._file is None:
+            return self._tail
+        if self._mmap is None or len(self._mmap) < self._size:
+            # A previous map is closed once no thread is reading from it
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read(self, start: int = 0, end: int | None = None) -> bytes:
+        """Read a region of the stream.
+
+        Args:
+            start: Start offset.
+            end: End offset, or `None` for the end of the stream.
+
+        Returns:
+            Bytes.
+        """
+        if end is None:
+            end = self._size
+        end = min(end, self._size)
+        if start >= end:
+            return b""
+        with self._lock:
+            tail_start = self._size - len(self._tail)
+            if start >= tail_start:
+                return bytes(self._tail[start - tail_start : end - tail_start])
+            view = self._get_view()
+        return bytes(view[start:end])
+
+    def tail(self, size: int) -> bytes:
+        """Read bytes from the end of the stream.
+
+        Args:
+            size: Maximum number of bytes to read.
+
+        Returns:
+            Up to `size` bytes.
+        """
+        if size <= 0:
+            return b""
+        with self._lock:
+            if size <= len(self._tail):
+                return bytes(self._tail[-size:])
+            start = max(0, self._size - size)
+        return self.read(start)
+
+    def get_line_offset(self, line_no: int) -> int:
+        """Get the offset of the start of a line.
+
+        Args:
+            line_no: Line number (zero-based).
+
+        Returns:
+            Offset within the stream.
+        """
+        with self._lock:
+            if line_no < 0 or line_no > self._line_count:
+                raise IndexError(f"No line {line_no}")
+            start = self._line_index[line_no // LINE_INDEX_STEP]
+            if line_no % LINE_INDEX_STEP:
+                view = self._get_view()
+                for _ in range(line_no % LINE_INDEX_STEP):
+                    start = view.find(b"\n", start) + 1
+            return start
+
+    def get_line(self, line_no: int) -> bytes:
+        """Get a line from the stream.
+
+        Args:
+            line_no: Line number (zero-based).
+
+        Returns:
+            Bytes of the line, without the newline.
+        """
+        with self._lock:
+            start = self.get_line_offset(line_no)
+            view = self._get_view()
+            end = view.find(b"\n", start)
+            if end == -1:
+                end = self._size
+            return bytes(view[start:end])
+
+    def close(self) -> None:
+        """Close the spool, and remove any temporary file."""
+        with self._lock:
+            self._closed = True
+            # The map is closed once no thread is reading from it
+            self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._tail.clear()
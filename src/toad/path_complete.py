@@ -1,7 +1,14 @@
 import asyncio
+import heapq
 import os
 from pathlib import Path
-from typing import Literal, Sequence
+from typing import Iterable, Literal
+
+from toad.directory_cache import DirectoryCache
+from toad.project_index import DIRECTORY, ProjectIndex
+
+MAX_SUGGESTIONS = 100
+"""Maximum number of paths to suggest."""
 
 
 def longest_common_prefix(strings: list[str]) -> str:
@@ -31,38 +38,52 @@ def longest_common_prefix(strings: list[str]) -> str:
     return prefix
 
 
-class DirectoryReadTask:
-    """A task to read a directory."""
-
-    def __init__(self, path: Path) -> None:
-        self.path = path
-        self.done_event = asyncio.Event()
-        self.directory_listing: list[Path] = []
-        self._task: asyncio.Task | None = None
-
-    def read(self) -> None:
-        # TODO: Should this be cancellable, or have a maximum number of paths for the case of very large directories?
-        for path in self.path.iterdir():
-            self.directory_listing.append(path)
-
-    def start(self) -> None:
-        asyncio.create_task(self.run(), name=f"DirectoryReadTask({str(self.path)!r})")
-
-    async def run(self):
-        await asyncio.to_thread(self.read)
-        self.done_event.set()
-
-    async def wait(self) -> list[Path]:
-        await self.done_event.wait()
-        return self.directory_listing
-
-
 class PathComplete:
     """Auto completes paths."""
 
-    def __init__(self) -> None:
-        self.read_tasks: dict[Path, DirectoryReadTask] = {}
-        self.directory_listings: dict[Path, list[Path]] = {}
+    def __init__(
+        self,
+        project_index: ProjectIndex | None = None,
+        directory_cache: DirectoryCache | None = None,
+    ) -> None:
+        self.project_index = project_index
+        """Index to list directories from, if they haven't changed since indexing."""
+        self.directory_cache = (
+            DirectoryCache() if directory_cache is None else directory_cache
+        )
+        """Cache of directory listings (may be shared with the path picker)."""
+
+    def invalidate(self, directory_paths: Iterable[Path] | None = None) -> None:
+        """Discard cached directory listings.
+
+        Args:
+            directory_paths: Paths of changed directories, or `None` for all.
+        """
+        self.directory_cache.invalidate(directory_paths)
+
+    def _list_directory(
+        self, directory_path: Path, node: str
+    ) -> tuple[list[tuple[str, bool]], bool]:
+        """List a directory (in a thread).
+
+        Args:
+            directory_path: Absolute (resolved) path to the directory.
+            node: Prefix of the entries to complete.
+
+        Returns:
+            A tuple of the name of each entry and if it is a directory, and `True` if
+                the directory was listed in full.
+        """
+        if self.project_index is not None and (
+            indexed_listing := self.project_index.list_directory(directory_path)
+        ):
+            return [
+                (name, bool(flags & DIRECTORY)) for name, flags in indexed_listing
+            ], True
+        listing = self.directory_cache.list_directory(
+            directory_path, node, MAX_SUGGESTIONS if node else None
+        )
+        return listing.entries, listing.complete
 
     async def __call__(
         self,
@@ -81,59 +102,42 @@ class PathComplete:
             node = directory_path.name
             directory_path = directory_path.parent
 
-        if (listing := self.directory_listings.get(directory_path)) is None:
-            read_task = DirectoryReadTask(directory_path)
-            self.read_tasks[directory_path] = read_task
-            read_task.start()
-            listing = await read_task.wait()
+        listing, complete = await asyncio.to_thread(
+            self._list_directory, directory_path, node
+        )
 
         if exclude_type is not None:
-            if exclude_type == "dir":
-                listing = [
-                    listing_path
-                    for listing_path in listing
-                    if not listing_path.is_dir()
-                ]
-            else:
-                listing = [
-                    listing_path for listing_path in listing if listing_path.is_dir()
-                ]
+            exclude_directories = exclude_type == "dir"
+            listing = [entry for entry in listing if entry[1] != exclude_directories]
 
         if not node:
-            return None, [listing_path.name for listing_path in listing]
+            # Only sort as many names as can be suggested
+            return None, heapq.nsmallest(MAX_SUGGESTIONS, [name for name, _ in listing])
 
-        matching_nodes = [
-            listing_path
-            for listing_path in listing
-            if listing_path.name.startswith(node)
-        ]
+        matching_nodes = [entry for entry in listing if entry[0].startswith(node)]
         if not (matching_nodes):
             # Nothing matches
             return None, None
 
-        if not (
-            prefix := longest_common_prefix(
-                [node_path.name for node_path in matching_nodes]
-            )
-        ):
+        names = [name for name, _is_dir in matching_nodes]
+        matching_names = heapq.nsmallest(MAX_SUGGESTIONS, names)
+        if not complete:
+            # Other names may match, so the common prefix isn't known
+            return None, [name[len(node) :] for name in matching_names]
+
+        # The common prefix of the first and last names is common to all of them
+        if not (prefix := longest_common_prefix([min(names), max(names)])):
             return None, None
 
-        picked_path = directory_path / prefix
-        path_size = (
-            len(str(Path(directory_path).expanduser().resolve())) + 1 + len(node)
-        )
-        completed_prefix = str(picked_path)[path_size:]
-        path_options = [
-            str(path)[path_size + len(completed_prefix) :] for path in matching_nodes
-        ]
+        completed_prefix = prefix[len(node) :]
+        path_options = [name[len(prefix) :] for name in matching_names]
         path_options = [name for name in path_options if name]
 
-        if picked_path.is_dir() and not path_options:
+        if not path_options and (prefix, True) in matching_nodes:
             completed_prefix += os.sep
 
         return completed_prefix or None, path_options
 
-
 if __name__ == "__main__":
 
     async def run():
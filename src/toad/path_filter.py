@@ -1,21 +1,38 @@
-from itertools import chain
-from typing import Iterable, Sequence
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable
 from pathlib import Path
+import os
+import re
+
 import pathspec
 import pathspec.patterns
 from pathspec import GitIgnoreSpec
+import re2
 
 import rich.repr
 
+GROUP_NAME = re.compile(r"\(\?P<\w+>")
+"""Named groups in the regular expressions from pathspec."""
+
+DIRECTORY_MARK = re.compile(r"\(\?P<ps_d>/\)(?:\.\*\$)?")
+"""The end of a pattern which matches a directory (and any path beneath it)."""
+
+RE2_OPTIONS = re2.Options()
+"""Options for RE2 (errors aren't logged, as the `re` module is used instead)."""
+RE2_OPTIONS.log_errors = False
 
-def load_path_spec(git_ignore_path: Path) -> GitIgnoreSpec | None:
-    """Get a path spec instance if there is a .gitignore file present.
+
+def load_ignore_rules(git_ignore_path: Path) -> IgnoreRules | None:
+    """Get ignore rules if there is a .gitignore file present.
 
     Args:
         git_ignore_path): Path to .gitignore.
 
     Returns:
-        A `PathSpec` instance.
+        An `IgnoreRules` instance, or `None` if there are no patterns.
     """
     try:
         if git_ignore_path.is_file():
@@ -24,35 +41,154 @@ def load_path_spec(git_ignore_path: Path) -> GitIgnoreSpec | None:
             except Exception:
                 # Permissions, encoding issue?
                 return None
-            try:
-                spec = GitIgnoreSpec.from_lines(
-                    pathspec.patterns.GitWildMatchPattern, spec_text.splitlines()
-                )
-            except Exception:
-                return None
-            return spec
+            return compile_ignore_rules(spec_text)
     except OSError:
         return None
     return None
 
 
+@lru_cache(maxsize=1024)
+def compile_ignore_rules(spec_text: str) -> IgnoreRules | None:
+    """Compile the contents of a .gitignore file.
+
+    Cached, as the same .gitignore is often repeated throughout a project.
+
+    Args:
+        spec_text: Contents of a .gitignore file.
+
+    Returns:
+        An `IgnoreRules` instance, or `None` if there are no patterns.
+    """
+    try:
+        spec = GitIgnoreSpec.from_lines(
+            pathspec.patterns.GitWildMatchPattern, spec_text.splitlines()
+        )
+        patterns = [
+            (pattern.regex.pattern, pattern.include)
+            for pattern in spec.patterns
+            if pattern.include is not None
+        ]
+        return IgnoreRules(patterns) if patterns else None
+    except Exception:
+        return None
+
+
+class IgnoreRules:
+    """The patterns from a .gitignore file, compiled to a single RE2 set.
+
+    Matching the set finds every pattern which matches a path in one pass. The last of
+    those decides if the path is ignored (a "!" pattern includes it again).
+
+    If RE2 doesn't support a pattern, the patterns are combined in to a single `re`
+    alternation instead, in reverse order, so the first alternative to match is the
+    last matching pattern.
+    """
+
+    def __init__(self, patterns: Iterable[tuple[str, bool]]) -> None:
+        """Ignore rules.
+
+        Args:
+            patterns: The regular expression of each pattern (from pathspec), and
+                `True` to ignore matching paths or `False` to include them.
+        """
+        expressions: list[str] = []
+        self._includes: list[bool] = []
+        for expression, include in patterns:
+            if expression.endswith("/"):
+                # A trailing "/**" matches paths beneath the directory, but not the
+                # directory itself (which would prevent "!" patterns beneath it)
+                expression += ".+"
+            # Match the directory, but not the paths beneath it
+            expression = DIRECTORY_MARK.sub("/$", expression)
+            expression = GROUP_NAME.sub("(?:", expression)
+            assert expression.startswith("^")
+            expressions.append(expression)
+            self._includes.append(include)
+        self._rule_set: re2.Set | None = None
+        self._regex: re.Pattern[str] | None = None
+        try:
+            rule_set = re2.Set.MatchSet(RE2_OPTIONS)
+            for expression in expressions:
+                rule_set.Add(expression)
+            rule_set.Compile()
+        except re2.error:
+            alternatives = [
+                f"(?P<p{index}>{expression[1:]})"
+                for index, expression in reversed(list(enumerate(expressions)))
+            ]
+            self._regex = re.compile(f"^(?:{'|'.join(alternatives)})")
+        else:
+            self._rule_set = rule_set
+
+    def match(self, path: str) -> bool | None:
+        """Check if a path is ignored.
+
+        Args:
+            path: A path relative to the .gitignore's directory, with a trailing "/"
+                for a directory.
+
+        Returns:
+            `True` if the path is ignored, `False` if it is included, or `None` if no
+                pattern matched.
+        """
+        if self._rule_set is not None:
+            if (indices := self._rule_set.Match(path)) is None:
+                return None
+            return self._includes[max(indices)]
+        assert self._regex is not None
+        if (match := self._regex.match(path)) is None:
+            return None
+        assert match.lastgroup is not None
+        return self._includes[int(match.lastgroup[1:])]
+
+
+@dataclass(frozen=True)
+class DirectoryRules:
+    """How to match the entries of a directory."""
+
+    ignored: bool
+    """Is the directory ignored (its entries are ignored too)?"""
+    prefix: str
+    """Path of the directory relative to the base, with a trailing "/" if not empty."""
+    rules: tuple[tuple[int, IgnoreRules], ...]
+    """Rules from the .gitignore files which apply (nearest first), and the length of
+    the prefix of each .gitignore's directory."""
+
+
 @rich.repr.auto
 class PathFilter:
-    """Filter paths according to .gitignore files."""
+    """Filter paths according to .gitignore files.
+
+    The patterns in each .gitignore are compiled to a single regular expression. The
+    rules which apply to a directory (from its .gitignore file, and those of its
+    parents) are found the first time an entry in that directory is matched, and
+    remembered along with whether the directory itself is ignored (in which case its
+    entries are ignored without matching them).
+    """
 
     def __init__(
-        self, root: Path, path_specs: Iterable[GitIgnoreSpec] | None = None
+        self,
+        root: Path,
+        ignore_rules: Iterable[tuple[Path, IgnoreRules]] | None = None,
     ) -> None:
+        """Path filter.
+
+        Args:
+            root: Root directory.
+            ignore_rules: Rules from .gitignore files above the root, and the directory
+                of each .gitignore (outermost first).
+        """
         self._root = root
-        self._default_specs = [] if path_specs is None else list(path_specs)
-        self._path_specs: dict[Path, Sequence[GitIgnoreSpec]] = {}
+        self._default_rules = [] if ignore_rules is None else list(ignore_rules)
+        self._base = self._default_rules[0][0] if self._default_rules else root
+        self._directories: dict[str, DirectoryRules] = {}
 
     def __rich_repr__(self) -> rich.repr.Result:
         yield (str(self._root),)
 
     @classmethod
     def from_git_root(cls, path: Path) -> PathFilter:
-        """Load all path specs from parent directories up to the most recent directory with .git
+        """Load ignore rules from parent directories up to the most recent directory with .git
 
         Args:
             path: A directory path.
@@ -61,60 +197,112 @@ class PathFilter:
             PathFilter instance.
         """
         filter_root = path
-        path_specs: list[GitIgnoreSpec] = []
+        ignore_rules: list[tuple[Path, IgnoreRules]] = []
         try:
-            while (parent := path.parent) != parent:
-                if (path_spec := load_path_spec(path / ".gitignore")) is not None:
-                    path_specs.append(path_spec)
+            while (parent := path.parent) != path:
+                if path != filter_root and (
+                    rules := load_ignore_rules(path / ".gitignore")
+                ):
+                    ignore_rules.append((path, rules))
                 if (path / ".git").is_dir():
                     break
                 path = parent
             else:
-                del path_specs[:]
+                del ignore_rules[:]
         except OSError:
             pass
-        return PathFilter(filter_root, reversed(path_specs))
+        return PathFilter(filter_root, reversed(ignore_rules))
 
-    def get_path_specs(self, path: Path) -> Sequence[GitIgnoreSpec]:
-        """Get a sequence of path specs applicable to the give path.
+    def _get_prefix(self, directory: Path) -> str:
+        """Get the prefix for a directory's patterns and entries.
+
+        Args:
+            directory: A directory at or beneath the base.
+
+        Returns:
+            The path relative to the base, with a trailing "/" (unless empty).
+        """
+        if directory == self._base:
+            return ""
+        return f"{directory.relative_to(self._base).as_posix()}/"
 
-        This will inherit path specs up to the root path of the filtr.
+    def get_directory_rules(self, directory: Path) -> DirectoryRules:
+        """Get the rules for matching the entries in a directory.
 
         Args:
-            path: A directory path
+            directory: A directory path.
 
         Returns:
-            A sequence of path specs.
+            Rules for the directory (cached).
         """
-        if (cached_path_specs := self._path_specs.get(path)) is not None:
-            return cached_path_specs
-        path_spec = load_path_spec(path / ".gitignore")
-        if path == self._root:
-            path_specs = [path_spec] if path_spec is not None else []
-        else:
-            parent_path_specs = self.get_path_specs(path.parent)
-            path_specs = (
-                parent_path_specs
-                if path_spec is None
-                else [*parent_path_specs, path_spec]
+        if (directory_rules := self._directories.get(str(directory))) is not None:
+            return directory_rules
+        rules: tuple[tuple[int, IgnoreRules], ...]
+        if directory == self._root or not directory.is_relative_to(self._root):
+            if directory != self._root:
+                # Outside of the root
+                directory_rules = DirectoryRules(False, "", ())
+                self._directories[str(directory)] = directory_rules
+                return directory_rules
+            ignored = False
+            rules = tuple(
+                (len(self._get_prefix(spec_directory)), spec_rules)
+                for spec_directory, spec_rules in reversed(self._default_rules)
             )
-        self._path_specs[path] = path_specs
-        return path_specs
+        else:
+            parent_rules = self.get_directory_rules(directory.parent)
+            ignored = self._match(parent_rules, directory.name, True)
+            rules = parent_rules.rules
+        prefix = self._get_prefix(directory)
+        if not ignored:
+            ignore_rules = load_ignore_rules(directory / ".gitignore")
+            if ignore_rules is not None:
+                rules = ((len(prefix), ignore_rules), *rules)
+        directory_rules = DirectoryRules(ignored, prefix, rules)
+        self._directories[str(directory)] = directory_rules
+        return directory_rules
 
-    def match(self, path: Path) -> bool:
-        """Match a path againt the path filter.
+    @classmethod
+    def _match(cls, directory_rules: DirectoryRules, name: str, is_dir: bool) -> bool:
+        """Match an entry in a directory.
+
+        Args:
+            directory_rules: Rules for the directory.
+            name: Name of the entry.
+            is_dir: Is the entry a directory?
 
         Returns:
-            `True` if the path should be removed, `False` if it should be included.
+            `True` if the entry should be removed.
         """
-        if path.name == ".git":
+        if directory_rules.ignored or name == ".git":
             return True
-        path_specs = self.get_path_specs(path.parent)
-        for path_spec in chain(self._default_specs, path_specs):
-            if path_spec.match_file(path):
-                return True
+        path = directory_rules.prefix + name
+        if is_dir:
+            path += "/"
+        for offset, rules in directory_rules.rules:
+            if (ignored := rules.match(path[offset:])) is not None:
+                return ignored
         return False
 
+    def match(self, path: Path | str, is_dir: bool | None = None) -> bool:
+        """Match a path againt the path filter.
+
+        Args:
+            path: Path to match.
+            is_dir: Is the path a directory, or `None` to check the file system.
+
+        Returns:
+            `True` if the path should be removed, `False` if it should be included.
+        """
+        directory, name = os.path.split(path)
+        if (directory_rules := self._directories.get(directory)) is None:
+            directory_rules = self.get_directory_rules(Path(directory))
+        if not directory_rules.rules or directory_rules.ignored:
+            return directory_rules.ignored or name == ".git"
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        return self._match(directory_rules, name, is_dir)
+
 
 if __name__ == "__main__":
     path_filter = PathFilter.from_git_root(Path("."))
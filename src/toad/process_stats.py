@@ -0,0 +1,256 @@
+"""
+Resource accounting for running processes.
+
+Stats are read from `/proc`, so are only available on Linux. On other platforms only
+the wall time is reported.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, replace
+import os
+from time import monotonic
+from typing import Callable
+
+PROC_PATH = "/proc"
+IS_SUPPORTED = os.path.exists(f"{PROC_PATH}/self/stat")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass(frozen=True)
+class ProcessStats:
+    """Resources used by a process and its descendants."""
+
+    wall_time: float
+    """Time since the process started (seconds)."""
+    cpu_time: float = 0.0
+    """User and system CPU time (seconds)."""
+    rss: int = 0
+    """Resident set size (bytes)."""
+    read_bytes: int = 0
+    """Bytes read from storage."""
+    write_bytes: int = 0
+    """Bytes written to storage."""
+    process_count: int = 0
+    """Number of processes in the tree."""
+
+    @property
+    def summary(self) -> str:
+        """A short summary, suitable for a border subtitle."""
+        if not IS_SUPPORTED:
+            return format_duration(self.wall_time)
+        return (
+            f"cpu {format_duration(self.cpu_time)} · "
+            f"rss {format_bytes(self.rss)} · "
+            f"io {format_bytes(self.read_bytes)}/{format_bytes(self.write_bytes)} · "
+            f"{format_duration(self.wall_time)}"
+        )
+
+    def to_meta(self) -> dict[str, float | int]:
+        """Convert to a dict, for the `_meta` field in ACP."""
+        return {
+            "wallTime": round(self.wall_time, 3),
+            "cpuTime": round(self.cpu_time, 3),
+            "rss": self.rss,
+            "readBytes": self.read_bytes,
+            "writeBytes": self.write_bytes,
+            "processCount": self.process_count,
+        }
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration for display.
+
+    Args:
+        seconds: Duration in seconds.
+
+    Returns:
+        Formatted duration.
+    """
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
+
+
+def format_bytes(size: float) -> str:
+    """Format a size in bytes for display.
+
+    Args:
+        size: Number of bytes.
+
+    Returns:
+        Formatted size.
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def _read_process_table() -> dict[int, tuple[int, float, int]]:
+    """Read every process in /proc.
+
+    Returns:
+        A dict that maps pid on to a tuple of (PARENT PID, CPU TIME, RSS).
+    """
+    processes: dict[int, tuple[int, float, int]] = {}
+    for entry in os.scandir(PROC_PATH):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"{entry.path}/stat", "rb") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name may contain spaces and parenthesis; fields follow the last ")"
+        fields = stat[stat.rfind(b")") + 2 :].split()
+        try:
+            parent_pid = int(fields[1])
+            # utime, stime, cutime, cstime
+            cpu_ticks = sum(int(field) for field in fields[11:15])
+            rss_pages = int(fields[21])
+        except (IndexError, ValueError):
+            continue
+        processes[int(entry.name)] = (
+            parent_pid,
+            cpu_ticks / CLOCK_TICKS,
+            rss_pages * PAGE_SIZE,
+        )
+    return processes
+
+
+def _read_io(pid: int) -> tuple[int, int]:
+    """Read I/O counters for a process.
+
+    Args:
+        pid: Process ID.
+
+    Returns:
+        A tuple of (READ BYTES, WRITE BYTES).
+    """
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"{PROC_PATH}/{pid}/io", "rb") as io_file:
+            for line in io_file:
+                name, _, value = line.partition(b":")
+                if name == b"read_bytes":
+                    read_bytes = int(value)
+                elif name == b"write_bytes":
+                    write_bytes = int(value)
+    except (OSError, ValueError):
+        pass
+    return read_bytes, write_bytes
+
+
+class ProcessSampler:
+    """Samples resource usage for a number of process trees, from a single timer."""
+
+    def __init__(self, interval: float = 1.0) -> None:
+        """
+
+        Args:
+            interval: Time between samples (in seconds).
+        """
+        self.interval = interval
+        self._watched: dict[int, tuple[float, Callable[[ProcessStats], None]]] = {}
+        self._last_sample: dict[int, ProcessStats] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, pid: int, callback: Callable[[ProcessStats], None]) -> None:
+        """Start sampling a process tree.
+
+        Args:
+            pid: Process ID of the root of the tree.
+            callback: Callable invoked with stats after every sample.
+        """
+        self._watched[pid] = (monotonic(), callback)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="ProcessSampler")
+
+    def remove(self, pid: int) -> ProcessStats | None:
+        """Stop sampling a process tree.
+
+        Args:
+            pid: Process ID of the root of the tree.
+
+        Returns:
+            The last sample with the final wall time, or `None` if the process wasn't
+                sampled.
+        """
+        if (watched := self._watched.pop(pid, None)) is None:
+            return None
+        start_time, _callback = watched
+        wall_time = monotonic() - start_time
+        if (last_sample := self._last_sample.pop(pid, None)) is None:
+            return ProcessStats(wall_time)
+        return replace(last_sample, wall_time=wall_time)
+
+    def sample(self, start_times: dict[int, float]) -> dict[int, ProcessStats]:
+        """Take a sample for process trees.
+
+        Args:
+            start_times: A dict that maps the pid of the root of each tree on to
+                its start time.
+
+        Returns:
+            A dict that maps the root pid on to its stats.
+        """
+        sample_time = monotonic()
+        if not IS_SUPPORTED:
+            return {
+                pid: ProcessStats(sample_time - start_time)
+                for pid, start_time in start_times.items()
+            }
+        processes = _read_process_table()
+        children: dict[int, list[int]] = {}
+        for pid, (parent_pid, _cpu_time, _rss) in processes.items():
+            children.setdefault(parent_pid, []).append(pid)
+
+        samples: dict[int, ProcessStats] = {}
+        for root_pid, start_time in start_times.items():
+            if root_pid not in processes:
+                continue
+            cpu_time = 0.0
+            rss = read_bytes = write_bytes = process_count = 0
+            stack = [root_pid]
+            while stack:
+                pid = stack.pop()
+                _parent_pid, process_cpu_time, process_rss = processes[pid]
+                cpu_time += process_cpu_time
+                rss += process_rss
+                process_read_bytes, process_write_bytes = _read_io(pid)
+                read_bytes += process_read_bytes
+                write_bytes += process_write_bytes
+                process_count += 1
+                stack.extend(children.get(pid, ()))
+            samples[root_pid] = ProcessStats(
+                sample_time - start_time,
+                cpu_time,
+                rss,
+                read_bytes,
+                write_bytes,
+                process_count,
+            )
+        return samples
+
+    async def _run(self) -> None:
+        while self._watched:
+            start_times = {
+                pid: start_time for pid, (start_time, _callback) in self._watched.items()
+            }
+            samples = await asyncio.to_thread(self.sample, start_times)
+            for pid, stats in samples.items():
+                if (watched := self._watched.get(pid)) is not None:
+                    _start_time, callback = watched
+                    self._last_sample[pid] = stats
+                    callback(stats)
+            await asyncio.sleep(self.interval)
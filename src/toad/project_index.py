@@ -0,0 +1,523 @@
+"""
+A persistent index of the files in a project.
+
+The index stores the entries in every directory of the project (excluding the contents
+of ignored directories), with the modification time of each directory. It is saved to a
+compact binary file in the project's data directory, so a previous index loads
+instantly when Toad starts. A refresh then stats every directory, and lists only the
+directories whose modification time has changed (adding or removing an entry updates
+the modification time of its directory).
+
+The index file is a header followed by a record per directory:
+
+    header:  b"TOADIDX1"
+    record:  struct RECORD (modification times, and sizes of the following fields)
+             relative path of the directory (utf-8)
+             names of the entries, separated by NUL (utf-8)
+             a byte of flags per entry (see `DIRECTORY`, `SYMLINK`, and `IGNORED`)
+
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import struct
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from toad import atomic
+
+if TYPE_CHECKING:
+    from toad.path_filter import PathFilter
+
+MAGIC = b"TOADIDX1"
+"""Header of an index file (the last character is the version)."""
+
+RECORD = struct.Struct("<qqIII")
+"""Directory mtime, .gitignore mtime, path size, names size, and number of entries."""
+
+DIRECTORY = 1
+"""Flag for an entry which is a directory (or a symlink to a directory)."""
+SYMLINK = 2
+"""Flag for an entry which is a symlink (not followed when scanning)."""
+IGNORED = 4
+"""Flag for an entry which is excluded by the path filter (not scanned)."""
+
+
+@dataclass(frozen=True)
+class IndexedDirectory:
+    """The entries in a directory."""
+
+    mtime_ns: int
+    """Modification time of the directory when it was listed."""
+    ignore_mtime_ns: int
+    """Modification time of the directory's .gitignore (0 if there isn't one)."""
+    names: list[str]
+    """Names of the entries."""
+    flags: bytes
+    """Flags for each entry."""
+
+    def __iter__(self) -> Iterator[tuple[str, int]]:
+        return zip(self.names, self.flags)
+
+
+def get_display_path(prefix: str, name: str, flags: int) -> str:
+    """Get the path of an entry, as returned by `ProjectIndex.get_paths`.
+
+    Args:
+        prefix: Relative path of the entry's directory, with a trailing "/" (or empty
+            for the root).
+        name: Name of the entry.
+        flags: Flags for the entry.
+
+    Returns:
+        A relative path, with a trailing "/" for directories.
+    """
+    return f"{prefix}{name}/" if flags & DIRECTORY else prefix + name
+
+
+def get_mtime_ns(path: str) -> int:
+    """Get the modification time of a path.
+
+    Args:
+        path: A path.
+
+    Returns:
+        Modification time in nanoseconds, or 0 if the path doesn't exist.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class ProjectIndex:
+    """An index of the files in a project, which may be shared by several widgets.
+
+    Call `load`, `refresh`, and `save` from a thread. Readers may be on any thread, as
+    a refresh replaces the directories in a single assignment.
+    """
+
+    def __init__(self, root: Path, index_path: Path | None = None) -> None:
+        """Project index.
+
+        Args:
+            root: Root directory of the project.
+            index_path: Path to the index file, or `None` to not persist the index.
+        """
+        self.root = root.resolve()
+        self.index_path = index_path
+        self.directories: dict[str, IndexedDirectory] = {}
+        """Directories, keyed by their path relative to the root ("" for the root)."""
+        self.loaded = False
+        self.version = 0
+        """Incremented when the directories change."""
+        self._saved_version = 0
+        self._lock = Lock()
+
+    def __repr__(self) -> str:
+        return f"ProjectIndex({str(self.root)!r})"
+
+    def load(self) -> bool:
+        """Load the index file, if it exists (and the index isn't already loaded).
+
+        Returns:
+            `True` if an index was loaded, `False` if there was no (valid) index.
+        """
+        with self._lock:
+            if self.loaded:
+                return False
+            self.loaded = True
+            if self.index_path is None:
+                return False
+            try:
+                data = self.index_path.read_bytes()
+            except OSError:
+                return False
+            try:
+                directories = self.decode(data)
+            except (struct.error, UnicodeDecodeError, ValueError):
+                return False
+            if not self.directories:
+                self.directories = directories
+                self.version += 1
+                self._saved_version = self.version
+            return True
+
+    def save(self) -> None:
+        """Save the index file, if it has changed since it was loaded or saved."""
+        version = self.version
+        if self.index_path is None or version == self._saved_version:
+            return
+        try:
+            atomic.write_bytes(str(self.index_path), self.encode(self.directories))
+        except atomic.AtomicWriteError:
+            pass
+        else:
+            self._saved_version = version
+
+    @classmethod
+    def encode(cls, directories: dict[str, IndexedDirectory]) -> bytes:
+        """Encode directories in the binary format.
+
+        Args:
+            directories: Directories, keyed by relative path.
+
+        Returns:
+            Encoded bytes.
+        """
+        chunks = [MAGIC]
+        pack = RECORD.pack
+        for relative_path, directory in directories.items():
+            path_bytes = relative_path.encode("utf-8", "surrogateescape")
+            names_bytes = "\0".join(directory.names).encode("utf-8", "surrogateescape")
+            chunks.append(
+                pack(
+                    directory.mtime_ns,
+                    directory.ignore_mtime_ns,
+                    len(path_bytes),
+                    len(names_bytes),
+                    len(directory.flags),
+                )
+            )
+            chunks.extend((path_bytes, names_bytes, directory.flags))
+        return b"".join(chunks)
+
+    @classmethod
+    def decode(cls, data: bytes) -> dict[str, IndexedDirectory]:
+        """Decode directories from the binary format.
+
+        Args:
+            data: Encoded bytes.
+
+        Raises:
+            ValueError: If the data is not a valid index.
+
+        Returns:
+            Directories, keyed by relative path.
+        """
+        if not data.startswith(MAGIC):
+            raise ValueError("not an index file")
+        directories: dict[str, IndexedDirectory] = {}
+        unpack_from = RECORD.unpack_from
+        record_size = RECORD.size
+        offset = len(MAGIC)
+        while offset < len(data):
+            mtime_ns, ignore_mtime_ns, path_size, names_size, count = unpack_from(
+                data, offset
+            )
+            offset += record_size
+            relative_path = data[offset : offset + path_size].decode(
+                "utf-8", "surrogateescape"
+            )
+            offset += path_size
+            names_bytes = data[offset : offset + names_size]
+            offset += names_size
+            flags = data[offset : offset + count]
+            offset += count
+            names = (
+                names_bytes.decode("utf-8", "surrogateescape").split("\0")
+                if count
+                else []
+            )
+            if len(names) != count or len(flags) != count:
+                raise ValueError("truncated index file")
+            directories[relative_path] = IndexedDirectory(
+                mtime_ns, ignore_mtime_ns, names, flags
+            )
+        return directories
+
+    def refresh(
+        self,
+        path_filter: PathFilter | None = None,
+        cancelled: Callable[[], bool] | None = None,
+        progress: Callable[[list[str]], None] | None = None,
+    ) -> bool:
+        """Update the index from the file system.
+
+        Directories which haven't been modified since they were last listed are not
+        listed again. If a .gitignore file has changed, its directory and every
+        directory beneath it are listed again (as the ignored paths may have changed).
+
+        Directories are stat-ed and listed in a pool of threads.
+
+        Args:
+            path_filter: Filter for ignored paths, or `None` to ignore nothing.
+            cancelled: Callable which returns `True` to abandon the refresh.
+            progress: Callable which receives chunks of paths (in the form returned by
+                `get_paths`) from directories which weren't previously indexed. Called
+                from the pool's threads.
+
+        Returns:
+            `True` if the index changed, `False` if it was up to date (or cancelled).
+        """
+        from toad.directory import ChunkBuffer, Walker
+
+        with self._lock:
+            previous_directories = self.directories
+            directories: dict[str, IndexedDirectory] = {}
+            root = str(self.root)
+            scanned: list[str] = []
+            buffer = None if progress is None else ChunkBuffer(progress, 1000)
+
+            def visit(item: tuple[str, bool]) -> list[tuple[str, bool]]:
+                """Index a directory.
+
+                Args:
+                    item: Relative path of the directory, and if it must be listed.
+
+                Returns:
+                    Subdirectories to index.
+                """
+                relative_path, force = item
+                path = os.path.join(root, relative_path) if relative_path else root
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    scanned.append(relative_path)
+                    return []
+                ignore_mtime_ns = get_mtime_ns(os.path.join(path, ".gitignore"))
+                directory = previous_directories.get(relative_path)
+                if directory is not None and (
+                    directory.ignore_mtime_ns != ignore_mtime_ns
+                ):
+                    force = True
+                prefix = f"{relative_path}/" if relative_path else ""
+                if force or directory is None or directory.mtime_ns != mtime_ns:
+                    new_directory = directory is None
+                    directory = self._scan_directory(
+                        path, mtime_ns, ignore_mtime_ns, path_filter
+                    )
+                    scanned.append(relative_path)
+                    if new_directory and buffer is not None:
+                        buffer.add(
+                            get_display_path(prefix, name, flags)
+                            for name, flags in directory
+                            if not flags & IGNORED
+                        )
+                directories[relative_path] = directory
+                return [
+                    (prefix + name, force)
+                    for name, flags in directory
+                    if flags & (DIRECTORY | SYMLINK | IGNORED) == DIRECTORY
+                ]
+
+            Walker(visit, cancelled=cancelled).walk([("", False)])
+            if cancelled is not None and cancelled():
+                return False
+            if buffer is not None:
+                buffer.flush()
+            if scanned or directories.keys() != previous_directories.keys():
+                self.directories = directories
+                self.version += 1
+                return True
+            return False
+
+    def update(
+        self, relative_paths: Iterable[str], path_filter: PathFilter | None = None
+    ) -> tuple[list[str], list[str]]:
+        """List directories again, when they are known to have changed.
+
+        New directories are scanned, and removed directories are removed from the
+        index with everything beneath them.
+
+        Args:
+            relative_paths: Paths of changed directories, relative to the root.
+            path_filter: Filter for ignored paths, or `None` to ignore nothing.
+
+        Returns:
+            A tuple of the paths which were added, and the paths which were removed
+                (in the form returned by `get_paths`).
+        """
+        with self._lock:
+            directories = dict(self.directories)
+            root = str(self.root)
+            added: list[str] = []
+            removed: list[str] = []
+            for relative_path in sorted(set(relative_paths)):
+                if (previous_directory := directories.get(relative_path)) is None:
+                    # Not indexed, or removed with a parent
+                    continue
+                path = os.path.join(root, relative_path) if relative_path else root
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    # Removed when its parent is updated
+                    continue
+                directory = self._scan_directory(
+                    path,
+                    mtime_ns,
+                    get_mtime_ns(os.path.join(path, ".gitignore")),
+                    path_filter,
+                )
+                directories[relative_path] = directory
+                prefix = f"{relative_path}/" if relative_path else ""
+                previous_entries = dict(previous_directory)
+                entries = dict(directory)
+                for name, flags in previous_entries.items():
+                    if entries.get(name) == flags:
+                        continue
+                    if not flags & IGNORED:
+                        removed.append(get_display_path(prefix, name, flags))
+                    if flags & (DIRECTORY | SYMLINK | IGNORED) == DIRECTORY:
+                        removed.extend(self._remove_tree(directories, prefix + name))
+                for name, flags in entries.items():
+                    if previous_entries.get(name) == flags:
+                        continue
+                    if not flags & IGNORED:
+                        added.append(get_display_path(prefix, name, flags))
+                    if flags & (DIRECTORY | SYMLINK | IGNORED) == DIRECTORY:
+                        added.extend(
+                            self._add_tree(directories, prefix + name, path_filter)
+                        )
+            self.directories = directories
+            if added or removed:
+                self.version += 1
+            return added, removed
+
+    def _remove_tree(
+        self, directories: dict[str, IndexedDirectory], relative_path: str
+    ) -> list[str]:
+        """Remove a directory, and every directory beneath it.
+
+        Args:
+            directories: Directories to update.
+            relative_path: Relative path of the directory to remove.
+
+        Returns:
+            The removed paths.
+        """
+        removed: list[str] = []
+        subdirectory_prefix = f"{relative_path}/"
+        for directory_path in [
+            directory_path
+            for directory_path in directories
+            if directory_path == relative_path
+            or directory_path.startswith(subdirectory_prefix)
+        ]:
+            prefix = f"{directory_path}/"
+            removed.extend(
+                get_display_path(prefix, name, flags)
+                for name, flags in directories.pop(directory_path)
+                if not flags & IGNORED
+            )
+        return removed
+
+    def _add_tree(
+        self,
+        directories: dict[str, IndexedDirectory],
+        relative_path: str,
+        path_filter: PathFilter | None,
+    ) -> list[str]:
+        """Scan a new directory, and every directory beneath it.
+
+        Args:
+            directories: Directories to update.
+            relative_path: Relative path of the new directory.
+            path_filter: Filter for ignored paths.
+
+        Returns:
+            The added paths.
+        """
+        added: list[str] = []
+        stack = [relative_path]
+        while stack:
+            relative_path = stack.pop()
+            path = os.path.join(self.root, relative_path)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            directories[relative_path] = directory = self._scan_directory(
+                path,
+                mtime_ns,
+                get_mtime_ns(os.path.join(path, ".gitignore")),
+                path_filter,
+            )
+            prefix = f"{relative_path}/"
+            for name, flags in directory:
+                if not flags & IGNORED:
+                    added.append(get_display_path(prefix, name, flags))
+                if flags & (DIRECTORY | SYMLINK | IGNORED) == DIRECTORY:
+                    stack.append(prefix + name)
+        return added
+
+    @classmethod
+    def _scan_directory(
+        cls,
+        path: str,
+        mtime_ns: int,
+        ignore_mtime_ns: int,
+        path_filter: PathFilter | None,
+    ) -> IndexedDirectory:
+        """List a directory.
+
+        Args:
+            path: Path to the directory.
+            mtime_ns: Modification time of the directory.
+            ignore_mtime_ns: Modification time of the directory's .gitignore.
+            path_filter: Filter for ignored paths.
+
+        Returns:
+            The directory's entries.
+        """
+        names: list[str] = []
+        flags = bytearray()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    entry_flags = 0
+                    try:
+                        if entry.is_dir():
+                            entry_flags |= DIRECTORY
+                        if entry.is_symlink():
+                            entry_flags |= SYMLINK
+                    except OSError:
+                        pass
+                    if path_filter is not None and path_filter.match(
+                        entry.path, bool(entry_flags & DIRECTORY)
+                    ):
+                        entry_flags |= IGNORED
+                    names.append(entry.name)
+                    flags.append(entry_flags)
+        except OSError:
+            pass
+        return IndexedDirectory(mtime_ns, ignore_mtime_ns, names, bytes(flags))
+
+    def get_paths(self) -> list[str]:
+        """Get the paths of every file and directory which isn't ignored.
+
+        Returns:
+            Paths relative to the root. Directories end with a "/".
+        """
+        paths: list[str] = []
+        add_path = paths.append
+        for relative_path, directory in self.directories.items():
+            prefix = f"{relative_path}/" if relative_path else ""
+            for name, flags in directory:
+                if not flags & IGNORED:
+                    add_path(f"{prefix}{name}/" if flags & DIRECTORY else prefix + name)
+        return paths
+
+    def list_directory(self, path: Path) -> list[tuple[str, int]] | None:
+        """List a directory from the index, if it is up to date.
+
+        Args:
+            path: Absolute (resolved) path to a directory.
+
+        Returns:
+            A list of (name, flags) for every entry, including ignored entries, or
+                `None` if the directory isn't indexed or has changed since.
+        """
+        if not path.is_relative_to(self.root):
+            return None
+        relative_path = path.relative_to(self.root).as_posix()
+        if relative_path == ".":
+            relative_path = ""
+        if (directory := self.directories.get(relative_path)) is None:
+            return None
+        if get_mtime_ns(str(path)) != directory.mtime_ns:
+            return None
+        return list(directory)
@@ -0,0 +1,431 @@
+"""
+Watch a project for added, removed, and renamed files (Linux only).
+
+`ProjectWatcher` watches every directory in a `ProjectIndex` with inotify (through
+ctypes, so there are no additional dependencies), and updates the index when entries
+are created, deleted, or moved. Ignored directories aren't watched, as they aren't in
+the index.
+
+Events are collected in a thread, and handled in batches once there have been no
+events for `DEBOUNCE_DELAY` seconds (or `MAX_DELAY` seconds have passed), so a command
+which writes many files results in a single update. Only the directories with events
+are listed again. If the kernel's event queue overflows, the whole index is refreshed.
+
+The number of watches is limited to a fraction of the kernel's limit (shared by every
+process of the user). If the project has more directories than that, the shallowest
+directories are watched, and `is_complete` is `False` (so consumers should also rescan
+when the project may have changed).
+
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+from dataclasses import dataclass, field
+import errno
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+from threading import Thread
+from time import monotonic
+from typing import Callable
+
+from toad.path_filter import PathFilter
+from toad.project_index import ProjectIndex
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+
+WATCH_MASK = (
+    IN_CREATE
+    | IN_DELETE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CLOSE_WRITE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+"""Events to watch for. IN_CLOSE_WRITE is only required for changes to .gitignore."""
+
+EVENT = struct.Struct("iIII")
+"""The header of an inotify event (wd, mask, cookie, and size of the name)."""
+
+DEBOUNCE_DELAY = 0.1
+"""Seconds without events before a batch is handled."""
+
+MAX_DELAY = 1.0
+"""Maximum seconds to collect a batch of events."""
+
+SYNC_INTERVAL = 1.0
+"""Seconds between checks for directories indexed by a refresh in another thread."""
+
+WATCH_FRACTION = 0.5
+"""Maximum fraction of the kernel's limit on watches to use."""
+
+DEFAULT_MAX_WATCHES = 8192
+"""The kernel's default limit on watches, if it can't be read."""
+
+
+@dataclass(frozen=True)
+class ProjectChanges:
+    """A batch of changes to the files in a project."""
+
+    root: Path
+    """Root directory of the project."""
+    added: list[str] = field(default_factory=list)
+    """Added paths (relative to the root, with a trailing "/" for directories)."""
+    removed: list[str] = field(default_factory=list)
+    """Removed paths."""
+    renamed: list[tuple[str, str]] = field(default_factory=list)
+    """Renamed paths, as (old path, new path). Not included in `added` or `removed`."""
+    directories: frozenset[str] = frozenset()
+    """Relative paths of directories whose entries changed ("" for the root)."""
+    rescanned: bool = False
+    """The whole project was rescanned, so anything may have changed."""
+
+    def get_directory_paths(self) -> list[Path]:
+        """Get the absolute paths of the changed directories.
+
+        Returns:
+            A list of paths.
+        """
+        root = self.root
+        return [
+            root / directory if directory else root for directory in self.directories
+        ]
+
+
+def get_max_watches() -> int:
+    """Get the number of watches this process may use.
+
+    Returns:
+        Maximum number of watches.
+    """
+    try:
+        with open("/proc/sys/fs/inotify/max_user_watches") as max_watches_file:
+            max_user_watches = int(max_watches_file.read())
+    except (OSError, ValueError):
+        max_user_watches = DEFAULT_MAX_WATCHES
+    return int(max_user_watches * WATCH_FRACTION)
+
+
+class Inotify:
+    """A minimal wrapper for the inotify API."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd == -1:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.fd: int = fd
+
+    def close(self) -> None:
+        """Close the inotify file descriptor (removing all watches)."""
+        os.close(self.fd)
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch a path.
+
+        Args:
+            path: Path to watch.
+            mask: Events to watch for.
+
+        Raises:
+            OSError: If the watch could not be added.
+
+        Returns:
+            The watch descriptor.
+        """
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd == -1:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def remove_watch(self, wd: int) -> None:
+        """Stop watching.
+
+        Args:
+            wd: A watch descriptor from `add_watch`.
+        """
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self) -> list[tuple[int, int, int, str]]:
+        """Read the pending events.
+
+        Returns:
+            A list of (wd, mask, cookie, name).
+        """
+        events: list[tuple[int, int, int, str]] = []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+        unpack_from = EVENT.unpack_from
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, size = unpack_from(data, offset)
+            offset += EVENT.size
+            name = os.fsdecode(data[offset : offset + size].rstrip(b"\0"))
+            offset += size
+            events.append((wd, mask, cookie, name))
+        return events
+
+
+class ProjectWatcher:
+    """Watches a project, and keeps its index up to date."""
+
+    def __init__(
+        self,
+        project_index: ProjectIndex,
+        on_changes: Callable[[ProjectChanges], None],
+        max_watches: int | None = None,
+    ) -> None:
+        """Project watcher.
+
+        Args:
+            project_index: Index of the project to watch.
+            on_changes: Callable which receives a batch of changes (called from the
+                watching thread).
+            max_watches: Maximum number of watches, or `None` for a fraction of the
+                kernel's limit.
+        """
+        self.project_index = project_index
+        self.on_changes = on_changes
+        self.max_watches = get_max_watches() if max_watches is None else max_watches
+        self.is_complete = False
+        """Is every directory in the project watched?"""
+        self._watches: dict[str, int] = {}
+        self._watch_paths: dict[int, str] = {}
+        self._synced_version = -1
+        self._thread: Thread | None = None
+        self._wake_read, self._wake_write = os.pipe()
+        self._running = False
+
+    @classmethod
+    def is_supported(cls) -> bool:
+        """Can projects be watched on this platform?"""
+        return sys.platform.startswith("linux")
+
+    def start(self) -> None:
+        """Start watching in a thread."""
+        self._running = True
+        self._thread = Thread(
+            target=self._run,
+            name=f"watch {self.project_index.root}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching, and wait for the thread to exit."""
+        self._running = False
+        if self._thread is not None:
+            os.write(self._wake_write, b"\0")
+            self._thread.join(timeout=1)
+            self._thread = None
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _run(self) -> None:
+        try:
+            inotify = Inotify()
+        except (AttributeError, OSError):
+            # inotify isn't available
+            return
+        try:
+            self._watch(inotify)
+        finally:
+            self.is_complete = False
+            inotify.close()
+
+    def _watch(self, inotify: Inotify) -> None:
+        project_index = self.project_index
+        root = project_index.root
+        path_filter = PathFilter.from_git_root(root)
+        project_index.load()
+        project_index.refresh(path_filter)
+        self._sync_watches(inotify)
+        # Catch changes made while the watches were added
+        if project_index.refresh(path_filter):
+            self._sync_watches(inotify)
+            self.on_changes(ProjectChanges(root, rescanned=True))
+
+        # Directories with events, and the paths of moved entries (by cookie)
+        changed_directories: set[str] = set()
+        moved_from: dict[int, str] = {}
+        moved_to: dict[int, str] = {}
+        rescan = False
+        batch_start = 0.0
+        last_event = 0.0
+        while self._running:
+            self._sync_watches(inotify)
+            timeout = SYNC_INTERVAL
+            if changed_directories or rescan:
+                now = monotonic()
+                timeout = max(
+                    0.0,
+                    min(last_event + DEBOUNCE_DELAY, batch_start + MAX_DELAY) - now,
+                )
+            readable, _, _ = select.select(
+                [inotify.fd, self._wake_read], [], [], timeout
+            )
+            if not self._running:
+                break
+            if inotify.fd in readable:
+                now = monotonic()
+                if not (changed_directories or rescan):
+                    batch_start = now
+                last_event = now
+                for wd, mask, cookie, name in inotify.read_events():
+                    if mask & IN_Q_OVERFLOW:
+                        rescan = True
+                        continue
+                    if (directory := self._watch_paths.get(wd)) is None:
+                        continue
+                    if mask & IN_IGNORED:
+                        # The directory was removed
+                        self._watch_paths.pop(wd, None)
+                        if self._watches.get(directory) == wd:
+                            del self._watches[directory]
+                        continue
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                        continue
+                    if name == ".gitignore":
+                        # Ignored paths may have changed anywhere beneath
+                        rescan = True
+                        continue
+                    if mask & IN_CLOSE_WRITE:
+                        continue
+                    changed_directories.add(directory)
+                    path = f"{directory}/{name}" if directory else name
+                    if mask & IN_MOVED_FROM:
+                        moved_from[cookie] = path
+                    elif mask & IN_MOVED_TO:
+                        moved_to[cookie] = path
+                continue
+            if not (changed_directories or rescan):
+                continue
+
+            if rescan:
+                path_filter = PathFilter.from_git_root(root)
+                project_index.refresh(path_filter)
+                changes = ProjectChanges(root, rescanned=True)
+            else:
+                added, removed = project_index.update(changed_directories, path_filter)
+                changes = self._get_changes(
+                    changed_directories, added, removed, moved_from, moved_to
+                )
+            self._sync_watches(inotify)
+            changed_directories.clear()
+            moved_from.clear()
+            moved_to.clear()
+            rescan = False
+            if changes.rescanned or changes.directories:
+                self.on_changes(changes)
+
+    def _get_changes(
+        self,
+        directories: set[str],
+        added: list[str],
+        removed: list[str],
+        moved_from: dict[int, str],
+        moved_to: dict[int, str],
+    ) -> ProjectChanges:
+        """Get a batch of changes, pairing moved entries into renames.
+
+        Args:
+            directories: Directories with events.
+            added: Added paths, from `ProjectIndex.update`.
+            removed: Removed paths.
+            moved_from: Original paths of moved entries, keyed by cookie.
+            moved_to: New paths of moved entries, keyed by cookie.
+
+        Returns:
+            Changes.
+        """
+        renamed: list[tuple[str, str]] = []
+        added_paths = set(added)
+        removed_paths = set(removed)
+        for cookie, old_path in moved_from.items():
+            if (new_path := moved_to.get(cookie)) is None:
+                continue
+            for old, new in ((old_path, new_path), (f"{old_path}/", f"{new_path}/")):
+                if old in removed_paths and new in added_paths:
+                    removed_paths.discard(old)
+                    added_paths.discard(new)
+                    renamed.append((old, new))
+        return ProjectChanges(
+            self.project_index.root,
+            [path for path in added if path in added_paths],
+            [path for path in removed if path in removed_paths],
+            renamed,
+            frozenset(directories),
+        )
+
+    def _sync_watches(self, inotify: Inotify) -> None:
+        """Watch the directories in the index, and stop watching removed directories.
+
+        Args:
+            inotify: Inotify instance.
+        """
+        project_index = self.project_index
+        if project_index.version == self._synced_version:
+            return
+        self._synced_version = project_index.version
+        directories = project_index.directories
+        watches = self._watches
+        removed_directories = [
+            directory for directory in watches if directory not in directories
+        ]
+        for directory in removed_directories:
+            wd = watches.pop(directory)
+            if self._watch_paths.get(wd) == directory:
+                del self._watch_paths[wd]
+                inotify.remove_watch(wd)
+
+        # Shallowest first, in case there are too many directories to watch
+        new_directories = sorted(
+            (directory for directory in directories if directory not in watches),
+            key=lambda directory: directory.count("/") + bool(directory),
+        )
+        root = str(project_index.root)
+        complete = True
+        for directory in new_directories:
+            if len(watches) >= self.max_watches:
+                complete = False
+                break
+            path = os.path.join(root, directory) if directory else root
+            try:
+                wd = inotify.add_watch(path, WATCH_MASK)
+            except OSError as error:
+                if error.errno == errno.ENOSPC:
+                    # Out of watches
+                    complete = False
+                    break
+                # Removed since it was indexed, or not readable
+                continue
+            watches[directory] = wd
+            self._watch_paths[wd] = directory
+        self.is_complete = complete and len(watches) >= len(directories)
@@ -1,9 +1,13 @@
-from typing import Protocol, runtime_checkable, Iterable
+from typing import Protocol, runtime_checkable, Iterable, TYPE_CHECKING
 
 from textual.widget import Widget
 
 from toad.menus import MenuItem
 
+if TYPE_CHECKING:
+    from toad.export import ExportBlock
+    from toad.widgets.timeline import BlockModel
+
 
 @runtime_checkable
 class BlockProtocol(Protocol):
@@ -26,3 +30,13 @@ class ExpandProtocol(Protocol):
     def expand_block(self) -> None: ...
     def collapse_block(self) -> None: ...
     def is_block_expanded(self) -> bool: ...
+
+
+@runtime_checkable
+class ModelProtocol(Protocol):
+    def get_block_model(self) -> BlockModel | None: ...
+
+
+@runtime_checkable
+class ExportProtocol(Protocol):
+    def get_block_export(self) -> ExportBlock | None: ...
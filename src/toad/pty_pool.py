@@ -0,0 +1,216 @@
+"""
+A pool of pre-spawned pseudo terminals, used to reduce the startup cost of agent terminals.
+
+Each pooled terminal is a PTY pair with the user's shell already running on the slave side.
+The shell blocks reading its script from a pipe on stdin. When the terminal is taken from
+the pool, the command is written to the pipe and runs in the waiting shell with stdin
+moved to the PTY, so the command skips the `openpty` and the shell startup.
+
+Shells which don't accept POSIX syntax (fish, nushell etc.) are pooled behind `/bin/sh`,
+which `exec`s the user's shell on demand.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+from asyncio.subprocess import Process
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+import fcntl
+import os
+import pty
+import shlex
+from time import monotonic
+from typing import Mapping
+
+from textual import log
+
+POSIX_SHELLS = {"sh", "bash", "zsh", "dash", "ksh", "mksh", "ash"}
+"""Shells which may run the command script directly."""
+
+
+@dataclass
+class PooledTerminal:
+    """A PTY pair, with a shell waiting for a command."""
+
+    master: int
+    """Master file descriptor (non-blocking)."""
+    process: Process
+    """The waiting shell process."""
+    command_fd: int
+    """Write end of the pipe used to send the command."""
+    shell: str
+    """The user's shell."""
+    native: bool
+    """Is the waiting shell the user's shell?"""
+    created_time: float = field(default_factory=monotonic)
+    """Time the terminal was spawned."""
+
+    @property
+    def is_alive(self) -> bool:
+        """Is the shell still waiting?"""
+        return self.process.returncode is None
+
+    def exec(self, command: str, cwd: str, env: Mapping[str, str]) -> None:
+        """Run a command in the pooled shell.
+
+        Args:
+            command: Shell command line to execute.
+            cwd: Working directory.
+            env: Additional environment variables.
+        """
+        script_lines = [f"cd -- {shlex.quote(cwd)} || exit 1"]
+        script_lines.extend(
+            f"export {name}={shlex.quote(value)}"
+            for name, value in env.items()
+            if name.isidentifier()
+        )
+        # The pty slave is on stdout; replace the command pipe with it.
+        # The group is parsed in full before it runs, so the shell never reads the pty.
+        if self.native:
+            script_lines.append(f"{{ eval {shlex.quote(command)}\n}} 0<&1")
+        else:
+            script_lines.append(
+                f"exec {shlex.join([self.shell, '-c', command])} 0<&1"
+            )
+        script = "\n".join(script_lines) + "\n"
+        try:
+            os.write(self.command_fd, script.encode("utf-8", "surrogateescape"))
+        finally:
+            os.close(self.command_fd)
+            self.command_fd = -1
+
+    def discard(self) -> None:
+        """Kill the shell and close file descriptors."""
+        with suppress(ProcessLookupError):
+            self.process.kill()
+        for fd in (self.master, self.command_fd):
+            if fd != -1:
+                with suppress(OSError):
+                    os.close(fd)
+
+
+class PTYPool:
+    """A pool of pre-spawned terminals, sized from recent demand."""
+
+    def __init__(
+        self,
+        shell: str | None = None,
+        *,
+        minimum: int = 0,
+        maximum: int = 8,
+        demand_window: float = 60.0,
+        refill_delay: float = 0.1,
+    ) -> None:
+        """
+
+        Args:
+            shell: Shell used to run commands, or `None` to use `$SHELL`.
+            minimum: Minimum number of terminals to keep ready.
+            maximum: Maximum number of terminals to keep ready.
+            demand_window: Period (in seconds) used to calculate demand.
+            refill_delay: Delay (in seconds) before topping up the pool.
+        """
+        self.shell = shell or os.environ.get("SHELL", "sh")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.demand_window = demand_window
+        self.refill_delay = refill_delay
+        self._ready: deque[PooledTerminal] = deque()
+        self._demand: deque[float] = deque()
+        self._fill_task: asyncio.Task | None = None
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        """Number of terminals ready to be used."""
+        return len(self._ready)
+
+    @property
+    def target_size(self) -> int:
+        """The number of terminals the pool aims to keep ready."""
+        expire_time = monotonic() - self.demand_window
+        demand = self._demand
+        while demand and demand[0] < expire_time:
+            demand.popleft()
+        return max(self.minimum, min(self.maximum, len(demand)))
+
+    async def spawn(self) -> PooledTerminal:
+        """Spawn a new terminal, with a shell waiting for a command.
+
+        Returns:
+            A pooled terminal.
+        """
+        native = os.path.basename(self.shell) in POSIX_SHELLS
+        master, slave = pty.openpty()
+        flags = fcntl.fcntl(master, fcntl.F_GETFL)
+        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        command_read_fd, command_write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.shell if native else "/bin/sh",
+                "-s",
+                stdin=command_read_fd,
+                stdout=slave,
+                stderr=slave,
+            )
+        except Exception:
+            for fd in (master, command_write_fd):
+                os.close(fd)
+            raise
+        finally:
+            os.close(slave)
+            os.close(command_read_fd)
+        return PooledTerminal(master, process, command_write_fd, self.shell, native)
+
+    async def acquire(self) -> PooledTerminal:
+        """Take a terminal from the pool, or spawn one if the pool is empty.
+
+        Returns:
+            A pooled terminal, ready for `exec`.
+        """
+        self._demand.append(monotonic())
+        pooled_terminal: PooledTerminal | None = None
+        while self._ready:
+            candidate = self._ready.popleft()
+            if candidate.is_alive:
+                pooled_terminal = candidate
+                break
+            candidate.discard()
+        self.fill()
+        if pooled_terminal is None:
+            pooled_terminal = await self.spawn()
+        return pooled_terminal
+
+    def fill(self) -> None:
+        """Top up (or trim) the pool in the background."""
+        if self._closed:
+            return
+        if self._fill_task is None or self._fill_task.done():
+            self._fill_task = asyncio.create_task(self._fill(), name="PTYPool.fill")
+
+    async def _fill(self) -> None:
+        # Spawning blocks the loop briefly, so keep out of the way of the command
+        await asyncio.sleep(self.refill_delay)
+        while not self._closed and len(self._ready) > self.target_size:
+            self._ready.pop().discard()
+        while not self._closed and len(self._ready) < self.target_size:
+            try:
+                pooled_terminal = await self.spawn()
+            except Exception as error:
+                log.warning("Unable to spawn pooled terminal", error)
+                break
+            if self._closed:
+                pooled_terminal.discard()
+                break
+            self._ready.append(pooled_terminal)
+
+    def close(self) -> None:
+        """Close the pool, and discard any waiting terminals."""
+        self._closed = True
+        if self._fill_task is not None:
+            self._fill_task.cancel()
+        while self._ready:
+            self._ready.pop().discard()
@@ -22,6 +22,7 @@ from toad.acp import messages as acp_messages
 from toad.widgets.plan import Plan
 from toad.widgets.throbber import Throbber
 from toad.widgets.conversation import Conversation
+from toad.project_watcher import ProjectChanges
 from toad.widgets.project_directory_tree import ProjectDirectoryTree
 from toad.widgets.side_bar import SideBar
 
@@ -124,7 +125,18 @@ class MainScreen(Screen, can_focus=False):
 
     @on(messages.ProjectDirectoryUpdated)
     async def on_project_directory_update(self) -> None:
-        await self.query_one(ProjectDirectoryTree).reload()
+        if not self.app.is_project_watched(self.project_path):
+            await self.query_one(ProjectDirectoryTree).reload()
+
+    def on_project_changed(self, changes: ProjectChanges) -> None:
+        """Update the project tree when files are added, removed, or renamed."""
+        tree = self.query_one(ProjectDirectoryTree)
+        if changes.root != Path(tree.path).resolve():
+            return
+        if changes.rescanned:
+            tree.reload()
+        else:
+            tree.reload_directories(changes.get_directory_paths())
 
     @on(DirectoryTree.FileSelected, "ProjectDirectoryTree")
     def on_project_directory_tree_selected(self, event: Tree.NodeSelected):
@@ -147,6 +159,9 @@ class MainScreen(Screen, can_focus=False):
     def on_mount(self) -> None:
         for tree in self.query("#project_directory_tree").results(DirectoryTree):
             tree.data_bind(path=MainScreen.project_path)
+        project_tree = self.query_one("#project_directory_tree", ProjectDirectoryTree)
+        project_tree.project_index = self.app.get_project_index(self.project_path)
+        self.app.project_changed_signal.subscribe(self, self.on_project_changed)
         for tree in self.query(DirectoryTree):
             #     tree.show_guides = False
             tree.guide_depth = 3
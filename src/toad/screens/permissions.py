@@ -14,7 +14,7 @@ from textual.reactive import var, Initialize
 
 from toad.answer import Answer
 from toad.widgets.question import Question
-from toad.widgets.diff_view import DiffView
+from toad.widgets.diff_view import DiffView, find_hunk
 
 from textual.widgets import OptionList, Footer, Static, Select
 from textual.widgets.option_list import Option
@@ -120,9 +120,24 @@ class PermissionsScreen(Screen[Answer]):
     NAVIGATION_GROUP = Binding.Group("Navigation", compact=True)
     ALLOW_GROUP = Binding.Group("Allow once/always", compact=True)
     REJECT_GROUP = Binding.Group("Reject once/always", compact=True)
+    HUNK_GROUP = Binding.Group("Hunks", compact=True)
     BINDINGS = [
         Binding("j", "next", "Next", group=NAVIGATION_GROUP),
         Binding("k", "previous", "Previous", group=NAVIGATION_GROUP),
+        Binding(
+            "right_square_bracket",
+            "next_hunk",
+            "Next hunk",
+            key_display="]",
+            group=HUNK_GROUP,
+        ),
+        Binding(
+            "left_square_bracket",
+            "previous_hunk",
+            "Previous hunk",
+            key_display="[",
+            group=HUNK_GROUP,
+        ),
         Binding(
             "tab",
             "app.focus_next",
@@ -297,6 +312,14 @@ class PermissionsScreen(Screen[Answer]):
     def action_previous(self) -> None:
         self.navigator.action_cursor_up()
 
+    def action_next_hunk(self) -> None:
+        if (hunk := find_hunk(self.tool_container, 1)) is not None:
+            self.tool_container.scroll_to_widget(hunk, top=True, animate=False)
+
+    def action_previous_hunk(self) -> None:
+        if (hunk := find_hunk(self.tool_container, -1)) is not None:
+            self.tool_container.scroll_to_widget(hunk, top=True, animate=False)
+
 
 if __name__ == "__main__":
     SOURCE1 = '''\
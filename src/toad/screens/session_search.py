@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+
+from textual import getters, on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.content import Content
+from textual.screen import Screen
+from textual.widgets import Footer, Input, OptionList, Static
+from textual.widgets.option_list import Option
+
+from toad.app import ToadApp
+from toad.session_store import MATCH_END, MATCH_START, SearchHit, SessionPages
+from toad.widgets.session_transcript import SessionTranscript
+
+SEARCH_DELAY = 0.1
+"""Seconds to wait for more keys, before searching."""
+
+SEARCH_PAGE_SIZE = 50
+"""Number of hits to load at a time."""
+
+SEARCH_LOAD_MARGIN = 10
+"""Hits from the end of the list, within which the next page of hits is loaded."""
+
+KIND_LABELS = {
+    "prompt": "Prompt",
+    "response": "Response",
+    "tool_call": "Tool call",
+    "terminal": "Terminal",
+    "shell": "Shell",
+}
+
+
+def make_snippet(snippet: str) -> Content:
+    """Convert a search snippet to content, with the matches highlighted.
+
+    Args:
+        snippet: Snippet from the session store.
+
+    Returns:
+        Content on a single line.
+    """
+    first, *matches = " ".join(snippet.split()).split(MATCH_START)
+    parts: list[str | tuple[str, str]] = [first]
+    for match in matches:
+        matched, _, after = match.partition(MATCH_END)
+        parts.append((matched, "$text-accent bold"))
+        parts.append(after)
+    return Content.assemble(*parts)
+
+
+class SessionScreen(Screen):
+    """Displays a recorded session, from a given event."""
+
+    BINDING_GROUP_TITLE = "Session"
+    BINDINGS = [Binding("escape", "dismiss", "Back")]
+    CSS_PATH = "session_search.tcss"
+
+    app = getters.app(ToadApp)
+
+    def __init__(self, hit: SearchHit) -> None:
+        """
+
+        Args:
+            hit: The search hit to display.
+        """
+        self.hit = hit
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        hit = self.hit
+        yield Static(
+            Content.assemble(
+                (hit.agent or "shell", "$text-secondary bold"),
+                "  ",
+                (hit.project_path, "$text-muted"),
+                "  ",
+                (
+                    datetime.fromtimestamp(hit.timestamp).strftime("%Y-%m-%d %H:%M"),
+                    "$text-muted",
+                ),
+            ),
+            id="session-info",
+        )
+        yield SessionTranscript(
+            SessionPages(self.app.session_store, hit.session, start=hit.event_id)
+        )
+        yield Footer()
+
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:
+        # The transcript's window has a binding to focus the prompt, but there is none
+        return action != "focus_prompt"
+
+
+class SessionSearchScreen(Screen):
+    """Searches the text of recorded sessions."""
+
+    BINDING_GROUP_TITLE = "Search sessions"
+    BINDINGS = [Binding("escape", "dismiss", "Dismiss")]
+    CSS_PATH = "session_search.tcss"
+    AUTO_FOCUS = "Input#search"
+
+    app = getters.app(ToadApp)
+    hits_list = getters.query_one("OptionList#hits", OptionList)
+    status = getters.query_one("Static#status", Static)
+
+    def __init__(self) -> None:
+        self._hits: list[SearchHit] = []
+        self._query = ""
+        self._hits_exhausted = True
+        self._loading_hits = False
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield Input(placeholder="Search sessions", id="search")
+        yield Static(id="status")
+        yield OptionList(id="hits")
+        yield Footer()
+
+    def make_option(self, hit: SearchHit) -> Option:
+        """Make an option to display a hit.
+
+        Args:
+            hit: A search hit.
+
+        Returns:
+            An option for the list of hits.
+        """
+        timestamp = datetime.fromtimestamp(hit.timestamp).strftime("%Y-%m-%d %H:%M")
+        prompt = Content.assemble(
+            (KIND_LABELS.get(hit.kind, hit.kind), "$text-secondary bold"),
+            "  ",
+            (timestamp, "$text-muted"),
+            "  ",
+            (hit.project_path, "$text-muted"),
+            "\n",
+            make_snippet(hit.snippet),
+        )
+        return Option(prompt)
+
+    @on(Input.Changed, "#search")
+    def on_search_changed(self, event: Input.Changed) -> None:
+        self.search(event.value)
+
+    @on(Input.Submitted, "#search")
+    def on_search_submitted(self, event: Input.Submitted) -> None:
+        if self.hits_list.option_count:
+            self.hits_list.focus()
+
+    @work(exclusive=True, group="search")
+    async def search(self, query: str) -> None:
+        """Search, after a short delay (cancelled by another search).
+
+        Args:
+            query: Text entered by the user.
+        """
+        await asyncio.sleep(SEARCH_DELAY)
+        hits = await asyncio.to_thread(
+            self.app.session_store.search, query, SEARCH_PAGE_SIZE
+        )
+        self._query = query
+        self._hits = hits
+        self._hits_exhausted = len(hits) < SEARCH_PAGE_SIZE
+        self.hits_list.set_options([self.make_option(hit) for hit in hits])
+        if hits:
+            self.hits_list.highlighted = 0
+        self.update_status()
+
+    def update_status(self) -> None:
+        """Update the count of hits."""
+        if not self._query.strip():
+            self.status.update("")
+        elif not self._hits:
+            self.status.update("No matches")
+        else:
+            more = "" if self._hits_exhausted else "+"
+            self.status.update(f"{len(self._hits)}{more} matches")
+
+    @on(OptionList.OptionHighlighted, "#hits")
+    def on_hit_highlighted(self, event: OptionList.OptionHighlighted) -> None:
+        if (
+            event.option_index >= len(self._hits) - SEARCH_LOAD_MARGIN
+            and not self._hits_exhausted
+            and not self._loading_hits
+        ):
+            self._loading_hits = True
+            self.load_more_hits(self._query, len(self._hits))
+
+    @work(exclusive=True, group="load-hits")
+    async def load_more_hits(self, query: str, offset: int) -> None:
+        """Load the next page of hits.
+
+        Args:
+            query: Text entered by the user.
+            offset: Number of hits already loaded.
+        """
+        try:
+            hits = await asyncio.to_thread(
+                self.app.session_store.search, query, SEARCH_PAGE_SIZE, offset
+            )
+        finally:
+            self._loading_hits = False
+        if query != self._query:
+            # The search changed while loading
+            return
+        self._hits.extend(hits)
+        self._hits_exhausted = len(hits) < SEARCH_PAGE_SIZE
+        self.hits_list.add_options([self.make_option(hit) for hit in hits])
+        self.update_status()
+
+    @on(OptionList.OptionSelected, "#hits")
+    def on_hit_selected(self, event: OptionList.OptionSelected) -> None:
+        self.app.push_screen(SessionScreen(self._hits[event.option_index]))
@@ -0,0 +1,881 @@
+"""
+A persistent, append-only store of agent sessions.
+
+Every event in a session (prompts, ACP updates, permission requests, and terminal
+summaries) is recorded with a timestamp. `SessionStore.record` only puts the event on a
+queue, so it never blocks the event loop; a background thread writes queued events in
+batches, one transaction per batch.
+
+Sessions are read back a page at a time (see `SessionPages`), so a long session is never
+loaded in full.
+
+The text of prompts, agent responses, tool call titles, and terminal summaries is added
+to a full-text (FTS5) index in the same transaction as the events, so the index is
+always consistent with the events. Agent message chunks are indexed as one document per
+response, when the response ends.
+
+The writer thread deletes the least recently updated sessions once they are older than
+`max_age`, or while the database is larger than `max_size` (sessions recorded by the
+current process are never deleted).
+
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+from pathlib import Path
+import queue
+import sqlite3
+from threading import Event, Lock, Thread
+from time import monotonic, time
+from typing import Any, Mapping
+from uuid import uuid4
+
+from toad import db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    project_path TEXT NOT NULL,
+    agent TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session, id);
+CREATE INDEX IF NOT EXISTS events_session_kind ON events (session, kind, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5 (
+    text,
+    session UNINDEXED,
+    event UNINDEXED,
+    kind UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2",
+    prefix = "2 3"
+);
+"""
+
+INSERT_SEARCH = "INSERT INTO search (text, session, event, kind) VALUES (?, ?, ?, ?)"
+
+SCHEMA_VERSION = 1
+"""Version of the schema, in `PRAGMA user_version` (1 added the search index)."""
+
+BATCH_SIZE = 1000
+"""Maximum number of operations written in a single transaction."""
+
+BATCH_INTERVAL = 0.05
+"""Seconds to wait for more events, before writing a batch."""
+
+PAGE_TURNS = 5
+"""Number of turns (prompts and their responses) in a page."""
+
+PAGE_MAX_EVENTS = 5000
+"""Maximum number of events in a page."""
+
+MATCH_START = "\x02"
+"""Marks the start of a match in a search snippet."""
+
+MATCH_END = "\x03"
+"""Marks the end of a match in a search snippet."""
+
+SNIPPET_TOKENS = 16
+"""Maximum number of tokens in a search snippet."""
+
+PRUNE_INTERVAL = 60 * 60
+"""Seconds between checks for sessions to delete, while the writer is running."""
+
+PRUNE_CHUNK = 500
+"""Maximum number of sessions deleted per statement (limits query parameters)."""
+
+SEARCH_CANDIDATES = 1000
+"""Number of matches ranked together (ranking every match of a common word would take
+too long). Matches are ranked in windows of this many, most recent window first."""
+
+
+@dataclass(frozen=True)
+class SessionInfo:
+    """A recorded session."""
+
+    key: str
+    """Unique key for the session."""
+    project_path: str
+    """Path of the project."""
+    agent: str | None
+    """Identity of the agent, or `None` for shell only sessions."""
+    created: float
+    """Time the session was created."""
+    updated: float
+    """Time of the most recent event."""
+
+
+@dataclass(frozen=True)
+class SessionEvent:
+    """An event in a recorded session."""
+
+    id: int
+    """Unique ID of the event (increases with time)."""
+    timestamp: float
+    """Time the event was recorded."""
+    kind: str
+    """The kind of event (e.g. "prompt" or "update")."""
+    data: dict[str, Any]
+    """Event data."""
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """A match from a search of recorded sessions."""
+
+    session: str
+    """Key of the session."""
+    event_id: int
+    """ID of the event which matched (the first event of an agent response)."""
+    kind: str
+    """What matched (one of "prompt", "response", "tool_call", "terminal", "shell")."""
+    snippet: str
+    """Text around the match, with matching terms between `MATCH_START` and
+    `MATCH_END`."""
+    timestamp: float
+    """Time the event was recorded."""
+    project_path: str
+    """Path of the project."""
+    agent: str | None
+    """Identity of the agent, or `None` for shell only sessions."""
+
+
+type SearchRow = tuple[str, str, int, str]
+"""The text, session key, event ID, and kind of a document in the search index."""
+
+
+class SearchIndexer:
+    """Extracts the text to be searched from events.
+
+    Agent message chunks are accumulated until another event in the same session, so
+    that a response is indexed as a single document.
+    """
+
+    def __init__(self) -> None:
+        self._responses: dict[str, tuple[int, list[str]]] = {}
+        """The first event ID and text of responses in progress, by session key."""
+        self._titles: dict[str, dict[str, str]] = {}
+        """Titles of tool calls in the current turn, by session key and tool call ID."""
+
+    def add(
+        self, session: str, event_id: int, kind: str, data: dict[str, Any]
+    ) -> list[SearchRow]:
+        """Add an event.
+
+        Args:
+            session: Session key.
+            event_id: ID of the event.
+            kind: The kind of event.
+            data: Event data.
+
+        Returns:
+            Documents to add to the index.
+        """
+        match kind, data:
+            case (
+                "update",
+                {
+                    "sessionUpdate": "agent_message_chunk",
+                    "content": {"type": "text", "text": str(text)},
+                },
+            ):
+                if (response := self._responses.get(session)) is None:
+                    self._responses[session] = (event_id, [text])
+                else:
+                    response[1].append(text)
+                return []
+            case "update", {"sessionUpdate": "agent_thought_chunk"}:
+                return []
+
+        rows = self.end(session)
+        match kind, data:
+            case "prompt", {"text": str(text)}:
+                self._titles.pop(session, None)
+                rows.append((text, session, event_id, "prompt"))
+            case (
+                "update",
+                {
+                    "sessionUpdate": "tool_call" | "tool_call_update",
+                    "toolCallId": str(tool_call_id),
+                    "title": str(title),
+                },
+            ):
+                # Updates often repeat the title
+                titles = self._titles.setdefault(session, {})
+                if titles.get(tool_call_id) != title:
+                    titles[tool_call_id] = title
+                    rows.append((title, session, event_id, "tool_call"))
+            case "terminal", {"command": str(command)}:
+                text = f"{command}\n{data.get('output') or ''}"
+                rows.append((text, session, event_id, "terminal"))
+            case "shell", {"command": str(command)}:
+                rows.append((command, session, event_id, "shell"))
+        return rows
+
+    def end(self, session: str) -> list[SearchRow]:
+        """End the response in progress for a session.
+
+        Args:
+            session: Session key.
+
+        Returns:
+            Documents to add to the index.
+        """
+        if (response := self._responses.pop(session, None)) is None:
+            return []
+        event_id, text = response
+        return [("".join(text), session, event_id, "response")]
+
+    def end_all(self) -> list[SearchRow]:
+        """End all responses in progress.
+
+        Returns:
+            Documents to add to the index.
+        """
+        return [row for session in list(self._responses) for row in self.end(session)]
+
+
+def make_match_query(query: str) -> str:
+    """Convert text entered by the user to an FTS5 query.
+
+    Every word must match (in any order), and the last word may be incomplete (unless
+    it is a single character, which would match too many words to be useful). Words
+    are quoted, so that FTS5 operators are searched for as text.
+
+    Args:
+        query: Search text.
+
+    Returns:
+        A query for FTS5 `MATCH`, or an empty string if there are no words.
+    """
+    words = query.split()
+    terms = [f'"{word.replace('"', '""')}"' for word in words]
+    if terms and len(words[-1]) > 1:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+@dataclass(frozen=True)
+class SessionRecorder:
+    """Records events for a single session."""
+
+    store: SessionStore
+    key: str
+
+    def record(self, kind: str, data: Mapping[str, Any]) -> None:
+        """Record an event (see `SessionStore.record`).
+
+        Args:
+            kind: The kind of event.
+            data: JSON serializable event data.
+        """
+        self.store.record(self.key, kind, data)
+
+
+class SessionStore:
+    """Records sessions in a SQLite database."""
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        max_age: float | None = None,
+        max_size: int | None = None,
+    ) -> None:
+        """
+
+        Args:
+            path: Path to the database.
+            max_age: Maximum time (in seconds) since a session was updated, before it
+                is deleted, or `None` for no limit.
+            max_size: Maximum size of the database (in bytes), or `None` for no limit.
+        """
+        self.path = path
+        self.max_age = max_age
+        self.max_size = max_size
+        self._queue: queue.SimpleQueue[tuple[Any, ...] | None] = queue.SimpleQueue()
+        self._writer: Thread | None = None
+        self._writer_lock = Lock()
+        self._read_connection: sqlite3.Connection | None = None
+        self._read_lock = Lock()
+        self._new_sessions: dict[str, tuple[str, str | None, float]] = {}
+        """Sessions which have no events yet (not written until they do)."""
+        self._indexer = SearchIndexer()
+        """Indexes written events (used by the writer thread)."""
+        self._recorded: set[str] = set()
+        """Sessions written by this store, which are never pruned (writer thread)."""
+        self._closed = False
+        self.error: sqlite3.Error | None = None
+        """The last error when writing, or `None`."""
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        """Connect to the database, creating tables if required."""
+        connection = db.connect(self.path, check_same_thread=check_same_thread)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _put(self, operation: tuple[Any, ...] | None) -> None:
+        """Queue an operation, starting the writer if required.
+
+        Args:
+            operation: An operation for the writer thread.
+        """
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = Thread(
+                        target=self._write, name="session-store", daemon=True
+                    )
+                    self._writer.start()
+        self._queue.put(operation)
+
+    def new_session(
+        self, project_path: Path | str, agent: str | None
+    ) -> SessionRecorder:
+        """Start a new session.
+
+        Args:
+            project_path: Path of the project.
+            agent: Identity of the agent, or `None`.
+
+        Returns:
+            A recorder for the new session.
+        """
+        key = uuid4().hex
+        self._new_sessions[key] = (str(project_path), agent, time())
+        return SessionRecorder(self, key)
+
+    def record(self, session: str, kind: str, data: Mapping[str, Any]) -> None:
+        """Record an event.
+
+        This doesn't block. The top level of `data` is copied, but nested values must
+        not be modified after recording.
+
+        Args:
+            session: Session key.
+            kind: The kind of event.
+            data: JSON serializable event data.
+        """
+        if self._closed:
+            return
+        if (new_session := self._new_sessions.pop(session, None)) is not None:
+            self._put(("session", session, *new_session))
+        self._put(("event", session, time(), kind, dict(data)))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait for queued events to be written (blocks, so call from a thread).
+
+        Args:
+            timeout: Maximum time to wait, or `None` for no limit.
+
+        Returns:
+            `True` if events were written, `False` if the timeout expired.
+        """
+        if self._writer is None:
+            return True
+        flushed = Event()
+        self._queue.put(("flush", flushed))
+        return flushed.wait(timeout)
+
+    def close(self) -> None:
+        """Write queued events, and close the store (blocks, so call from a thread)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+        with self._read_lock:
+            if self._read_connection is not None:
+                self._read_connection.close()
+                self._read_connection = None
+
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        """Update a database written by an earlier version (runs in the writer thread).
+
+        Args:
+            connection: Database connection.
+        """
+        with connection:
+            # Prevent other processes from migrating at the same time
+            connection.execute("BEGIN IMMEDIATE")
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version >= SCHEMA_VERSION:
+                return
+            if version < 1:
+                # Index events recorded before there was a search index
+                indexer = SearchIndexer()
+                connection.execute("DELETE FROM search")
+                cursor = connection.execute(
+                    "SELECT session, id, kind, data FROM events ORDER BY session, id"
+                )
+                while rows := cursor.fetchmany(BATCH_SIZE):
+                    connection.executemany(
+                        INSERT_SEARCH,
+                        [
+                            search_row
+                            for session, event_id, kind, data in rows
+                            for search_row in indexer.add(
+                                session, event_id, kind, json.loads(data)
+                            )
+                        ],
+                    )
+                connection.executemany(INSERT_SEARCH, indexer.end_all())
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _write(self) -> None:
+        """Write queued operations (runs in a thread)."""
+        connection = self._connect()
+        get = self._queue.get
+        try:
+            try:
+                self._migrate(connection)
+                self._prune(connection)
+            except sqlite3.Error as error:
+                self.error = error
+            next_prune = monotonic() + PRUNE_INTERVAL
+            while True:
+                if monotonic() >= next_prune:
+                    next_prune = monotonic() + PRUNE_INTERVAL
+                    try:
+                        self._prune(connection)
+                    except sqlite3.Error as error:
+                        self.error = error
+                operations = [get()]
+                # Give events which arrive together a chance to share a transaction
+                deadline = monotonic() + BATCH_INTERVAL
+                while len(operations) < BATCH_SIZE and operations[-1] is not None:
+                    if operations[-1][0] == "flush":
+                        break
+                    if (timeout := deadline - monotonic()) <= 0:
+                        break
+                    try:
+                        operations.append(get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                if not self._write_batch(connection, operations):
+                    break
+        finally:
+            connection.close()
+
+    def _write_batch(
+        self, connection: sqlite3.Connection, operations: list[tuple[Any, ...] | None]
+    ) -> bool:
+        """Write a batch of operations in a single transaction.
+
+        Args:
+            connection: Database connection.
+            operations: Queued operations.
+
+        Returns:
+            `False` if the writer should stop, otherwise `True`.
+        """
+        sessions: list[tuple[str, str, str | None, float, float]] = []
+        events: list[tuple[str, float, str, str]] = []
+        event_data: list[tuple[str, str, dict[str, Any]]] = []
+        updated: dict[str, float] = {}
+        flushed: list[Event] = []
+        running = True
+        for operation in operations:
+            match operation:
+                case ("event", session, timestamp, kind, data):
+                    events.append(
+                        (session, timestamp, kind, json.dumps(data, default=str))
+                    )
+                    event_data.append((session, kind, data))
+                    updated[session] = timestamp
+                case ("session", key, project_path, agent, timestamp):
+                    sessions.append((key, project_path, agent, timestamp, timestamp))
+                    self._recorded.add(key)
+                case ("flush", event):
+                    flushed.append(event)
+                case None:
+                    running = False
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)", sessions
+                )
+                connection.executemany(
+                    "INSERT INTO events (session, timestamp, kind, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    events,
+                )
+                search_rows: list[SearchRow] = []
+                if events:
+                    # The transaction holds the write lock, so IDs are consecutive
+                    (last_id,) = connection.execute(
+                        "SELECT last_insert_rowid()"
+                    ).fetchone()
+                    first_id = last_id - len(events) + 1
+                    add = self._indexer.add
+                    for event_id, (session, kind, data) in enumerate(
+                        event_data, first_id
+                    ):
+                        search_rows.extend(add(session, event_id, kind, data))
+                if flushed or not running:
+                    # Make responses in progress searchable
+                    search_rows.extend(self._indexer.end_all())
+                connection.executemany(INSERT_SEARCH, search_rows)
+                connection.executemany(
+                    "UPDATE sessions SET updated = ? WHERE key = ?",
+                    [(timestamp, session) for session, timestamp in updated.items()],
+                )
+        except sqlite3.Error as error:
+            # Recording is best effort; the session carries on regardless
+            self.error = error
+        for event in flushed:
+            event.set()
+        return running
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        """Delete sessions beyond the maximum age or size (runs in the writer thread).
+
+        Args:
+            connection: Database connection.
+        """
+        if self.max_age is None and self.max_size is None:
+            return
+        sessions = [
+            (key, updated)
+            for key, updated in connection.execute(
+                "SELECT key, updated FROM sessions ORDER BY updated"
+            )
+            if key not in self._recorded
+        ]
+        delete: list[str] = []
+        if self.max_age is not None:
+            expired = time() - self.max_age
+            delete.extend(key for key, updated in sessions if updated < expired)
+        if self.max_size is not None:
+            (page_count,) = connection.execute("PRAGMA page_count").fetchone()
+            (free_pages,) = connection.execute("PRAGMA freelist_count").fetchone()
+            (page_size,) = connection.execute("PRAGMA page_size").fetchone()
+            excess = (page_count - free_pages) * page_size - self.max_size
+            if excess > 0:
+                sizes = dict(
+                    connection.execute(
+                        "SELECT session, SUM(LENGTH(data)) FROM events GROUP BY session"
+                    )
+                )
+                # Event data is most of the database; scale for indexes and search
+                scale = (page_count - free_pages) * page_size / (
+                    sum(sizes.values()) or 1
+                )
+                excess -= sum(sizes.get(key, 0) for key in delete) * scale
+                for key, _updated in sessions[len(delete) :]:
+                    if excess <= 0:
+                        break
+                    delete.append(key)
+                    excess -= sizes.get(key, 0) * scale
+        if not delete:
+            return
+        with connection:
+            for start in range(0, len(delete), PRUNE_CHUNK):
+                keys = delete[start : start + PRUNE_CHUNK]
+                placeholders = ", ".join("?" * len(keys))
+                for table, column in (
+                    ("events", "session"),
+                    ("search", "session"),
+                    ("sessions", "key"),
+                ):
+                    connection.execute(
+                        f"DELETE FROM {table} WHERE {column} IN ({placeholders})",
+                        keys,
+                    )
+            connection.execute("INSERT INTO search (search) VALUES ('optimize')")
+        # Return the free pages to the file system
+        connection.execute("VACUUM")
+
+    def _read(self, sql: str, parameters: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        """Run a query (blocks, so call from a thread).
+
+        Args:
+            sql: SQL query.
+            parameters: Query parameters.
+
+        Returns:
+            Rows.
+        """
+        with self._read_lock:
+            if self._read_connection is None:
+                self._read_connection = self._connect(check_same_thread=False)
+            return self._read_connection.execute(sql, parameters).fetchall()
+
+    def get_sessions(
+        self, project_path: Path | str | None = None, limit: int = 100
+    ) -> list[SessionInfo]:
+        """Get the most recently updated sessions (blocks, so call from a thread).
+
+        Args:
+            project_path: Only get sessions for this project, or `None` for all.
+            limit: Maximum number of sessions.
+
+        Returns:
+            Sessions, most recently updated first.
+        """
+        if project_path is None:
+            rows = self._read(
+                "SELECT * FROM sessions ORDER BY updated DESC LIMIT ?", (limit,)
+            )
+        else:
+            rows = self._read(
+                "SELECT * FROM sessions WHERE project_path = ? "
+                "ORDER BY updated DESC LIMIT ?",
+                (str(project_path), limit),
+            )
+        return [SessionInfo(*row) for row in rows]
+
+    def get_events(
+        self, session: str, start: int = 0, end: int | None = None
+    ) -> list[SessionEvent]:
+        """Get events in a range of IDs (blocks, so call from a thread).
+
+        Args:
+            session: Session key.
+            start: First event ID.
+            end: Last event ID (exclusive), or `None` for no limit.
+
+        Returns:
+            Events in the order they were recorded.
+        """
+        rows = self._read(
+            "SELECT id, timestamp, kind, data FROM events "
+            "WHERE session = ? AND id >= ? AND id < ? ORDER BY id",
+            (session, start, (1 << 63) - 1 if end is None else end),
+        )
+        return [
+            SessionEvent(id, timestamp, kind, json.loads(data))
+            for id, timestamp, kind, data in rows
+        ]
+
+    def get_page(
+        self,
+        session: str,
+        before: int | None = None,
+        turns: int = PAGE_TURNS,
+        max_events: int = PAGE_MAX_EVENTS,
+    ) -> list[SessionEvent]:
+        """Get a page of events before a given event (blocks, so call from a thread).
+
+        A page starts with a prompt, so that responses aren't split across pages (unless
+        a turn has more than `max_events` events).
+
+        Args:
+            session: Session key.
+            before: Event ID the page ends at (exclusive), or `None` for the last page.
+            turns: Number of turns in the page.
+            max_events: Maximum number of events in the page.
+
+        Returns:
+            Events in the order they were recorded.
+        """
+        end = (1 << 63) - 1 if before is None else before
+        rows = self._read(
+            "SELECT id FROM events WHERE session = ? AND kind = 'prompt' AND id < ? "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (session, end, turns - 1),
+        )
+        start = rows[0][0] if rows else 0
+        rows = self._read(
+            "SELECT id, timestamp, kind, data FROM events "
+            "WHERE session = ? AND id >= ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (session, start, end, max_events),
+        )
+        return [
+            SessionEvent(id, timestamp, kind, json.loads(data))
+            for id, timestamp, kind, data in reversed(rows)
+        ]
+
+    def get_page_after(
+        self,
+        session: str,
+        after: int,
+        turns: int = PAGE_TURNS,
+        max_events: int = PAGE_MAX_EVENTS,
+    ) -> list[SessionEvent]:
+        """Get a page of events after a given event (blocks, so call from a thread).
+
+        The page ends before a prompt, so that responses aren't split across pages
+        (unless a turn has more than `max_events` events).
+
+        Args:
+            session: Session key.
+            after: Event ID the page starts after.
+            turns: Number of turns to read, after the turn containing `after`.
+            max_events: Maximum number of events in the page.
+
+        Returns:
+            Events in the order they were recorded.
+        """
+        rows = self._read(
+            "SELECT id FROM events WHERE session = ? AND kind = 'prompt' AND id > ? "
+            "ORDER BY id LIMIT 1 OFFSET ?",
+            (session, after, turns),
+        )
+        end = rows[0][0] if rows else (1 << 63) - 1
+        rows = self._read(
+            "SELECT id, timestamp, kind, data FROM events "
+            "WHERE session = ? AND id > ? AND id < ? ORDER BY id LIMIT ?",
+            (session, after, end, max_events),
+        )
+        return [
+            SessionEvent(id, timestamp, kind, json.loads(data))
+            for id, timestamp, kind, data in rows
+        ]
+
+    def get_turn_start(self, session: str, event_id: int) -> int:
+        """Get the ID of the prompt which started the turn containing an event (blocks,
+        so call from a thread).
+
+        Args:
+            session: Session key.
+            event_id: ID of an event.
+
+        Returns:
+            Event ID of the prompt, or 0 if the event is before the first prompt.
+        """
+        rows = self._read(
+            "SELECT id FROM events WHERE session = ? AND kind = 'prompt' AND id <= ? "
+            "ORDER BY id DESC LIMIT 1",
+            (session, event_id),
+        )
+        return rows[0][0] if rows else 0
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> list[SearchHit]:
+        """Search the text of all sessions (blocks, so call from a thread).
+
+        The most recent `SEARCH_CANDIDATES` matches are ranked first, then the next
+        most recent, and so on, so paging through hits reaches every match.
+
+        Args:
+            query: Text entered by the user (see `make_match_query`).
+            limit: Maximum number of hits.
+            offset: Number of hits to skip (to get the next page of hits).
+
+        Returns:
+            Hits, best match first within each window of recent matches.
+        """
+        if not (match_query := make_match_query(query)):
+            return []
+        hits: list[SearchHit] = []
+        while len(hits) < limit:
+            # Every window but the last has exactly `SEARCH_CANDIDATES` matches
+            window, window_offset = divmod(offset + len(hits), SEARCH_CANDIDATES)
+            count = min(limit - len(hits), SEARCH_CANDIDATES - window_offset)
+            try:
+                rows = self._read(
+                    "WITH candidates AS ("
+                    "  SELECT rowid FROM search WHERE search MATCH ? "
+                    "  ORDER BY rowid DESC LIMIT ? OFFSET ?"
+                    ") "
+                    "SELECT search.session, search.event, search.kind, "
+                    "snippet(search, 0, ?, ?, '…', ?), "
+                    "events.timestamp, sessions.project_path, sessions.agent "
+                    "FROM search "
+                    "JOIN events ON events.id = search.event "
+                    "JOIN sessions ON sessions.key = search.session "
+                    "WHERE search MATCH ? AND search.rowid BETWEEN "
+                    "(SELECT min(rowid) FROM candidates) AND "
+                    "(SELECT max(rowid) FROM candidates) "
+                    "ORDER BY search.rank LIMIT ? OFFSET ?",
+                    (
+                        match_query,
+                        SEARCH_CANDIDATES,
+                        window * SEARCH_CANDIDATES,
+                        MATCH_START,
+                        MATCH_END,
+                        SNIPPET_TOKENS,
+                        match_query,
+                        count,
+                        window_offset,
+                    ),
+                )
+            except sqlite3.OperationalError:
+                # A word with no searchable characters (such as "-") is a syntax error
+                return []
+            hits.extend(SearchHit(*row) for row in rows)
+            if len(rows) < count:
+                break
+        return hits
+
+
+class SessionPages:
+    """Reads a session a page at a time.
+
+    Pages are read backwards from the end of the session, or in both directions from
+    the turn containing a given event.
+    """
+
+    def __init__(
+        self, store: SessionStore, session: str, start: int | None = None
+    ) -> None:
+        """
+
+        Args:
+            store: Session store.
+            session: Session key.
+            start: ID of an event to start reading at, or `None` to read backwards from
+                the end.
+        """
+        self.store = store
+        self.session = session
+        self.start = start
+        self._before: int | None = None
+        self._after: int | None = None
+        self.exhausted = False
+        """Have all earlier events been read?"""
+        self.exhausted_next = start is None
+        """Have all later events been read? (Always `True` when reading from the
+        end.)"""
+
+    def _find_turn(self) -> None:
+        """Start reading at the turn containing the start event."""
+        if self.start is not None and self._before is None and self._after is None:
+            turn_start = self.store.get_turn_start(self.session, self.start)
+            self._before = turn_start
+            self._after = turn_start - 1
+
+    def load_previous(self) -> list[SessionEvent]:
+        """Load the page before the pages loaded (blocks, so call from a thread).
+
+        Returns:
+            Events in the order they were recorded, or an empty list if there are no
+                earlier events.
+        """
+        if self.exhausted:
+            return []
+        self._find_turn()
+        events = self.store.get_page(self.session, self._before)
+        if events:
+            self._before = events[0].id
+        else:
+            self.exhausted = True
+        return events
+
+    def load_next(self) -> list[SessionEvent]:
+        """Load the page after the pages loaded (blocks, so call from a thread).
+
+        Returns:
+            Events in the order they were recorded, or an empty list if there are no
+                later events.
+        """
+        if self.exhausted_next:
+            return []
+        self._find_turn()
+        assert self._after is not None
+        events = self.store.get_page_after(self.session, self._after)
+        if events:
+            self._after = events[-1].id
+        else:
+            self.exhausted_next = True
+        return events
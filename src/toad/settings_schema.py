@@ -194,6 +194,37 @@ SCHEMA: list[SchemaDict] = [
             # },
         ],
     },
+    {
+        "key": "sessions",
+        "title": "Session settings",
+        "help": "Customize how Toad records sessions with agents.",
+        "type": "object",
+        "fields": [
+            {
+                "key": "record",
+                "title": "Record sessions?",
+                "help": "Save prompts, agent updates, and terminal summaries in Toad's data directory, so that previous sessions may be re-opened.\n[bold]Note:[/] Applies to new sessions.",
+                "type": "boolean",
+                "default": True,
+            },
+            {
+                "key": "max_age",
+                "title": "Keep sessions for (days)",
+                "help": "Sessions not updated for this many days are deleted. Set to 0 to keep sessions regardless of age.",
+                "type": "integer",
+                "default": 30,
+                "validate": [{"type": "minimum", "value": 0}],
+            },
+            {
+                "key": "max_size",
+                "title": "Maximum size of recorded sessions (MB)",
+                "help": "The oldest sessions are deleted while recorded sessions take more than this. Set to 0 for no limit.",
+                "type": "integer",
+                "default": 500,
+                "validate": [{"type": "minimum", "value": 0}],
+            },
+        ],
+    },
     {
         "key": "tools",
         "title": "Tool call settings",
@@ -213,7 +244,14 @@ SCHEMA: list[SchemaDict] = [
                     ("Fail only", "fail"),
                     ("Fail and success", "both"),
                 ],
-            }
+            },
+            {
+                "key": "terminal_pool",
+                "title": "Pre-spawn agent terminals?",
+                "help": "Keep a pool of terminals ready for agent commands, sized from recent demand. Reduces the startup time of commands run by the agent.\n[bold]Note:[/] Requires restart.",
+                "type": "boolean",
+                "default": False,
+            },
         ],
     },
     {
@@ -8,14 +8,17 @@ import codecs
 import fcntl
 import platform
 import pty
+import shlex
 import struct
 import termios
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from time import monotonic
 from typing import TYPE_CHECKING
 
 from textual import log
 from textual.message import Message
 
+from toad.ansi._ansi import ANSICommandMarker
 from toad.shell_read import shell_read
 
 from toad.widgets.terminal import Terminal
@@ -49,6 +52,56 @@ class ShellFinished(Message):
     """The shell finished."""
 
 
+@dataclass
+class ShellCommand:
+    """A command sent to the shell, with timings from the command markers."""
+
+    id: int
+    """ID of the command, sent in the markers."""
+    command: str
+    """The command line."""
+    sent_time: float = field(default_factory=monotonic)
+    """Time the command was written to the shell."""
+    start_time: float | None = None
+    """Time the start marker was received."""
+    end_time: float | None = None
+    """Time the end marker was received."""
+    exit_code: int | None = None
+    """Exit code, or `None` if the command hasn't finished."""
+    shell_start_time: float | None = None
+    """Start time from the shell's clock, if it has one."""
+    shell_end_time: float | None = None
+    """End time from the shell's clock, if it has one."""
+
+    @property
+    def is_finished(self) -> bool:
+        """Has the end marker been received?"""
+        return self.end_time is not None
+
+    @property
+    def latency(self) -> float | None:
+        """Time (in seconds) from sending the command to the shell starting it."""
+        if self.start_time is None:
+            return None
+        return self.start_time - self.sent_time
+
+    @property
+    def duration(self) -> float | None:
+        """Time (in seconds) the command ran for, or `None` if it hasn't finished."""
+        if self.shell_start_time is not None and self.shell_end_time is not None:
+            return self.shell_end_time - self.shell_start_time
+        if self.start_time is not None and self.end_time is not None:
+            return self.end_time - self.start_time
+        return None
+
+
+@dataclass
+class ShellCommandFinished(Message):
+    """A command sent to the shell has finished."""
+
+    shell_command: ShellCommand
+
+
 class Shell:
     """Responsible for shell interactions in Conversation."""
 
@@ -81,6 +134,10 @@ class Shell:
         self._hide_output = hide_start
         """Hide all output."""
 
+        self._command_count = 0
+        self._running_commands: dict[int, ShellCommand] = {}
+        """Commands sent to the shell, which haven't finished."""
+
     @property
     def is_finished(self) -> bool:
         return self._finished
@@ -88,11 +145,55 @@ class Shell:
     async def wait_for_ready(self) -> None:
         await self._ready_event.wait()
 
-    async def send(self, command: str, width: int, height: int) -> None:
+    @property
+    def is_fish(self) -> bool:
+        """Is the shell fish (which has its own syntax for the exit status)?"""
+        shell_name, *_ = self.shell.split()
+        return os.path.basename(shell_name) == "fish"
+
+    def _wrap_command(self, command: str, command_id: int) -> str:
+        """Wrap a command with the start and end markers, and report the directory.
+
+        Args:
+            command: Command line.
+            command_id: ID of the command.
+
+        Returns:
+            A command line to write to the shell.
+        """
+        if self.is_fish:
+            status = "$status"
+            timestamp = '""'
+        else:
+            status = '"$?"'
+            timestamp = '"${EPOCHREALTIME:-}"'
+        start_marker = rf"printf '\033]133;C;id={command_id};t=%s;\033\\' {timestamp}"
+        # Arguments are expanded in order, so the status is that of the command
+        end_marker = (
+            rf"printf '\033]133;D;%s;id={command_id};t=%s;\033\\"
+            rf"\033]2025;%s;\033\\' {status} {timestamp} "
+            '"$(pwd)"'
+        )
+        # The command is evaluated as a whole, so that a trailing comment or "&" doesn't
+        # affect the end marker (and it runs in the shell, so "cd" etc. still work)
+        return f"{start_marker};eval {shlex.quote(command)};{end_marker}\n"
+
+    async def send(self, command: str, width: int, height: int) -> ShellCommand | None:
+        """Send a command to the shell.
+
+        Args:
+            command: Command line.
+            width: Width of the terminal.
+            height: Height of the terminal.
+
+        Returns:
+            The command, which will be updated when the shell reports it has
+                finished, or `None` if the shell isn't running.
+        """
         await self._ready_event.wait()
         if self.master is None:
             print("TTY FD not set")
-            return
+            return None
 
         if self.terminal is not None:
             self.terminal.finalize()
@@ -103,8 +204,11 @@ class Shell:
         except OSError:
             pass
 
-        get_pwd_command = f"{command};" + r'printf "\e]2025;$(pwd);\e\\"' + "\n"
-        await self.write(get_pwd_command, hide_echo=True)
+        self._command_count += 1
+        shell_command = ShellCommand(self._command_count, command)
+        self._running_commands[shell_command.id] = shell_command
+        await self.write(self._wrap_command(command, shell_command.id), hide_echo=True)
+        return shell_command
 
     def start(self) -> None:
         assert self._task is None
@@ -145,6 +249,36 @@ class Shell:
         self._hide_output = hide_output
         return result
 
+    def _process_command_markers(
+        self, command_markers: list[ANSICommandMarker]
+    ) -> None:
+        """Update commands from markers reported by the shell.
+
+        Args:
+            command_markers: Markers in the order they were received.
+        """
+        receive_time = monotonic()
+        for command_marker in command_markers:
+            if (command_id := command_marker.command_id) is None:
+                continue
+            if (shell_command := self._running_commands.get(command_id)) is None:
+                continue
+            if command_marker.marker == "start":
+                shell_command.start_time = receive_time
+                shell_command.shell_start_time = command_marker.timestamp
+                continue
+            shell_command.end_time = receive_time
+            shell_command.shell_end_time = command_marker.timestamp
+            shell_command.exit_code = command_marker.exit_code
+            # Earlier commands without an end marker were interrupted
+            for running_id in list(self._running_commands):
+                if running_id <= command_id:
+                    del self._running_commands[running_id]
+            self.conversation.post_message(ShellCommandFinished(shell_command))
+            # The command is complete, no need to wait for the next command
+            if self.terminal is not None:
+                self.terminal.finalize()
+
     async def run(self) -> None:
         current_directory = self.working_directory
 
@@ -241,6 +375,9 @@ class Shell:
                         or not self.terminal.state.scrollback_buffer.is_blank
                     ):
                         self.terminal.display = True
+                if command_markers := self.terminal.state.command_markers:
+                    self._process_command_markers(command_markers)
+                    command_markers.clear()
                 new_directory = self.terminal.current_directory
                 if new_directory and new_directory != current_directory:
                     current_directory = new_directory
@@ -1,12 +1,22 @@
+from functools import partial
 from pathlib import Path
+import re
+from time import monotonic
 
+from markdown_it import MarkdownIt
+
+from textual import events
+from textual.await_complete import AwaitComplete
 from textual.reactive import var
+from textual.timer import Timer
 from textual import work
 from textual.widget import Widget
 from textual.widgets import Markdown
-from textual.widgets.markdown import MarkdownStream
+from textual.widgets.markdown import MarkdownBlock, MarkdownFence, MarkdownStream
 
 from toad import messages
+from toad.export import ExportBlock
+from toad.widgets.timeline import BlockModel
 
 
 SYSTEM = """\
@@ -15,13 +25,175 @@ Avoid using external libraries where possible, and favor code that writes output
 When asked for a table do not wrap it in a code fence.
 """
 
+FENCE_HIGHLIGHT_INTERVAL = 1 / 60
+"""Minimum time (in seconds) between highlights of an open code fence."""
+
+FENCE_OPEN = re.compile(r"^(`{3,}|~{3,})([^`]*)$")
+"""Matches the first line of a (non indented) code fence."""
+
 
 class AgentResponse(Markdown):
+    """The agent's response, which may be streamed.
+
+    Streamed Markdown is parsed from the start of the last top-level block (the *tail*).
+    Blocks before the tail are complete, and are never parsed or highlighted again.
+    While the tail is an open code fence, new lines are appended to the fence without
+    parsing, and highlighting is throttled.
+
+    """
+
     block_cursor_offset = var(-1)
 
     def __init__(self, markdown: str | None = None) -> None:
-        super().__init__(markdown)
+        super().__init__()
+        self._initial_fragment = markdown
         self._stream: MarkdownStream | None = None
+        self._source_fragments: list[str] = []
+        """Fragments appended since the source was last joined."""
+        self._tail = ""
+        """Source from the start of the last top-level block."""
+        self._tail_line = 0
+        """Line number of the start of the tail."""
+        self._fence_marker: str | None = None
+        """Marker of the open fence in the tail, or `None` if there is no open fence."""
+        self._fence_scan_offset = 0
+        """Offset in the tail of the first line not yet checked for the closing marker."""
+        self._fence_highlight_time = 0.0
+        self._fence_highlight_timer: Timer | None = None
+
+    async def _on_mount(self, event: events.Mount) -> None:
+        # Markdown would replace the document on mount (removing appended blocks)
+        event.prevent_default()
+        if self._initial_fragment:
+            await self.append(self._initial_fragment)
+        self._initial_fragment = None
+
+    @property
+    def source(self) -> str:
+        """The markdown source."""
+        if self._source_fragments:
+            self._markdown += "".join(self._source_fragments)
+            self._source_fragments.clear()
+        return self._markdown
+
+    def append(self, markdown: str) -> AwaitComplete:
+        """Append to the markdown, parsing only the tail.
+
+        Args:
+            markdown: A fragment of markdown.
+
+        Returns:
+            An optionally awaitable object.
+        """
+        self._source_fragments.append(markdown)
+
+        async def await_append() -> None:
+            async with self.lock:
+                self._tail += markdown
+                if self._fence_marker is not None and self._append_to_fence():
+                    return
+                await self._parse_tail()
+
+        return AwaitComplete(await_append())
+
+    def _append_to_fence(self) -> bool:
+        """Check new lines in an open fence for the closing marker.
+
+        Returns:
+            `True` if the fence is still open, or `False` if the tail requires parsing.
+        """
+        tail = self._tail
+        marker = self._fence_marker
+        assert marker is not None
+        scan_offset = self._fence_scan_offset
+        while (line_end := tail.find("\n", scan_offset)) != -1:
+            line = tail[scan_offset:line_end].strip()
+            scan_offset = line_end + 1
+            if line.startswith(marker) and not line.strip(marker[0]):
+                self._fence_marker = None
+                return False
+        self._fence_scan_offset = scan_offset
+        self._highlight_fence_later()
+        return True
+
+    def _highlight_fence_later(self) -> None:
+        """Highlight the open fence, no more than once per frame."""
+        if self._fence_highlight_timer is not None:
+            return
+        delay = self._fence_highlight_time + FENCE_HIGHLIGHT_INTERVAL - monotonic()
+        if delay <= 0:
+            self._highlight_fence()
+        else:
+            self._fence_highlight_timer = self.set_timer(delay, self._highlight_fence)
+
+    def _highlight_fence(self) -> None:
+        """Update the open fence with the code in the tail."""
+        self._fence_highlight_timer = None
+        if self._fence_marker is None or not self.children:
+            return
+        fence = self.children[-1]
+        if not isinstance(fence, MarkdownFence):
+            return
+        self._fence_highlight_time = monotonic()
+        _, _, code = self._tail.partition("\n")
+        fence.code = code.rstrip()
+        fence._highlighted_code = fence.highlight(
+            fence.code,
+            fence.lexer,
+            ansi=self.app.native_ansi_color,
+            dark=self.app.current_theme.dark,
+        )
+        fence.set_content(fence._highlighted_code)
+
+    async def _parse_tail(self) -> None:
+        """Parse the tail, and freeze any blocks which are complete."""
+        parser = (
+            MarkdownIt("gfm-like")
+            if self._parser_factory is None
+            else self._parser_factory()
+        )
+        tokens = parser.parse(self._tail)
+        tail_start = 0
+        for token in reversed(tokens):
+            if token.map is not None and token.level == 0:
+                tail_start = token.map[0]
+                break
+
+        new_blocks = list(self._parse_markdown(tokens))
+        for block in new_blocks:
+            start, end = block.source_range
+            block.source_range = (start + self._tail_line, end + self._tail_line)
+
+        with self.app.batch_update():
+            if new_blocks and self.children:
+                last_block = self.children[-1]
+                if isinstance(last_block, MarkdownBlock):
+                    last_block.source_range = new_blocks[0].source_range
+                    try:
+                        await last_block._update_from_block(new_blocks[0])
+                    except IndexError:
+                        pass
+                    else:
+                        new_blocks = new_blocks[1:]
+            if new_blocks:
+                await self.mount_all(new_blocks)
+
+        if tail_start:
+            self._tail = "".join(self._tail.splitlines(keepends=True)[tail_start:])
+            self._tail_line += tail_start
+
+        # Check if the tail is a fence that is still open
+        first_line, newline, _code = self._tail.partition("\n")
+        if (
+            newline
+            and self.children
+            and isinstance(self.children[-1], MarkdownFence)
+            and (match := FENCE_OPEN.match(first_line.rstrip())) is not None
+        ):
+            self._fence_marker = match.group(1)
+            self._fence_scan_offset = len(first_line) + 1
+            # The fence may have been closed by a line in this fragment
+            self._append_to_fence()
 
     def block_cursor_clear(self) -> None:
         self.block_cursor_offset = -1
@@ -68,6 +240,14 @@ class AgentResponse(Markdown):
     def block_select(self, widget: Widget) -> None:
         self.block_cursor_offset = self.children.index(widget)
 
+    def get_block_model(self) -> BlockModel | None:
+        return BlockModel(
+            partial(AgentResponse, self.source), export=self.get_block_export()
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        return ExportBlock("response", self.source)
+
     @property
     def stream(self) -> MarkdownStream:
         if self._stream is None:
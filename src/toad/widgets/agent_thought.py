@@ -1,4 +1,5 @@
 from __future__ import annotations
+from functools import partial
 from typing import ClassVar
 
 from textual.binding import Binding, BindingType
@@ -6,6 +7,9 @@ from textual.reactive import var
 from textual.widgets import Markdown
 from textual.widgets.markdown import MarkdownStream
 
+from toad.export import ExportBlock
+from toad.widgets.timeline import BlockModel
+
 
 class AgentThought(Markdown, can_focus=True):
     """The agent's 'thoughts'."""
@@ -29,6 +33,14 @@ class AgentThought(Markdown, can_focus=True):
     def watch_loading(self, loading: bool) -> None:
         self.set_class(loading, "-loading")
 
+    def get_block_model(self) -> BlockModel | None:
+        return BlockModel(
+            partial(AgentThought, self.source), export=self.get_block_export()
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        return ExportBlock("thought", self.source)
+
     @property
     def stream(self) -> MarkdownStream:
         if self._stream is None:
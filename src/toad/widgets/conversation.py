@@ -47,17 +47,32 @@ from toad.widgets.note import Note
 from toad.widgets.prompt import Prompt
 from toad.widgets.terminal import Terminal
 from toad.widgets.throbber import Throbber
+from toad.widgets.timeline import Timeline, TimelineSpacer
+from toad.widgets.tool_call import ToolCall
 from toad.widgets.user_input import UserInput
-from toad.shell import Shell, CurrentWorkingDirectoryChanged
+from toad.shell import Shell, CurrentWorkingDirectoryChanged, ShellCommandFinished
 from toad.slash_command import SlashCommand
-from toad.protocol import BlockProtocol, MenuProtocol, ExpandProtocol
+from toad.protocol import (
+    BlockProtocol,
+    MenuProtocol,
+    ExpandProtocol,
+    ExportProtocol,
+)
 from toad.menus import MenuItem
 
 if TYPE_CHECKING:
     from toad.widgets.terminal import Terminal
     from toad.widgets.agent_response import AgentResponse
     from toad.widgets.agent_thought import AgentThought
-    from toad.widgets.terminal_tool import TerminalTool
+    from toad.widgets.shell_result import ShellResult
+    from toad.pty_pool import PTYPool
+    from toad.shell import ShellCommand
+    from toad.export import ExportBlock
+    from toad.session_store import SessionPages, SessionRecorder
+
+
+HISTORY_LOAD_MARGIN = 100
+"""Lines from the top, within which an earlier page of a previous session is loaded."""
 
 
 AGENT_FAIL_HELP = """\
@@ -270,7 +285,6 @@ class Conversation(containers.Vertical):
         self.set_reactive(Conversation.project_path, project_path)
         self.set_reactive(Conversation.working_directory, str(project_path))
         self.agent_slash_commands: list[SlashCommand] = []
-        self.terminals: dict[str, TerminalTool] = {}
         self._loading: Loading | None = None
         self._agent_response: AgentResponse | None = None
         self._agent_thought: AgentThought | None = None
@@ -287,10 +301,27 @@ class Conversation(containers.Vertical):
 
         self.session_start_time: float | None = None
         self._terminal_count = 0
-        self._require_check_prune = False
+        self._timeline: Timeline | None = None
+        self._timeline_update_pending = False
+        self._cursor_up = True
 
         self._turn_count = 0
         self._shell_count = 0
+        self.shell_commands: list[ShellCommand] = []
+        """Shell commands which finished this session."""
+        self._shell_results: dict[int, ShellResult] = {}
+        """Shell results awaiting their command to finish, keyed on command ID."""
+        self._tool_calls: dict[str, ToolCall] = {}
+        """Mounted tool call widgets, keyed on tool call ID."""
+        self._parked_tool_calls: set[str] = set()
+        """IDs of parked tool calls."""
+        self._pending_tool_calls: dict[str, acp_protocol.ToolCall] = {}
+        """Updates to parked tool calls, applied when they are rebuilt."""
+        self.session_recorder: SessionRecorder | None = None
+        """Records this session, or `None` if it isn't being recorded."""
+        self._session_pages: SessionPages | None = None
+        """Pages of a previous session, displayed above this session."""
+        self._loading_session_page = False
 
     @property
     def agent_title(self) -> str | None:
@@ -716,6 +747,22 @@ class Conversation(containers.Vertical):
     ) -> None:
         self.working_directory = str(Path(event.path).resolve().absolute())
 
+    @on(ShellCommandFinished)
+    def on_shell_command_finished(self, event: ShellCommandFinished) -> None:
+        shell_command = event.shell_command
+        self.shell_commands.append(shell_command)
+        if self.session_recorder is not None:
+            self.session_recorder.record(
+                "shell",
+                {
+                    "command": shell_command.command,
+                    "exitCode": shell_command.exit_code,
+                    "duration": shell_command.duration,
+                },
+            )
+        if (shell_result := self._shell_results.pop(shell_command.id, None)) is not None:
+            shell_result.set_finished(shell_command)
+
     def watch_busy_count(self, busy: int) -> None:
         self.throbber.set_class(busy > 0, "-busy")
 
@@ -774,8 +821,6 @@ class Conversation(containers.Vertical):
     async def on_acp_tool_call_update(
         self, message: acp_messages.ToolCall | acp_messages.ToolCallUpdate
     ):
-        from toad.widgets.tool_call import ToolCall
-
         tool_call = message.tool_call
 
         if tool_call.get("status", None) in (None, "completed"):
@@ -783,15 +828,46 @@ class Conversation(containers.Vertical):
             self._agent_response = None
 
         tool_id = message.tool_id
-        try:
-            existing_tool_call: ToolCall | None = self.contents.get_child_by_id(
-                tool_id, ToolCall
-            )
-        except NoMatches:
-            await self.post(ToolCall(tool_call, id=message.tool_id))
+        if tool_id in self._parked_tool_calls:
+            # Apply when the tool call is rebuilt
+            self._pending_tool_calls[tool_id] = tool_call
+        elif (existing_tool_call := self._tool_calls.get(tool_id)) is None:
+            self._tool_calls[tool_id] = await self.post(ToolCall(tool_call, id=tool_id))
         else:
             existing_tool_call.tool_call = tool_call
 
+    @on(ToolCall.Mounted)
+    def on_tool_call_mounted(self, event: ToolCall.Mounted) -> None:
+        """Register a (possibly rebuilt) tool call, and apply any pending update."""
+        tool_call = event.tool_call
+        assert tool_call.id is not None
+        self._parked_tool_calls.discard(tool_call.id)
+        self._tool_calls[tool_call.id] = tool_call
+        if (pending := self._pending_tool_calls.pop(tool_call.id, None)) is not None:
+            tool_call.tool_call = pending
+
+    def _on_blocks_parked(self, blocks: list[Widget]) -> None:
+        """Release parked tool calls, so their widgets may be freed.
+
+        Args:
+            blocks: Blocks about to be parked.
+        """
+        for block in blocks:
+            if isinstance(block, ToolCall) and block.id in self._tool_calls:
+                del self._tool_calls[block.id]
+                self._parked_tool_calls.add(block.id)
+
+    def _prune_tool_calls(self) -> None:
+        """Remove tool calls which were removed from the conversation (not parked)."""
+        removed_ids = [
+            tool_id
+            for tool_id, tool_call in self._tool_calls.items()
+            if not tool_call.is_attached
+        ]
+        for tool_id in removed_ids:
+            del self._tool_calls[tool_id]
+            self._pending_tool_calls.pop(tool_id, None)
+
     @on(acp_messages.AvailableCommandsUpdate)
     async def on_acp_available_commands_update(
         self, message: acp_messages.AvailableCommandsUpdate
@@ -808,25 +884,6 @@ class Conversation(containers.Vertical):
         self.agent_slash_commands = slash_commands
         self.update_slash_commands()
 
-    def get_terminal(self, terminal_id: str) -> TerminalTool | None:
-        """Get a terminal from its id.
-
-        Args:
-            terminal_id: ID of the terminal.
-
-        Returns:
-            Terminal instance, or `None` if no terminal was found.
-        """
-        from toad.widgets.terminal_tool import TerminalTool
-
-        try:
-            terminal = self.contents.query_one(f"#{terminal_id}", TerminalTool)
-        except NoMatches:
-            return None
-        if terminal.released:
-            return None
-        return terminal
-
     async def action_interrupt(self) -> None:
         terminal = self._terminal
         if terminal is not None and not terminal.is_finalized:
@@ -836,75 +893,26 @@ class Conversation(containers.Vertical):
         else:
             raise SkipAction()
 
-    @work
-    @on(acp_messages.CreateTerminal)
-    async def on_acp_create_terminal(self, message: acp_messages.CreateTerminal):
-        from toad.widgets.terminal_tool import TerminalTool, Command
-
-        command = Command(
-            message.command,
-            message.args or [],
-            message.env or {},
-            message.cwd or str(self.project_path),
-        )
-        width = self.window.size.width - 5 - self.window.styles.scrollbar_size_vertical
-        height = self.window.scrollable_content_region.height - 2
+    @on(acp_messages.TerminalCreated)
+    async def on_acp_terminal_created(self, message: acp_messages.TerminalCreated):
+        from toad.widgets.terminal_tool import TerminalTool
 
+        width, _height = self.terminal_size
         terminal = TerminalTool(
-            command,
-            output_byte_limit=message.output_byte_limit,
+            message.process,
             id=message.terminal_id,
             minimum_terminal_width=width,
         )
-        self.terminals[message.terminal_id] = terminal
         terminal.display = False
+        await self.post(terminal)
 
-        try:
-            await terminal.start(width, height)
-        except Exception as error:
-            log(str(error))
-            message.result_future.set_result(False)
-            return
-
-        try:
-            await self.post(terminal)
-        except Exception:
-            message.result_future.set_result(False)
-        else:
-            message.result_future.set_result(True)
-
-    @on(acp_messages.KillTerminal)
-    async def on_acp_kill_terminal(self, message: acp_messages.KillTerminal):
-        if (terminal := self.get_terminal(message.terminal_id)) is not None:
-            terminal.kill()
-
-    @on(acp_messages.GetTerminalState)
-    def on_acp_get_terminal_state(self, message: acp_messages.GetTerminalState):
-        if (terminal := self.get_terminal(message.terminal_id)) is None:
-            message.result_future.set_exception(
-                KeyError(f"No terminal with id {message.terminal_id!r}")
-            )
-        else:
-            message.result_future.set_result(terminal.tool_state)
-
-    @on(acp_messages.ReleaseTerminal)
-    def on_acp_terminal_release(self, message: acp_messages.ReleaseTerminal):
-        if (terminal := self.get_terminal(message.terminal_id)) is not None:
-            terminal.kill()
-            terminal.release()
-
-    @work
-    @on(acp_messages.WaitForTerminalExit)
-    async def on_acp_wait_for_terminal_exit(
-        self, message: acp_messages.WaitForTerminalExit
-    ):
-        if (terminal := self.get_terminal(message.terminal_id)) is None:
-            message.result_future.set_exception(
-                KeyError(f"No terminal with id {message.terminal_id!r}")
-            )
-        else:
-            return_code, signal = await terminal.wait_for_exit()
-            message.result_future.set_result((return_code or 0, signal))
+    @property
+    def terminal_size(self) -> tuple[int, int]:
+        """Size of terminals created by the agent (columns, rows)."""
+        width = self.window.size.width - 5 - self.window.styles.scrollbar_size_vertical
+        height = self.window.scrollable_content_region.height - 2
+        # The window may not have been laid out yet
+        return (width if width > 0 else 80, height if height > 0 else 24)
 
     def set_mode(self, mode_id: str) -> bool:
         """Set the mode give its id (if it exists).
@@ -1069,6 +1077,16 @@ class Conversation(containers.Vertical):
     def _build_slash_commands(self) -> list[SlashCommand]:
         slash_commands = [
             SlashCommand("/about-toad", "About Toad"),
+            SlashCommand("/slowest-commands", "Slowest shell commands this session"),
+            SlashCommand(
+                "/previous-session", "Show the previous session in this project"
+            ),
+            SlashCommand("/search-sessions", "Search the text of recorded sessions"),
+            SlashCommand(
+                "/export",
+                "Export the conversation to a file",
+                hint="markdown | jsonl | html",
+            ),
         ]
         slash_commands.extend(self.agent_slash_commands)
         deduplicated_slash_commands = {
@@ -1088,6 +1106,12 @@ class Conversation(containers.Vertical):
         self.prompt.slash_commands = self._build_slash_commands()
         self.call_after_refresh(self.post_welcome)
         self.app.settings_changed_signal.subscribe(self, self._settings_changed)
+        self.watch(self.window, "scroll_y", self._on_window_scroll, init=False)
+        if self.app.settings.get("sessions.record", bool):
+            self.session_recorder = self.app.session_store.new_session(
+                self.project_path,
+                None if self._agent_data is None else self._agent_data["identity"],
+            )
 
         self.shell_history.complete.add_words(
             self.app.settings.get("shell.allow_commands", expect_type=str).split()
@@ -1100,7 +1124,18 @@ class Conversation(containers.Vertical):
                 assert self._agent_data is not None
                 from toad.acp.agent import Agent
 
-                self.agent = Agent(self.project_path, self._agent_data)
+                pty_pool: PTYPool | None = None
+                if self.app.settings.get("tools.terminal_pool", bool):
+                    from toad.pty_pool import PTYPool
+
+                    pty_pool = PTYPool()
+                self.agent = Agent(
+                    self.project_path,
+                    self._agent_data,
+                    pty_pool=pty_pool,
+                    get_terminal_size=lambda: self.terminal_size,
+                    session_recorder=self.session_recorder,
+                )
                 self.agent.start(self)
 
             self.call_after_refresh(start_agent)
@@ -1135,6 +1170,9 @@ class Conversation(containers.Vertical):
 
                 await self.post(MarkdownNote(welcome))
 
+    def on_resize(self, event: events.Resize) -> None:
+        self.schedule_timeline_update()
+
     def on_mouse_down(self, event: events.MouseDown) -> None:
         self._mouse_down_offset = event.screen_offset
 
@@ -1193,50 +1231,119 @@ class Conversation(containers.Vertical):
         widget.loading = loading
         if anchor:
             self.window.anchor()
-        self._require_check_prune = True
-        self.call_after_refresh(self.check_prune)
+        self.schedule_timeline_update()
         return widget
 
-    async def check_prune(self) -> None:
-        """Check if a prune is required."""
-        if self._require_check_prune:
-            await self.prune_window(1500, 2500)
-            self._require_check_prune = False
+    def _on_window_scroll(self) -> None:
+        self.schedule_timeline_update()
+        self._check_session_pages()
 
-    async def prune_window(self, low_mark: int, high_mark: int) -> None:
-        """Remove older children to keep within a certain range.
+    def _check_session_pages(self) -> None:
+        """Load an earlier page of the previous session, if near the top."""
+        if (
+            self.window.scroll_y < HISTORY_LOAD_MARGIN
+            and self._session_pages is not None
+            and not self._session_pages.exhausted
+        ):
+            self.call_later(self.load_session_page)
 
-        Args:
-            low_mark: Height to aim for.
-            high_mark: Height to start pruning.
-        """
+    @work
+    async def open_previous_session(self) -> None:
+        """Display the previous session in this project, above the current session."""
+        from toad.session_store import SessionPages
+
+        store = self.app.session_store
+        sessions = await asyncio.to_thread(store.get_sessions, self.project_path, 2)
+        current_key = (
+            None if self.session_recorder is None else self.session_recorder.key
+        )
+        previous_sessions = [
+            session for session in sessions if session.key != current_key
+        ]
+        if not previous_sessions:
+            self.flash("There is no previous session in this project", style="warning")
+            return
+        self._session_pages = SessionPages(store, previous_sessions[0].key)
+        await self.load_session_page()
+        self.flash("Previous session loaded (scroll up to read)", style="success")
 
-        assert high_mark >= low_mark
+    async def load_session_page(self) -> None:
+        """Load the page of the previous session before those already displayed."""
+        from toad.widgets.session_transcript import build_session_blocks
 
-        contents = self.contents
-        height = contents.virtual_size.height
-        if height <= high_mark:
+        if (pages := self._session_pages) is None or self._loading_session_page:
             return
-        prune_children: list[Widget] = []
-        bottom_margin = 0
-        prune_height = 0
-        for child in contents.children:
-            if not child.display:
-                continue
-            top, _, bottom, _ = child.styles.margin
-            child_height = child.outer_size.height
-            prune_height = (
-                (prune_height - bottom_margin + max(bottom_margin, top))
-                + bottom
-                + child_height
+        self._loading_session_page = True
+        try:
+            events = await asyncio.to_thread(pages.load_previous)
+            blocks = build_session_blocks(events)
+            await self.timeline.prepend([block for _, block in blocks])
+            self.schedule_timeline_update()
+        finally:
+            self._loading_session_page = False
+        # The page may not have filled the space above the viewport
+        self.call_after_refresh(self._check_session_pages)
+
+    @property
+    def timeline(self) -> Timeline:
+        """The timeline, which parks blocks that are far from the viewport."""
+        if self._timeline is None:
+            self._timeline = Timeline(
+                self.window, self.contents, on_park=self._on_blocks_parked
             )
-            bottom_margin = bottom
-            if height - prune_height <= low_mark:
-                break
-            prune_children.append(child)
+        return self._timeline
+
+    def schedule_timeline_update(self) -> None:
+        """Update the timeline after the next refresh."""
+        if not self._timeline_update_pending:
+            self._timeline_update_pending = True
+            self.call_after_refresh(self.update_timeline)
+
+    async def update_timeline(self) -> None:
+        """Park blocks far from the viewport, and rebuild parked blocks near it."""
+        self._timeline_update_pending = False
+        cursor_block = self.cursor_block
+        update_required = await self.timeline.update(self.is_live_block)
+        self._prune_tool_calls()
+        if cursor_block is not None and cursor_block.is_attached:
+            # Blocks may have been added or removed before the cursor
+            self.set_reactive(
+                Conversation.cursor_offset,
+                self.contents.displayed_children.index(cursor_block),
+            )
+        if update_required:
+            self.schedule_timeline_update()
+
+    def is_live_block(self, widget: Widget) -> bool:
+        """Check if a block must not be parked.
+
+        Args:
+            widget: A block in the conversation.
+
+        Returns:
+            `True` if the block must remain mounted.
+        """
+        return (
+            widget is self._agent_response
+            or widget is self._agent_thought
+            or widget is self._loading
+            or widget is self.cursor_block
+            or widget.has_focus_within
+        )
 
-        if prune_children:
-            await contents.remove_children(prune_children)
+    async def _unpark_cursor_block(self, spacer: TimelineSpacer) -> None:
+        """Rebuild the block the cursor moved on to.
+
+        Args:
+            spacer: The spacer under the cursor.
+        """
+        if not spacer.is_attached or not spacer.models:
+            return
+        widget = await self.timeline.unpark(spacer, last=self._cursor_up)
+        self.set_reactive(
+            Conversation.cursor_offset, self.contents.displayed_children.index(widget)
+        )
+        self.refresh_block_cursor()
 
     async def new_terminal(self) -> Terminal:
         """Create a new interactive Terminal.
@@ -1321,9 +1428,11 @@ class Conversation(containers.Vertical):
 
         if command.strip():
             self._shell_count += 1
-            await self.post(ShellResult(command))
+            shell_result = ShellResult(command)
+            await self.post(shell_result)
             width, height = self.get_terminal_dimensions()
-            await self.shell.send(command, width, height)
+            if (shell_command := await self.shell.send(command, width, height)) is not None:
+                self._shell_results[shell_command.id] = shell_result
             self.post_message(messages.ProjectDirectoryUpdated())
 
     def action_cursor_up(self) -> None:
@@ -1508,7 +1617,13 @@ class Conversation(containers.Vertical):
     async def action_mode_switcher(self) -> None:
         self.prompt.mode_switcher.focus()
 
+    def watch_cursor_offset(self, previous_offset: int, offset: int) -> None:
+        self._cursor_up = offset < previous_offset or previous_offset == -1
+
     def refresh_block_cursor(self) -> None:
+        if isinstance(spacer := self.cursor_block, TimelineSpacer):
+            self.call_later(self._unpark_cursor_block, spacer)
+            return
         if (cursor_block := self.cursor_block_child) is not None:
             self.window.focus()
             self.cursor.visible = True
@@ -1548,4 +1663,124 @@ class Conversation(containers.Vertical):
                 title="About",
             )
             return True
+        elif command == "slowest-commands":
+            from toad.widgets.markdown_note import MarkdownNote
+
+            await self.post(MarkdownNote(self.render_slowest_commands()))
+            return True
+        elif command == "previous-session":
+            self.open_previous_session()
+            return True
+        elif command == "search-sessions":
+            from toad.screens.session_search import SessionSearchScreen
+
+            self.app.push_screen(SessionSearchScreen())
+            return True
+        elif command == "export":
+            from toad.export import FORMATS
+
+            export_format = parameters.strip().lower() or "markdown"
+            if export_format not in FORMATS:
+                self.flash(
+                    f"Export format should be one of {', '.join(FORMATS)}",
+                    style="error",
+                )
+                return True
+            self.export_conversation(self.get_export_blocks(), export_format)
+            return True
         return False
+
+    def get_export_blocks(self) -> list[ExportBlock]:
+        """Get the data to export from every block, including parked blocks.
+
+        Returns:
+            Blocks to export, in timeline order.
+        """
+        blocks: list[ExportBlock] = []
+        for child in self.contents.children:
+            if isinstance(child, TimelineSpacer):
+                blocks.extend(
+                    model.export for model in child.models if model.export is not None
+                )
+            elif isinstance(child, ExportProtocol):
+                if (export_block := child.get_block_export()) is not None:
+                    blocks.append(export_block)
+        return blocks
+
+    @work(thread=True, exclusive=True, group="export")
+    def export_conversation(
+        self, blocks: list[ExportBlock], export_format: str
+    ) -> None:
+        """Export the conversation to the user's documents directory.
+
+        Args:
+            blocks: Blocks to export.
+            export_format: A format in `toad.export.FORMATS`.
+        """
+        import platformdirs
+        from textual._files import generate_datetime_filename
+
+        from toad.export import FORMATS, export
+
+        extension, _ = FORMATS[export_format]
+        export_path = Path(platformdirs.user_documents_dir()).expanduser() / (
+            generate_datetime_filename("Toad", extension, None)
+        )
+
+        def progress(exported: int, total: int) -> None:
+            self.app.call_from_thread(
+                self.flash, f"Exporting… {exported}/{total} blocks", duration=1
+            )
+
+        try:
+            export_path.parent.mkdir(parents=True, exist_ok=True)
+            export(blocks, export_format, export_path, progress)
+        except OSError as error:
+            self.app.call_from_thread(
+                self.flash,
+                Content(f"Unable to export conversation; {error}"),
+                style="error",
+            )
+        else:
+            self.app.call_from_thread(
+                self.flash,
+                Content(f"Exported conversation to {export_path}"),
+                style="success",
+            )
+
+    def render_slowest_commands(self, count: int = 10) -> str:
+        """Render a report of the slowest shell commands this session.
+
+        Args:
+            count: Maximum number of commands to report.
+
+        Returns:
+            Markdown.
+        """
+        from toad.process_stats import format_duration
+
+        timed_commands = [
+            shell_command
+            for shell_command in self.shell_commands
+            if shell_command.duration is not None
+        ]
+        if not timed_commands:
+            return "No shell commands have finished this session."
+        slowest = sorted(
+            timed_commands, key=attrgetter("duration"), reverse=True
+        )[:count]
+        lines = [
+            f"## Slowest shell commands ({len(slowest)} of {len(timed_commands)})",
+            "",
+            "| Duration | Exit code | Command |",
+            "| ---: | ---: | --- |",
+        ]
+        for shell_command in slowest:
+            assert shell_command.duration is not None
+            command = shell_command.command.replace("|", "\\|").replace("`", "'")
+            lines.append(
+                f"| {format_duration(shell_command.duration)} "
+                f"| {'' if shell_command.exit_code is None else shell_command.exit_code} "
+                f"| `{command}` |"
+            )
+        return "\n".join(lines)
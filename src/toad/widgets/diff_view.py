@@ -2,29 +2,28 @@ from __future__ import annotations
 
 
 import asyncio
-import difflib
-from itertools import starmap
-from typing import Iterable, Literal
-
-from rich.segment import Segment
-from rich.style import Style as RichStyle
+from bisect import bisect_right
+from functools import partial
+from typing import Callable, Literal
 
 from textual.app import ComposeResult
-from textual.content import Content, Span
+from textual.cache import LRUCache
+from textual.content import Content
 from textual.geometry import Size
-from textual import highlight
 from textual import events
 
-from textual.css.styles import RulesMap
 from textual.selection import Selection
 from textual.strip import Strip
-from textual.style import Style
 from textual.reactive import reactive, var
-from textual.visual import Visual, RenderOptions
 from textual.widget import Widget
 from textual.widgets import Static
 from textual import containers
 
+from toad.diff import Opcode
+from toad.diff_cache import DiffData, Side, diff_cache
+from toad.export import ExportBlock, read_diff
+from toad.widgets.timeline import BlockModel
+
 type Annotation = Literal["+", "-", "/", " "]
 
 
@@ -44,64 +43,86 @@ class DiffScrollContainer(containers.HorizontalGroup):
             self.scroll_link.scroll_x = new_value
 
 
-class LineContent(Visual):
-    def __init__(
-        self,
-        code_lines: list[Content | None],
-        line_styles: list[str],
-        width: int | None = None,
-    ) -> None:
-        self.code_lines = code_lines
-        self.line_styles = line_styles
-        self._width = width
-
-    def render_strips(
-        self, width: int, height: int | None, style: Style, options: RenderOptions
-    ) -> list[Strip]:
-        strips: list[Strip] = []
-        y = 0
-        selection = options.selection
-        selection_style = options.selection_style or Style.null()
-        for y, (line, color) in enumerate(zip(self.code_lines, self.line_styles)):
-            if line is None:
-                line = Content.styled("╲" * width, "$foreground 15%")
+class HunkRows:
+    """Maps the rows of a hunk on to lines, without building a list of rows.
+
+    Rows are located with a binary search over the first row of each opcode, so memory
+    is proportional to the number of opcodes rather than the number of lines.
+    """
+
+    def __init__(self, group: list[Opcode], split: bool) -> None:
+        """
+
+        Args:
+            group: Grouped opcodes for the hunk.
+            split: Rows for a split diff if `True`, otherwise for a unified diff.
+        """
+        self.group = group
+        self.split = split
+        self.row_starts: list[int] = []
+        height = 0
+        max_line_number = 0
+        for tag, i1, i2, j1, j2 in group:
+            self.row_starts.append(height)
+            if tag == "equal":
+                height += i2 - i1
+            elif split:
+                height += max(i2 - i1, j2 - j1)
             else:
-                if selection is not None:
-                    if span := selection.get_span(y):
-                        start, end = span
-                        if end == -1:
-                            end = len(line)
-                        line = line.stylize(selection_style, start, end)
-                if line.cell_length < width:
-                    line = line.pad_right(width - line.cell_length)
-
-            line = line.stylize_before(color).stylize_before(style)
-            x = 0
-            meta = {"offset": (x, y)}
-            segments = []
-            for text, rich_style, _ in line.render_segments():
-                if rich_style is not None:
-                    meta["offset"] = (x, y)
-                    segments.append(
-                        Segment(text, rich_style + RichStyle.from_meta(meta))
-                    )
-                else:
-                    segments.append(Segment(text, rich_style))
-                x += len(text)
+                height += (i2 - i1) + (j2 - j1)
+            if i2 > i1:
+                max_line_number = max(max_line_number, i2)
+            if j2 > j1:
+                max_line_number = max(max_line_number, j2)
+        self.height = height
+        """Number of rows."""
+        self.line_number_width = len(str(max_line_number)) if max_line_number else 1
+        """Width of the widest line number."""
+
+    def _locate(self, y: int) -> tuple[Opcode, int]:
+        """Find the opcode for a row.
+
+        Args:
+            y: Row index.
 
-            strips.append(Strip(segments, line.cell_length))
-        return strips
+        Returns:
+            The opcode, and the offset of the row within the opcode.
+        """
+        position = bisect_right(self.row_starts, y) - 1
+        return self.group[position], y - self.row_starts[position]
 
-    def get_optimal_width(self, rules: RulesMap, container_width: int) -> int:
-        if self._width is not None:
-            return self._width
-        return max(line.cell_length for line in self.code_lines if line is not None)
+    def get_unified_row(self, y: int) -> tuple[Annotation, int | None, int | None]:
+        """Get a row of a unified diff.
 
-    def get_minimal_width(self, rules: RulesMap) -> int:
-        return 1
+        Args:
+            y: Row index.
 
-    def get_height(self, rules: RulesMap, width: int) -> int:
-        return len(self.line_styles)
+        Returns:
+            A tuple of the annotation, and the line indices before and after.
+        """
+        (tag, i1, i2, j1, _j2), offset = self._locate(y)
+        if tag == "equal":
+            return " ", i1 + offset, j1 + offset
+        if offset < i2 - i1:
+            return "-", i1 + offset, None
+        return "+", None, j1 + offset - (i2 - i1)
+
+    def get_split_row(self, y: int, side: Side) -> tuple[Annotation, int | None]:
+        """Get one side of a row of a split diff.
+
+        Args:
+            y: Row index.
+            side: Code before (0) or after (1).
+
+        Returns:
+            A tuple of the annotation, and the line index (or `None` for filler).
+        """
+        (tag, i1, i2, j1, j2), offset = self._locate(y)
+        if tag == "equal":
+            return " ", (j1 if side else i1) + offset
+        if side:
+            return ("+", j1 + offset) if offset < j2 - j1 else ("/", None)
+        return ("-", i1 + offset) if offset < i2 - i1 else ("/", None)
 
 
 class LineAnnotations(Widget):
@@ -113,52 +134,55 @@ class LineAnnotations(Widget):
         height: auto;                
     }
     """
-    numbers: reactive[list[Content]] = reactive(list)
 
     def __init__(
         self,
-        numbers: Iterable[Content],
+        get_annotation: Callable[[int], Content],
+        annotation_height: int,
+        annotation_width: int,
         *,
         name: str | None = None,
         id: str | None = None,
         classes: str | None = None,
         disabled: bool = False,
     ):
-        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
-        self.numbers = list(numbers)
+        """
 
-    @property
-    def total_width(self) -> int:
-        return self.number_width
+        Args:
+            get_annotation: Callable which returns the annotation for a given row.
+            annotation_height: Number of rows.
+            annotation_width: Width of the annotations.
+        """
+        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        self.get_annotation = get_annotation
+        self.annotation_height = annotation_height
+        self.annotation_width = annotation_width
 
     def get_content_width(self, container: Size, viewport: Size) -> int:
-        return self.total_width
+        return self.annotation_width
 
     def get_content_height(self, container: Size, viewport: Size, width: int) -> int:
-        return len(self.numbers)
-
-    @property
-    def number_width(self) -> int:
-        return max(number.cell_length for number in self.numbers) if self.numbers else 0
+        return self.annotation_height
 
     def render_line(self, y: int) -> Strip:
-        width = self.total_width
+        width = self.annotation_width
         visual_style = self.visual_style
         rich_style = visual_style.rich_style
-        try:
-            number = self.numbers[y]
-        except IndexError:
-            number = Content.empty()
+        if y < self.annotation_height:
+            annotation = self.get_annotation(y)
+        else:
+            annotation = Content.empty()
 
         strip = Strip(
-            number.render_segments(visual_style), cell_length=number.cell_length
+            annotation.render_segments(visual_style),
+            cell_length=annotation.cell_length,
         )
         strip = strip.adjust_cell_length(width, rich_style)
         return strip
 
 
-class DiffCode(Static):
-    """Container for the code."""
+class DiffCode(Widget):
+    """The code, rendered a line at a time (only visible lines are rendered)."""
 
     DEFAULT_CSS = """
     DiffCode {
@@ -169,33 +193,102 @@ class DiffCode(Static):
     """
     ALLOW_SELECT = True
 
+    def __init__(
+        self,
+        get_line: Callable[[int], tuple[Content | None, str]],
+        get_text: Callable[[int], str],
+        code_height: int,
+        code_width: int,
+        *,
+        name: str | None = None,
+        id: str | None = None,
+        classes: str | None = None,
+        disabled: bool = False,
+    ):
+        """
+
+        Args:
+            get_line: Callable which returns the code (or `None` for filler) and the
+                line style, for a given row.
+            get_text: Callable which returns the plain text for a given row.
+            code_height: Number of rows.
+            code_width: Width of the widest line.
+        """
+        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        self.get_line = get_line
+        self.get_text = get_text
+        self.code_height = code_height
+        self.code_width = code_width
+        self._render_cache: LRUCache[tuple[int, int], Strip] = LRUCache(1024)
+
+    def notify_style_update(self) -> None:
+        """Clear cache when theme changes."""
+        self._render_cache.clear()
+        super().notify_style_update()
+
+    def get_content_width(self, container: Size, viewport: Size) -> int:
+        return self.code_width
+
+    def get_content_height(self, container: Size, viewport: Size, width: int) -> int:
+        return self.code_height
+
     def get_selection(self, selection: Selection) -> tuple[str, str] | None:
-        visual = self._render()
-        if isinstance(visual, LineContent):
-            text = "\n".join(
-                "" if line is None else line.plain for line in visual.code_lines
-            )
-        else:
-            return None
+        text = "\n".join(self.get_text(y) for y in range(self.code_height))
         return selection.extract(text), "\n"
 
+    def render_line(self, y: int) -> Strip:
+        width = self.size.width
+        visual_style = self.visual_style
+        if y >= self.code_height:
+            return Strip.blank(width, visual_style.rich_style)
+
+        selection = self.text_selection
+        select_span = None if selection is None else selection.get_span(y)
+        cache_key = (y, width)
+        if select_span is None and (strip := self._render_cache.get(cache_key)):
+            return strip
+
+        line, line_style = self.get_line(y)
+        if line is None:
+            line = Content.styled("╲" * width, "$foreground 15%")
+        else:
+            if select_span is not None:
+                start, end = select_span
+                if end == -1:
+                    end = len(line)
+                selection_style = self.screen.get_visual_style("screen--selection")
+                line = line.stylize(selection_style, start, end)
+            if line.cell_length < width:
+                line = line.pad_right(width - line.cell_length)
+        line = line.stylize_before(line_style)
+
+        strip = Strip(line.render_segments(visual_style), cell_length=line.cell_length)
+        strip = strip.adjust_cell_length(width, visual_style.rich_style)
+        strip = strip.apply_offsets(0, y)
+        if select_span is None:
+            self._render_cache[cache_key] = strip
+        return strip
+
+
+class DiffHunk(containers.HorizontalGroup):
+    """A group of changes, with lines of context."""
+
 
-def fill_lists[T](list_a: list[T], list_b: list[T], fill_value: T) -> None:
-    """Make two lists the same size by extending the smaller with a fill value.
+def find_hunk(container: Widget, direction: Literal[-1, 1]) -> DiffHunk | None:
+    """Find the next or previous hunk, relative to the top of a scrolling container.
 
     Args:
-        list_a: The first list.
-        list_b: The second list.
-        fill_value: Value used to extend a list.
+        container: A scrolling container with diff views.
+        direction: `1` for the next hunk, or `-1` for the previous hunk.
 
+    Returns:
+        A hunk, or `None` if there are no more hunks in that direction.
     """
-    a_length = len(list_a)
-    b_length = len(list_b)
-    if a_length != b_length:
-        if a_length > b_length:
-            list_b.extend([fill_value] * (a_length - b_length))
-        elif b_length > a_length:
-            list_a.extend([fill_value] * (b_length - a_length))
+    top = container.scrollable_content_region.y
+    hunks = [(hunk.region.y - top, hunk) for hunk in container.query(DiffHunk)]
+    if direction == 1:
+        return next((hunk for offset, hunk in hunks if offset > 0), None)
+    return next((hunk for offset, hunk in reversed(hunks) if offset < 0), None)
 
 
 class DiffView(containers.VerticalGroup):
@@ -260,8 +353,30 @@ class DiffView(containers.VerticalGroup):
         self.set_reactive(DiffView.path2, path2)
         self.set_reactive(DiffView.code_before, code_before.expandtabs())
         self.set_reactive(DiffView.code_after, code_after.expandtabs())
-        self._grouped_opcodes: list[list[tuple[str, int, int, int, int]]] | None = None
-        self._highlighted_code_lines: tuple[list[Content], list[Content]] | None = None
+        self._diff: DiffData | None = None
+
+    def get_block_model(self) -> BlockModel | None:
+        path1, path2 = self.path1, self.path2
+        code_before, code_after = self.code_before, self.code_after
+        classes = " ".join(self.classes)
+        split, auto_split = self.split, self.auto_split
+
+        def build() -> DiffView:
+            diff_view = DiffView(path1, path2, code_before, code_after, classes=classes)
+            diff_view.set_reactive(DiffView.split, split)
+            diff_view.auto_split = auto_split
+            return diff_view
+
+        return BlockModel(build, export=self.get_block_export())
+
+    def get_block_export(self) -> ExportBlock | None:
+        return ExportBlock(
+            "diff",
+            data={"path1": self.path1, "path2": self.path2},
+            read=partial(
+                read_diff, self.path1, self.path2, self.code_before, self.code_after
+            ),
+        )
 
     async def prepare(self) -> None:
         """Do CPU work in a thread.
@@ -274,25 +389,39 @@ class DiffView(containers.VerticalGroup):
 
         def prepare() -> None:
             """Call properties which will lazily update data structures."""
-            self.grouped_opcodes
-            self.highlighted_code_lines
+            diff = self.diff
+            # Highlight the lines at the start of the first hunk
+            if diff.grouped_opcodes:
+                _, i1, i2, j1, j2 = diff.grouped_opcodes[0][0]
+                if i2 > i1:
+                    diff.get_highlighted_line(0, i1)
+                if j2 > j1:
+                    diff.get_highlighted_line(1, j1)
 
         await asyncio.to_thread(prepare)
 
     @property
-    def grouped_opcodes(self) -> list[list[tuple[str, int, int, int, int]]]:
-        if self._grouped_opcodes is None:
-            text_lines_a = self.code_before.splitlines()
-            text_lines_b = self.code_after.splitlines()
-            sequence_matcher = difflib.SequenceMatcher(
-                lambda character: character in " \t",
-                text_lines_a,
-                text_lines_b,
-                autojunk=True,
+    def diff(self) -> DiffData:
+        """The diff and highlighted code, shared with other views of the same edit."""
+        if self._diff is None:
+            self._diff = diff_cache.get_diff(
+                self.path1, self.path2, self.code_before, self.code_after
             )
-            self._grouped_opcodes = list(sequence_matcher.get_grouped_opcodes())
+        return self._diff
 
-        return self._grouped_opcodes
+    @property
+    def text_lines(self) -> tuple[list[str], list[str]]:
+        """Lines of `code_before` and `code_after`."""
+        return self.diff.text_lines
+
+    @property
+    def opcodes(self) -> list[Opcode]:
+        """Line-level opcodes for the diff."""
+        return self.diff.opcodes
+
+    @property
+    def grouped_opcodes(self) -> list[list[Opcode]]:
+        return self.diff.grouped_opcodes
 
     @property
     def counts(self) -> tuple[int, int]:
@@ -310,49 +439,6 @@ class DiffView(containers.VerticalGroup):
                     additions += 1
         return additions, removals
 
-    @property
-    def highlighted_code_lines(self) -> tuple[list[Content], list[Content]]:
-        """Get syntax highlighted code for both files, as a list of lines.
-
-        Returns:
-            A pair of line lists for `code_before` and `code_after`
-        """
-        if self._highlighted_code_lines is None:
-            language1 = highlight.guess_language(self.code_before, self.path1)
-            language2 = highlight.guess_language(self.code_after, self.path2)
-            text_lines_a = self.code_before.splitlines()
-            text_lines_b = self.code_after.splitlines()
-
-            code_a = highlight.highlight(
-                "\n".join(text_lines_a), language=language1, path=self.path1
-            )
-            code_b = highlight.highlight(
-                "\n".join(text_lines_b), language=language2, path=self.path2
-            )
-
-            sequence_matcher = difflib.SequenceMatcher(
-                lambda character: character in " \t",
-                self.code_before,
-                self.code_after,
-                autojunk=True,
-            )
-            code_a_spans: list[Span] = []
-            code_b_spans: list[Span] = []
-            for tag, i1, i2, j1, j2 in sequence_matcher.get_opcodes():
-                if tag == "delete" and "\n" not in code_a.plain[i1 : i2 + 1]:
-                    code_a_spans.append(Span(i1, i2, "on $error 40%"))
-
-                if tag == "insert" and "\n" not in code_b.plain[j1 : j2 + 1]:
-                    code_b_spans.append(Span(j1, j2, "on $success 40%"))
-
-            code_a = code_a.add_spans(code_a_spans)
-            code_b = code_b.add_spans(code_b_spans)
-
-            lines_a = code_a.split("\n")
-            lines_b = code_b.split("\n")
-            self._highlighted_code_lines = (lines_a, lines_b)
-        return self._highlighted_code_lines
-
     def get_title(self) -> Content:
         """Get a title for the diff view.
 
@@ -381,8 +467,9 @@ class DiffView(containers.VerticalGroup):
 
     def _check_auto_split(self, width: int):
         if self.auto_split:
-            lines_a, lines_b = self.highlighted_code_lines
-            split_width = max([line.cell_length for line in (lines_a + lines_b)]) * 2
+            diff = self.diff
+            lines_a, lines_b = diff.text_lines
+            split_width = diff.max_line_width * 2
             split_width += 4 + 2 * (
                 max(
                     [
@@ -400,210 +487,198 @@ class DiffView(containers.VerticalGroup):
     async def on_mount(self) -> None:
         self._check_auto_split(self.size.width)
 
+    def _get_code_line(self, side: Side, line_index: int | None) -> Content | None:
+        """Get a highlighted line of code.
+
+        Args:
+            side: Code before (0) or after (1).
+            line_index: Index of the line, or `None` for filler.
+
+        Returns:
+            Highlighted line, or `None` for filler.
+        """
+        if line_index is None:
+            return None
+        return self.diff.get_highlighted_line(side, line_index)
+
+    def _get_text(self, side: Side, line_index: int | None) -> str:
+        """Get the plain text of a line of code.
+
+        Args:
+            side: Code before (0) or after (1).
+            line_index: Index of the line, or `None` for filler.
+
+        Returns:
+            Plain text.
+        """
+        return "" if line_index is None else self.text_lines[side][line_index]
+
+    def _format_number(
+        self, line_index: int | None, annotation: Annotation, width: int
+    ) -> Content:
+        """Format a line number.
+
+        Args:
+            line_index: Index of the line, or `None` if there is no line on this side.
+            annotation: Annotation for the row.
+            width: Width of the widest line number.
+
+        Returns:
+            Content for use in the `LineAnnotations` widget.
+        """
+        if line_index is None:
+            return Content(f" {' ' * width} ").stylize(self.NUMBER_STYLES[annotation])
+        return Content(f" {line_index + 1:>{width}} ").stylize(
+            self.NUMBER_STYLES[annotation]
+        )
+
     def compose_unified(self) -> ComposeResult:
-        lines_a, lines_b = self.highlighted_code_lines
+        LINE_STYLES = self.LINE_STYLES
+        code_width = self.diff.max_line_width
 
         for group in self.grouped_opcodes:
-            line_numbers_a: list[int | None] = []
-            line_numbers_b: list[int | None] = []
-            annotations: list[str] = []
-            code_lines: list[Content | None] = []
-            for tag, i1, i2, j1, j2 in group:
-                if tag == "equal":
-                    for line_offset, line in enumerate(lines_a[i1:i2], 1):
-                        annotations.append(" ")
-                        line_numbers_a.append(i1 + line_offset)
-                        line_numbers_b.append(j1 + line_offset)
-                        code_lines.append(line)
-                    continue
-                if tag in {"replace", "delete"}:
-                    for line_offset, line in enumerate(lines_a[i1:i2], 1):
-                        annotations.append("-")
-                        line_numbers_a.append(i1 + line_offset)
-                        line_numbers_b.append(None)
-                        code_lines.append(line)
-                if tag in {"replace", "insert"}:
-                    for line_offset, line in enumerate(lines_b[j1:j2], 1):
-                        annotations.append("+")
-                        line_numbers_a.append(None)
-                        line_numbers_b.append(j1 + line_offset)
-                        code_lines.append(line)
-
-            NUMBER_STYLES = self.NUMBER_STYLES
-            LINE_STYLES = self.LINE_STYLES
-
-            line_number_width = max(
-                len("" if line_no is None else str(line_no))
-                for line_no in (line_numbers_a + line_numbers_b)
-            )
+            rows = HunkRows(group, split=False)
+            number_width = rows.line_number_width
+
+            def get_number(side: Side, y: int, rows: HunkRows = rows) -> Content:
+                annotation, line_index_a, line_index_b = rows.get_unified_row(y)
+                return self._format_number(
+                    line_index_b if side else line_index_a,
+                    annotation,
+                    rows.line_number_width,
+                )
 
-            with containers.HorizontalGroup(classes="diff-group"):
-                yield LineAnnotations(
-                    [
-                        (
-                            Content(f" {' ' * line_number_width} ")
-                            if line_no is None
-                            else Content(f" {line_no:>{line_number_width}} ")
-                        ).stylize(NUMBER_STYLES[annotation])
-                        for line_no, annotation in zip(line_numbers_a, annotations)
-                    ]
+            def get_annotation(y: int, rows: HunkRows = rows) -> Content:
+                annotation, _, _ = rows.get_unified_row(y)
+                return (
+                    Content(f" {annotation} ")
+                    .stylize(LINE_STYLES[annotation])
+                    .stylize("bold")
                 )
 
+            def get_line(y: int, rows: HunkRows = rows) -> tuple[Content | None, str]:
+                annotation, line_index_a, line_index_b = rows.get_unified_row(y)
+                if line_index_b is None:
+                    line = self._get_code_line(0, line_index_a)
+                else:
+                    line = self._get_code_line(1, line_index_b)
+                return line, LINE_STYLES[annotation]
+
+            def get_text(y: int, rows: HunkRows = rows) -> str:
+                _, line_index_a, line_index_b = rows.get_unified_row(y)
+                if line_index_b is None:
+                    return self._get_text(0, line_index_a)
+                return self._get_text(1, line_index_b)
+
+            with DiffHunk(classes="diff-group"):
                 yield LineAnnotations(
-                    [
-                        (
-                            Content(f" {' ' * line_number_width} ")
-                            if line_no is None
-                            else Content(f" {line_no:>{line_number_width}} ")
-                        ).stylize(NUMBER_STYLES[annotation])
-                        for line_no, annotation in zip(line_numbers_b, annotations)
-                    ]
+                    partial(get_number, 0), rows.height, number_width + 2
                 )
-
                 yield LineAnnotations(
-                    [
-                        (Content(f" {annotation} "))
-                        .stylize(LINE_STYLES[annotation])
-                        .stylize("bold")
-                        for annotation in annotations
-                    ],
-                    classes="annotations",
+                    partial(get_number, 1), rows.height, number_width + 2
+                )
+                yield LineAnnotations(
+                    get_annotation, rows.height, 3, classes="annotations"
                 )
-                code_line_styles = [
-                    LINE_STYLES[annotation] for annotation in annotations
-                ]
                 with DiffScrollContainer():
-                    yield DiffCode(LineContent(code_lines, code_line_styles))
+                    yield DiffCode(get_line, get_text, rows.height, code_width)
 
     def compose_split(self) -> ComposeResult:
-        lines_a, lines_b = self.highlighted_code_lines
+        LINE_STYLES = self.LINE_STYLES
+        NUMBER_STYLES = self.NUMBER_STYLES
+        code_width = self.diff.max_line_width
 
         annotation_hatch = Content.styled("╲" * 3, "$foreground 15%")
         annotation_blank = Content(" " * 3)
 
-        def make_annotation(
-            annotation: Annotation, highlight_annotation: Literal["+", "-"]
-        ) -> Content:
-            """Format an annotation.
+        for group in self.grouped_opcodes:
+            rows = HunkRows(group, split=True)
+            number_width = rows.line_number_width
+            hatch = Content.styled("╲" * (2 + number_width), "$foreground 15%")
 
-            Args:
-                annotation: Annotation to format.
-                highlight_annotation: Annotation to highlight ('+' or '-')
+            def get_number(
+                side: Side, y: int, rows: HunkRows = rows, hatch: Content = hatch
+            ) -> Content:
+                """Format a line number.
 
-            Returns:
-                Content with annotation.
-            """
-            if annotation == highlight_annotation:
-                return (
-                    Content(f" {annotation} ")
-                    .stylize(self.LINE_STYLES[annotation])
-                    .stylize("bold")
-                )
-            if annotation == "/":
-                return annotation_hatch
-            return annotation_blank
+                Args:
+                    side: Code before (0) or after (1).
+                    y: Row index.
 
-        for group in self.grouped_opcodes:
-            line_numbers_a: list[int | None] = []
-            line_numbers_b: list[int | None] = []
-            annotations_a: list[Annotation] = []
-            annotations_b: list[Annotation] = []
-            code_lines_a: list[Content | None] = []
-            code_lines_b: list[Content | None] = []
-            for tag, i1, i2, j1, j2 in group:
-                if tag == "equal":
-                    for line_offset, line in enumerate(lines_a[i1:i2], 1):
-                        annotations_a.append(" ")
-                        annotations_b.append(" ")
-                        line_numbers_a.append(i1 + line_offset)
-                        line_numbers_b.append(j1 + line_offset)
-                        code_lines_a.append(line)
-                        code_lines_b.append(line)
-                else:
-                    if tag in {"replace", "delete"}:
-                        for line_number, line in enumerate(lines_a[i1:i2], i1 + 1):
-                            annotations_a.append("-")
-                            line_numbers_a.append(line_number)
-                            code_lines_a.append(line)
-                    if tag in {"replace", "insert"}:
-                        for line_number, line in enumerate(lines_b[j1:j2], j1 + 1):
-                            annotations_b.append("+")
-                            line_numbers_b.append(line_number)
-                            code_lines_b.append(line)
-                    fill_lists(code_lines_a, code_lines_b, None)
-                    fill_lists(annotations_a, annotations_b, "/")
-                    fill_lists(line_numbers_a, line_numbers_b, None)
-
-            if line_numbers_a or line_numbers_b:
-                line_number_width = max(
-                    0 if line_no is None else len(str(line_no))
-                    for line_no in (line_numbers_a + line_numbers_b)
+                Returns:
+                    Content for use in the `LineAnnotations` widget.
+                """
+                annotation, line_index = rows.get_split_row(y, side)
+                if line_index is None:
+                    return hatch
+                return Content(f" {line_index + 1:>{rows.line_number_width}} ").stylize(
+                    NUMBER_STYLES[annotation]
                 )
-            else:
-                line_number_width = 1
-
-            hatch = Content.styled("╲" * (2 + line_number_width), "$foreground 15%")
 
-            def format_number(line_no: int | None, annotation: str) -> Content:
-                """Format a line number with an annotation.
+            def get_annotation(side: Side, y: int, rows: HunkRows = rows) -> Content:
+                """Format an annotation.
 
                 Args:
-                    line_no: Line number or `None` if there is no line here.
-                    annotation: An annotation string ('+', '-', or ' ')
+                    side: Code before (0) or after (1).
+                    y: Row index.
 
                 Returns:
-                    Content for use in the `LineAnnotations` widget.
+                    Content with annotation.
                 """
-                return (
-                    hatch
-                    if line_no is None
-                    else Content(f" {line_no:>{line_number_width}} ").stylize(
-                        self.NUMBER_STYLES[annotation]
+                annotation, _ = rows.get_split_row(y, side)
+                if annotation == ("+" if side else "-"):
+                    return (
+                        Content(f" {annotation} ")
+                        .stylize(LINE_STYLES[annotation])
+                        .stylize("bold")
                     )
-                )
+                if annotation == "/":
+                    return annotation_hatch
+                return annotation_blank
+
+            def get_line(
+                side: Side, y: int, rows: HunkRows = rows
+            ) -> tuple[Content | None, str]:
+                annotation, line_index = rows.get_split_row(y, side)
+                return self._get_code_line(side, line_index), LINE_STYLES[annotation]
 
-            with containers.HorizontalGroup(classes="diff-group"):
+            def get_text(side: Side, y: int, rows: HunkRows = rows) -> str:
+                _, line_index = rows.get_split_row(y, side)
+                return self._get_text(side, line_index)
+
+            with DiffHunk(classes="diff-group"):
                 # Before line numbers
                 yield LineAnnotations(
-                    starmap(format_number, zip(line_numbers_a, annotations_a))
+                    partial(get_number, 0), rows.height, number_width + 2
                 )
                 # Before annotations
                 yield LineAnnotations(
-                    [make_annotation(annotation, "-") for annotation in annotations_a],
-                    classes="annotations",
-                )
-
-                code_line_styles = [
-                    self.LINE_STYLES[annotation] for annotation in annotations_a
-                ]
-                line_width = max(
-                    line.cell_length
-                    for line in code_lines_a + code_lines_b
-                    if line is not None
+                    partial(get_annotation, 0), rows.height, 3, classes="annotations"
                 )
                 # Before code
                 with DiffScrollContainer() as scroll_container_a:
                     yield DiffCode(
-                        LineContent(code_lines_a, code_line_styles, width=line_width)
+                        partial(get_line, 0),
+                        partial(get_text, 0),
+                        rows.height,
+                        code_width,
                     )
 
                 # After line numbers
                 yield LineAnnotations(
-                    starmap(format_number, zip(line_numbers_b, annotations_b))
+                    partial(get_number, 1), rows.height, number_width + 2
                 )
                 # After annotations
                 yield LineAnnotations(
-                    [make_annotation(annotation, "+") for annotation in annotations_b],
-                    classes="annotations",
+                    partial(get_annotation, 1), rows.height, 3, classes="annotations"
                 )
-
-                code_line_styles = [
-                    self.LINE_STYLES[annotation] for annotation in annotations_b
-                ]
                 # After code
                 with DiffScrollContainer() as scroll_container_b:
                     yield DiffCode(
-                        LineContent(code_lines_b, code_line_styles, width=line_width)
+                        partial(get_line, 1),
+                        partial(get_text, 1),
+                        rows.height,
+                        code_width,
                     )
 
                 # Link scroll containers, so they scroll together
@@ -10,15 +10,23 @@ from textual.reactive import reactive
 from textual.content import Content
 from textual.highlight import highlight, HighlightTheme, TokenType
 from textual.message import Message
+from textual.timer import Timer
 from textual.widgets import TextArea
 from textual.widgets.text_area import Selection
 
 from pygments.token import Token
 
+from toad.incremental_highlight import IncrementalHighlighter
 
 RE_MATCH_FILE_PROMPT = re.compile(r"(@\S+)|@\"(.*)\"")
 RE_SLASH_COMMAND = re.compile(r"(\/\S*)(\W.*)?$")
 
+DEFER_HIGHLIGHT_SIZE = 64 * 1024
+"""Prompts larger than this (in characters) are only fully highlighted when idle."""
+
+DEFER_HIGHLIGHT_DELAY = 0.25
+"""Seconds to wait after the last edit, before highlighting a large prompt."""
+
 
 class TextualHighlightTheme(HighlightTheme):
     """Contains the style definition for user with the highlight method."""
@@ -79,6 +87,13 @@ class HighlightedTextArea(TextArea):
     ):
         self._text_cache: dict[int, Text] = {}
         self._highlight_lines: list[Content] | None = None
+        self._markdown_highlighter = IncrementalHighlighter(
+            "markdown",
+            theme=TextualHighlightTheme,
+            post_process=self._highlight_file_prompts,
+        )
+        self._defer_highlight = False
+        self._highlight_timer: Timer | None = None
         super().__init__(
             text,
             name=name,
@@ -115,9 +130,13 @@ class HighlightedTextArea(TextArea):
 
             language = self.highlight_language
             if language == "markdown":
-                content = self.highlight_markdown(text)
-                content_lines = content.split("\n", allow_blank=True)[:-1]
-                self._highlight_lines = content_lines
+                # A closing fence, so an open fence is highlighted as code
+                lines = [*self.document.lines, "```"]
+                if self._defer_highlight:
+                    content_lines = self._markdown_highlighter.patch(lines)
+                else:
+                    content_lines = self._markdown_highlighter.update(lines)
+                self._highlight_lines = content_lines[:-1]
             elif language == "shell":
                 content = self.highlight_shell(text)
                 content_lines = content.split("\n", allow_blank=True)
@@ -129,22 +148,16 @@ class HighlightedTextArea(TextArea):
     def highlight_slash_command(self, text: str) -> Content:
         return Content.styled(text, "$text-success")
 
-    def highlight_markdown(self, text: str) -> Content:
-        """Highlight markdown content.
+    def _highlight_file_prompts(self, content: Content) -> Content:
+        """Highlight file references (e.g. `@path`) in a line of Markdown.
 
         Args:
-            text: Text containing Markdown.
+            content: A highlighted line.
 
         Returns:
-            Highlighted content.
+            Content with file references highlighted.
         """
-        content = highlight(
-            text + "\n```",
-            language="markdown",
-            theme=TextualHighlightTheme,
-        )
-        content = content.highlight_regex(RE_MATCH_FILE_PROMPT, style="$primary")
-        return content
+        return content.highlight_regex(RE_MATCH_FILE_PROMPT, style="$primary")
 
     def highlight_shell(self, text: str) -> Content:
         """Highlight text with a bash shell command.
@@ -162,6 +175,24 @@ class HighlightedTextArea(TextArea):
     def _on_changed(self) -> None:
         self._highlight_lines = None
         self._text_cache.clear()
+        if (
+            self.highlight_language == "markdown"
+            and len(self.text) > DEFER_HIGHLIGHT_SIZE
+        ):
+            # Edited lines are unhighlighted until typing pauses
+            self._defer_highlight = True
+            if self._highlight_timer is not None:
+                self._highlight_timer.stop()
+            self._highlight_timer = self.set_timer(
+                DEFER_HIGHLIGHT_DELAY, self._highlight_deferred
+            )
+
+    def _highlight_deferred(self) -> None:
+        """Highlight a large prompt, after typing has paused."""
+        self._highlight_timer = None
+        self._defer_highlight = False
+        self._clear_caches()
+        self.refresh()
 
     def get_line(self, line_index: int) -> Text:
         if (cached_line := self._text_cache.get(line_index)) is not None:
@@ -1,7 +1,10 @@
+from functools import partial
 from typing import Iterable
 from textual.widgets import Markdown
 
+from toad.export import ExportBlock
 from toad.menus import MenuItem
+from toad.widgets.timeline import BlockModel
 
 
 class MarkdownNote(Markdown):
@@ -11,3 +14,12 @@ class MarkdownNote(Markdown):
 
     def get_block_content(self, destination: str) -> str | None:
         return self.source
+
+    def get_block_model(self) -> BlockModel | None:
+        return BlockModel(
+            partial(MarkdownNote, self.source, classes=" ".join(self.classes)),
+            export=self.get_block_export(),
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        return ExportBlock("markdown", self.source)
@@ -1,7 +1,10 @@
+from functools import partial
 from typing import Iterable
 from textual.widgets import Static
 
+from toad.export import ExportBlock
 from toad.menus import MenuItem
+from toad.widgets.timeline import BlockModel
 
 
 class Note(Static):
@@ -14,5 +17,14 @@ class Note(Static):
     def get_block_content(self, destination: str) -> str | None:
         return str(self.render())
 
+    def get_block_model(self) -> BlockModel | None:
+        return BlockModel(
+            partial(Note, self.content, classes=" ".join(self.classes)),
+            export=self.get_block_export(),
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        return ExportBlock("note", str(self.render()))
+
     def action_hello(self, message: str) -> None:
         self.notify(message, severity="warning")
@@ -2,12 +2,9 @@ from __future__ import annotations
 
 
 import asyncio
-from functools import lru_cache
-from operator import itemgetter
 import os
 from pathlib import Path
-import re2 as re
-from typing import Sequence
+from typing import Iterable, Sequence
 
 
 from textual import on
@@ -26,36 +23,32 @@ from textual.widget import Widget
 from textual import widgets
 from textual.widgets import OptionList, Input, DirectoryTree
 from textual.widgets.option_list import Option
+from textual.worker import get_current_worker
 
 
-from toad import directory
-from toad.fuzzy import FuzzySearch
+from toad.fuzzy import CandidateTable, FuzzySearch, MatchCancelled, TableMatches
 from toad.messages import Dismiss, InsertPath, PromptSuggestion
 from toad.path_filter import PathFilter
+from toad.project_index import ProjectIndex
+from toad.project_watcher import ProjectChanges
 from toad.widgets.project_directory_tree import ProjectDirectoryTree
 
+STREAM_INTERVAL = 0.5
+"""Seconds between updates of the paths, while the project is first scanned."""
+
 
 class PathFuzzySearch(FuzzySearch):
     @classmethod
-    @lru_cache(maxsize=1024)
-    def get_first_letters(cls, candidate: str) -> frozenset[int]:
-        return frozenset(
-            {
-                0,
-                *[match.start() + 1 for match in re.finditer(r"/", candidate)],
-            }
-        )
-
-    def score(self, candidate: str, positions: Sequence[int]) -> float:
-        """Score a search.
-
-        Args:
-            search: Search object.
-
-        Returns:
-            Score.
-        """
-        first_letters = self.get_first_letters(candidate)
+    def find_first_letters(cls, candidate: str) -> Iterable[int]:
+        # The start of the path, and the start of each component
+        offsets = [0]
+        offset = 0
+        for component in candidate.split("/")[:-1]:
+            offset += len(component) + 1
+            offsets.append(offset)
+        return offsets
+
+    def _score(self, positions: Sequence[int], first_letters: frozenset[int]) -> float:
         # This is a heuristic, and can be tweaked for better results
         # Boost first letter matches
         offset_count = len(positions)
@@ -127,13 +120,15 @@ class PathSearch(containers.VerticalGroup):
         return PathFuzzySearch(case_sensitive=False)
 
     root: var[Path] = var(Path("./"))
-    paths: var[list[Path]] = var(list)
+    paths: var[list[str]] = var(list)
     highlighted_paths: var[list[Content]] = var(list)
     filtered_path_indices: var[list[int]] = var(list)
     loaded = var(False)
     filter = var("")
     fuzzy_search: var[FuzzySearch] = var(Initialize(get_fuzzy_search))
+    candidate_table: var[CandidateTable | None] = var(None)
     show_tree_picker: var[bool] = var(False)
+    project_index: var[ProjectIndex | None] = var(None)
 
     option_list = getters.query_one(OptionList)
     tree_view = getters.query_one(ProjectDirectoryTree)
@@ -142,6 +137,7 @@ class PathSearch(containers.VerticalGroup):
     def __init__(self, root: Path) -> None:
         super().__init__()
         self.root = root
+        self._paths_version: tuple[ProjectIndex, int] | None = None
 
     def compose(self) -> ComposeResult:
         with widgets.ContentSwitcher(initial="path-search-fuzzy"):
@@ -175,8 +171,16 @@ class PathSearch(containers.VerticalGroup):
     def action_switch_picker(self) -> None:
         self.show_tree_picker = not self.show_tree_picker
 
-    async def search(self, search: str) -> None:
+    def search(self, search: str) -> None:
+        """Search the paths, and show the best matches.
+
+        Paths are ranked in a thread, which is cancelled by the next search.
+
+        Args:
+            search: Fuzzy query.
+        """
         if not search:
+            self.workers.cancel_group(self, "rank-paths")
             self.option_list.set_options(
                 [
                     Option(highlighted_path, highlighted_path.plain)
@@ -184,36 +188,62 @@ class PathSearch(containers.VerticalGroup):
                 ],
             )
             return
+        if (candidate_table := self.candidate_table) is None:
+            # Searched again by `make_candidate_table` when ready
+            return
+        self.rank_paths(search, candidate_table, self.highlighted_paths)
+
+    @work(thread=True, exclusive=True, group="rank-paths")
+    def rank_paths(
+        self,
+        search: str,
+        candidate_table: CandidateTable,
+        highlighted_paths: list[Content],
+    ) -> None:
+        """Rank paths by their fuzzy match score.
 
+        Args:
+            search: Fuzzy query.
+            candidate_table: Paths prepared by `make_candidate_table`.
+            highlighted_paths: Paths for display, in the same order as the table.
+        """
+        worker = get_current_worker()
         fuzzy_search = self.fuzzy_search
-        fuzzy_search.cache.grow(len(self.paths))
-        scores: list[tuple[float, Sequence[int], Content]] = [
-            (
-                *fuzzy_search.match(search, highlighted_path.plain),
-                highlighted_path,
-            )
-            for highlighted_path in self.highlighted_paths
-        ]
 
-        scores = sorted(
-            [score for score in scores if score[0]], key=itemgetter(0), reverse=True
-        )
-        scores = scores[:20]
+        def show_best(matches: TableMatches) -> None:
+            """Show the best matches so far."""
+            options = []
+            # Offsets are only required to highlight the paths which are displayed
+            for index, _score in matches.get_best(20):
+                path = highlighted_paths[index]
+                offsets = fuzzy_search.get_table_offsets(search, candidate_table, index)
+                spans = [Span(offset, offset + 1, "underline") for offset in offsets]
+                options.append(Option(path.add_spans(spans), id=path.plain))
+            if not worker.is_cancelled:
+                self.app.call_from_thread(self.show_matches, search, options)
 
-        def highlight_offsets(path: Content, offsets: Sequence[int]) -> Content:
-            return path.add_spans(
-                [Span(offset, offset + 1, "underline") for offset in offsets]
+        try:
+            matches = fuzzy_search.match_table(
+                search,
+                candidate_table,
+                cancelled=lambda: worker.is_cancelled,
+                progress=show_best,
             )
+        except MatchCancelled:
+            return
+        show_best(matches)
 
-        self.option_list.set_options(
-            [
-                Option(
-                    highlight_offsets(path, offsets) if index < 20 else path,
-                    id=path.plain,
-                )
-                for index, (score, offsets, path) in enumerate(scores)
-            ]
-        )
+    def show_matches(self, search: str, options: list[Option]) -> None:
+        """Show ranked paths.
+
+        Args:
+            search: The fuzzy query which was matched.
+            options: Options for the best matches.
+        """
+        if search != self.input.value:
+            # A newer search is running
+            return
+        self.option_list.set_options(options)
         with self.option_list.prevent(OptionList.OptionHighlighted):
             self.option_list.highlighted = 0
         self.post_message(PromptSuggestion(""))
@@ -279,8 +309,8 @@ class PathSearch(containers.VerticalGroup):
             self.post_message(Dismiss(self))
 
     @on(Input.Changed)
-    async def on_input_changed(self, event: Input.Changed):
-        await self.search(event.value)
+    def on_input_changed(self, event: Input.Changed) -> None:
+        self.search(event.value)
 
     @on(OptionList.OptionHighlighted)
     async def on_option_list_changed(self, event: OptionList.OptionHighlighted):
@@ -321,24 +351,87 @@ class PathSearch(containers.VerticalGroup):
 
     @work(exclusive=True)
     async def refresh_paths(self):
-        self.loading = True
+        """Update the paths from the project index (loading the index if required)."""
         root = self.root
+        project_index = self.project_index
+        if project_index is None or project_index.root != root.resolve():
+            self.project_index = project_index = ProjectIndex(root)
+        self.tree_view.project_index = project_index
+        worker = get_current_worker()
+
+        if not project_index.loaded:
+            self.loading = True
+            await asyncio.to_thread(project_index.load)
+        if project_index.directories:
+            # Show the paths from the previous index, while it refreshes
+            await self._update_paths(project_index)
+            self.loading = False
 
         try:
             path_filter = await asyncio.to_thread(self.get_path_filter, root)
             self.tree_view.path_filter = path_filter
             self.tree_view.clear()
             await self.tree_view.reload()
-            paths = await directory.scan(
-                root, path_filter=path_filter, add_directories=True
+            # On the first scan, show paths as they are found
+            found_paths: list[str] | None = (
+                None if project_index.directories else []
             )
-
-            paths = [path.absolute() for path in paths]
-            self.root = root
-            self.paths = paths
+            refresh = asyncio.create_task(
+                asyncio.to_thread(
+                    project_index.refresh,
+                    path_filter,
+                    lambda: worker.is_cancelled,
+                    None if found_paths is None else found_paths.extend,
+                )
+            )
+            while found_paths is not None:
+                await asyncio.wait([refresh], timeout=STREAM_INTERVAL)
+                if refresh.done():
+                    break
+                if len(found_paths) > len(self.paths):
+                    self.paths = found_paths.copy()
+                    self.loading = False
+            await refresh
+            await self._update_paths(project_index)
+            await asyncio.to_thread(project_index.save)
         finally:
             self.loading = False
 
+    async def _update_paths(self, project_index: ProjectIndex) -> None:
+        """Update the paths, if the index has changed since they were set.
+
+        Args:
+            project_index: The project index.
+        """
+        version = (project_index, project_index.version)
+        if version != self._paths_version:
+            self._paths_version = version
+            self.paths = await asyncio.to_thread(project_index.get_paths)
+
+    def project_changed(self, changes: ProjectChanges) -> None:
+        """Update the paths and tree from a project watcher.
+
+        Args:
+            changes: A batch of changes.
+        """
+        if (project_index := self.project_index) is None:
+            return
+        self.update_paths(project_index)
+        if changes.rescanned:
+            self.tree_view.reload()
+        else:
+            self.tree_view.reload_directories(changes.get_directory_paths())
+
+    @work(exclusive=True, group="update-paths")
+    async def update_paths(self, project_index: ProjectIndex) -> None:
+        """Update the paths from the index, and save the index.
+
+        Args:
+            project_index: The project index.
+        """
+        await self._update_paths(project_index)
+        await asyncio.to_thread(project_index.save)
+
     def get_loading_widget(self) -> Widget:
         from textual.widgets import LoadingIndicator
 
@@ -352,21 +445,25 @@ class PathSearch(containers.VerticalGroup):
         content = content.highlight_regex(r"\.[^/]*$", style="italic")
         return content
 
-    def watch_paths(self, paths: list[Path]) -> None:
-        self.option_list.highlighted = None
+    @work(exclusive=True, group="candidate-table")
+    async def make_candidate_table(self, paths: list[str]) -> None:
+        """Prepare the paths for fuzzy search (in a thread).
 
-        def path_display(path: Path) -> str:
-            try:
-                is_directory = path.is_dir()
-            except OSError:
-                is_directory = False
-            if is_directory:
-                return str(path.relative_to(self.root)) + "/"
-            else:
-                return str(path.relative_to(self.root))
-
-        display_paths = sorted(map(path_display, paths), key=str.lower)
+        Args:
+            paths: Paths, in the same order as `highlighted_paths`.
+        """
+        self.candidate_table = await asyncio.to_thread(
+            self.fuzzy_search.make_table, paths
+        )
+        if search := self.input.value:
+            self.search(search)
+
+    def watch_paths(self, paths: list[str]) -> None:
+        self.option_list.highlighted = None
+        display_paths = sorted(paths, key=str.lower)
+        self.candidate_table = None
         self.highlighted_paths = [self.highlight_path(path) for path in display_paths]
+        self.make_candidate_table(display_paths)
         self.option_list.set_options(
             [
                 Option(highlighted_path, id=highlighted_path.plain)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from functools import partial
 
 from textual.app import ComposeResult
 from textual.content import Content
@@ -7,8 +8,10 @@ from textual.reactive import reactive
 from textual import containers
 from textual.widgets import Static
 
+from toad.export import ExportBlock
 from toad.pill import pill
 from toad.widgets.strike_text import StrikeText
+from toad.widgets.timeline import BlockModel
 
 
 class NonSelectableStatic(Static):
@@ -116,6 +119,22 @@ class Plan(containers.Grid):
             ):
                 self.call_after_refresh(strike_text.strike)
 
+    def get_block_model(self) -> BlockModel | None:
+        return BlockModel(
+            partial(Plan, list(self.entries or [])), export=self.get_block_export()
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        entries = [
+            {
+                "content": entry.content.plain,
+                "priority": entry.priority,
+                "status": entry.status,
+            }
+            for entry in self.entries or []
+        ]
+        return ExportBlock("plan", data={"entries": entries})
+
     def render_status(self, status: str) -> Content:
         if status == "completed":
             return Content.from_markup("✔ ")
@@ -1,16 +1,49 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
 from pathlib import Path
+from time import monotonic
 from typing import Iterable
 
 import asyncio
 
+from rich.style import Style
+from rich.text import Text
+
+from textual import getters, work
+from textual.await_complete import AwaitComplete
 from textual.binding import Binding
-from textual.widgets import DirectoryTree
+from textual.widgets import DirectoryTree, Tree
 from textual.widgets.directory_tree import DirEntry
+from textual.widgets.tree import TreeNode
+from textual.worker import get_current_worker
 
+from toad.app import ToadApp
 from toad.path_filter import PathFilter
+from toad.project_index import DIRECTORY, IGNORED, ProjectIndex
+
+PAGE_SIZE = 500
+"""Maximum number of entries to add to a directory node at a time."""
+
+MAX_EXPAND_ALL = 5_000
+"""Maximum number of directories to expand at once."""
+
+CURSOR_INTERVAL = 0.1
+"""Seconds between moving the cursor back to its node, while expanding all."""
+
+
+@dataclass
+class MoreEntries(DirEntry):
+    """Data for a node which loads the remaining entries in a large directory."""
+
+    remaining: list[Path] = field(default_factory=list)
+    """Paths which haven't been added to the tree."""
 
 
 class ProjectDirectoryTree(DirectoryTree):
+    app = getters.app(ToadApp)
+
     BINDINGS = [
         Binding(
             "ctrl+c",
@@ -31,6 +64,10 @@ class ProjectDirectoryTree(DirectoryTree):
         disabled: bool = False,
     ) -> None:
         self._path_filter: PathFilter | None = None
+        self.project_index: ProjectIndex | None = None
+        """Index to list directories from, if they haven't changed since indexing."""
+        self._entry_types: dict[Path, bool] = {}
+        """Loaded paths, and if they are directories."""
         path = Path(path).resolve() if isinstance(path, str) else path.resolve()
         super().__init__(path, name=name, id=id, classes=classes, disabled=disabled)
 
@@ -52,23 +89,228 @@ class ProjectDirectoryTree(DirectoryTree):
         path = path.resolve()
         self._path_filter = await asyncio.to_thread(PathFilter.from_git_root, path)
 
-    def filter_paths(self, paths: Iterable[Path]) -> Iterable[Path]:
-        """Filter the paths before adding them to the tree.
+    def reload_directories(self, directory_paths: Iterable[Path]) -> None:
+        """Reload the loaded nodes for directories whose entries have changed.
 
         Args:
-            paths: The paths to be filtered.
+            directory_paths: Absolute (resolved) paths of changed directories.
+        """
+        directories = set(directory_paths)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.data is None or not node.data.loaded:
+                continue
+            if node.data.path in directories:
+                # Reloads everything beneath the node
+                self.reload_node(node)
+            else:
+                stack.extend(node.children)
+
+    def reload(self) -> AwaitComplete:
+        """Reload the `DirectoryTree` contents.
 
         Returns:
-            The filtered paths.
+            An optionally awaitable that ensures the tree has finished reloading.
+        """
+        self.workers.cancel_group(self, "expand-all")
+        self._entry_types.clear()
+        return super().reload()
+
+    def _safe_is_dir(self, path: Path) -> bool:  # type: ignore[override]
+        """Check if a path is a directory, from its listing if it has been loaded.
 
-        By default this method returns all of the paths provided. To create
-        a filtered `DirectoryTree` inherit from it and implement your own
-        version of this method.
+        Args:
+            path: A path.
+
+        Returns:
+            `True` if the path is a directory.
         """
+        if (is_dir := self._entry_types.get(path)) is not None:
+            return is_dir
+        return DirectoryTree._safe_is_dir(path)
 
-        if (path_filter := self._path_filter) is not None:
-            for path in paths:
-                if not path_filter.match(path):
-                    yield path
+    @work(thread=True, exit_on_error=False)
+    def _load_directory(self, node: TreeNode[DirEntry]) -> list[Path]:
+        """Load the directory contents for a given node.
+
+        Args:
+            node: The node to load the directory contents for.
+
+        Returns:
+            The list of entries within the directory associated with the node.
+        """
+        assert node.data is not None
+        return self._list_directory(node.data.path.expanduser().resolve())
+
+    def _list_directory(self, path: Path) -> list[Path]:
+        """List a directory from the project index, or the directory cache.
+
+        Args:
+            path: Absolute (resolved) path to a directory.
+
+        Returns:
+            Sorted paths of the entries which aren't ignored.
+        """
+        entries: list[tuple[str, bool]]
+        if self.project_index is not None and (
+            listing := self.project_index.list_directory(path)
+        ):
+            # Already filtered
+            entries = [
+                (name, bool(flags & DIRECTORY))
+                for name, flags in listing
+                if not flags & IGNORED
+            ]
         else:
-            yield from paths
+            entries = self.app.directory_cache.list_directory(path).entries
+            if (path_filter := self._path_filter) is not None:
+                entries = [
+                    (name, is_dir)
+                    for name, is_dir in entries
+                    if not path_filter.match(path / name, is_dir)
+                ]
+        # Sorted without a stat per entry, and remembered for `_safe_is_dir`
+        entries.sort(key=lambda entry: (not entry[1], entry[0].lower()))
+        entry_types = self._entry_types
+        paths: list[Path] = []
+        for name, is_dir in entries:
+            paths.append(entry_path := path / name)
+            entry_types[entry_path] = is_dir
+        return paths
+
+    def _populate_node(self, node: TreeNode[DirEntry], content: Iterable[Path]) -> None:
+        """Populate the given tree node with the given directory content.
+
+        Args:
+            node: The Tree node to populate.
+            content: The collection of `Path` objects to populate the node with.
+        """
+        node.remove_children()
+        self._add_page(node, list(content))
+        node.expand()
+
+    def _add_page(self, node: TreeNode[DirEntry], paths: list[Path]) -> None:
+        """Add a page of paths to a node, and a node to load the remaining paths.
+
+        Args:
+            node: A directory node.
+            paths: Paths to add.
+        """
+        is_dir = self._safe_is_dir
+        for path in paths[:PAGE_SIZE]:
+            node.add(path.name, data=DirEntry(path), allow_expand=is_dir(path))
+        if len(remaining := paths[PAGE_SIZE:]):
+            assert node.data is not None
+            node.add(
+                f"… {len(remaining):,} more",
+                data=MoreEntries(node.data.path, remaining=remaining),
+                allow_expand=False,
+            )
+
+    def _load_more(self, node: TreeNode[DirEntry]) -> None:
+        """Replace a node for remaining entries with the next page.
+
+        Args:
+            node: A node with `MoreEntries` data.
+        """
+        assert isinstance(node.data, MoreEntries) and node.parent is not None
+        parent = node.parent
+        node.remove()
+        self._add_page(parent, node.data.remaining)
+
+    def render_label(
+        self, node: TreeNode[DirEntry], base_style: Style, style: Style
+    ) -> Text:
+        if isinstance(node.data, MoreEntries):
+            label = node.label.copy()
+            label.stylize(style)
+            if self.is_mounted:
+                label.stylize_before(
+                    self.get_component_rich_style(
+                        "directory-tree--hidden", partial=True
+                    )
+                )
+            return label
+        return super().render_label(node, base_style, style)
+
+    def on_tree_node_highlighted(self, event: Tree.NodeHighlighted[DirEntry]) -> None:
+        if isinstance(event.node.data, MoreEntries):
+            # Load the next page when the cursor reaches the end
+            self._load_more(event.node)
+
+    async def _on_tree_node_selected(self, event: Tree.NodeSelected[DirEntry]) -> None:
+        if isinstance(event.node.data, MoreEntries):
+            event.stop()
+            event.prevent_default()
+            self._load_more(event.node)
+
+    def action_toggle_expand_all(self) -> None:
+        """Expand or collapse all siblings.
+
+        If all the siblings are collapsed, they are expanded with every directory
+        beneath them (which may be cancelled by toggling again). Otherwise they will
+        all be collapsed.
+        """
+        if (cursor_node := self.cursor_node) is None or cursor_node.parent is None:
+            return
+        siblings = [node for node in cursor_node.siblings if node.allow_expand]
+        if not siblings:
+            return
+        if all(node.is_collapsed for node in siblings):
+            self.expand_all(siblings)
+        else:
+            self.workers.cancel_group(self, "expand-all")
+            for node in siblings:
+                node.collapse()
+        self.call_after_refresh(self.move_cursor, cursor_node, animate=False)
+
+    @work(exclusive=True, group="expand-all")
+    async def expand_all(self, nodes: list[TreeNode[DirEntry]]) -> None:
+        """Expand directory nodes, and every directory beneath them.
+
+        Directories are loaded breadth first, up to a maximum of `MAX_EXPAND_ALL`.
+
+        Args:
+            nodes: Nodes to expand.
+        """
+        worker = get_current_worker()
+        cursor_node = self.cursor_node
+        restore_time = monotonic() + CURSOR_INTERVAL
+
+        def restore_cursor() -> None:
+            """Move the cursor back to its node, as lines are added above it."""
+            if cursor_node is not None:
+                # Lines are only calculated on demand
+                self._tree_lines
+                self.move_cursor(cursor_node, animate=False)
+
+        queue = deque(nodes)
+        try:
+            for _ in range(MAX_EXPAND_ALL):
+                if not queue or worker.is_cancelled:
+                    break
+                node = queue.popleft()
+                if node.data is None or isinstance(node.data, MoreEntries):
+                    continue
+                async with self.lock:
+                    if not node.data.loaded:
+                        node.data.loaded = True
+                        content = await asyncio.to_thread(
+                            self._list_directory, node.data.path.expanduser().resolve()
+                        )
+                        if worker.is_cancelled:
+                            node.data.loaded = False
+                            break
+                        self._populate_node(node, content)
+                    else:
+                        node.expand()
+                    if monotonic() >= restore_time:
+                        restore_cursor()
+                        restore_time = monotonic() + CURSOR_INTERVAL
+                queue.extend(
+                    child for child in node.children if child.allow_expand
+                )
+        finally:
+            async with self.lock:
+                restore_cursor()
@@ -32,6 +32,7 @@ from toad.slash_command import SlashCommand
 from toad.prompt.extract import extract_paths_from_prompt
 from toad.acp.agent import Mode
 from toad.path_complete import PathComplete
+from toad.project_watcher import ProjectChanges
 
 
 class ModeSwitcher(OptionList):
@@ -460,8 +461,25 @@ class Prompt(containers.VerticalGroup):
             self.query_one(ModeInfo).with_tooltip(tooltip).update(mode.name)
         self.watch_modes(self.modes)
 
+    def on_mount(self) -> None:
+        self.app.project_changed_signal.subscribe(self, self.on_project_changed)
+
+    def on_project_changed(self, changes: ProjectChanges) -> None:
+        """Update paths when files in the project are added, removed, or renamed."""
+        if changes.root != self.project_path.resolve():
+            return
+        self.path_search.project_changed(changes)
+        self.prompt_text_area.path_complete.invalidate(
+            None if changes.rescanned else changes.get_directory_paths()
+        )
+
     async def watch_project_path(self) -> None:
         """Initial refresh of paths."""
+        project_index = self.app.get_project_index(self.project_path)
+        self.path_search.project_index = project_index
+        path_complete = self.prompt_text_area.path_complete
+        path_complete.project_index = project_index
+        path_complete.directory_cache = self.app.directory_cache
         self.call_later(self.path_search.refresh_paths)
 
     def ask(self, ask: Ask) -> None:
@@ -614,7 +632,8 @@ class Prompt(containers.VerticalGroup):
 
     def project_directory_updated(self) -> None:
         """Called when there is may be new files"""
-        self.path_search.refresh_paths()
+        if not self.app.is_project_watched(self.project_path):
+            self.path_search.refresh_paths()
 
     @on(PromptTextArea.RequestShellMode)
     def on_request_shell_mode(self, event: PromptTextArea.RequestShellMode):
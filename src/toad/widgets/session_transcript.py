@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+
+from textual import containers
+from textual import getters
+from textual.app import ComposeResult
+from textual.content import Content
+from textual.widget import Widget
+
+from toad.acp import protocol as acp_protocol
+from toad.widgets.conversation import Contents, Window
+from toad.widgets.note import Note
+from toad.widgets.timeline import Timeline
+from toad.widgets.tool_call import ToolCall
+from toad.widgets.user_input import UserInput
+
+if TYPE_CHECKING:
+    from toad.session_store import SessionEvent, SessionPages
+
+
+PAGE_LOAD_MARGIN = 100
+"""Lines from the top or bottom, within which another page is loaded."""
+
+
+def build_session_blocks(events: list[SessionEvent]) -> list[tuple[int, Widget]]:
+    """Build blocks to display recorded events.
+
+    Args:
+        events: Events from a session store.
+
+    Returns:
+        Blocks, in timeline order, with the ID of the first event in each block.
+    """
+    from toad.widgets.agent_response import AgentResponse
+
+    # Tool calls are added as their ID, and built once all updates are applied
+    blocks: list[tuple[int, Widget | str]] = []
+    tool_calls: dict[str, acp_protocol.ToolCall] = {}
+    response: list[str] = []
+    response_id = 0
+
+    def end_response() -> None:
+        if response:
+            blocks.append((response_id, AgentResponse("".join(response))))
+            response.clear()
+
+    for event in events:
+        data = event.data
+        if event.kind == "prompt":
+            end_response()
+            blocks.append((event.id, UserInput(data["text"])))
+        elif event.kind == "shell":
+            end_response()
+            exit_code = data.get("exitCode")
+            note = Note(
+                Content.assemble(
+                    ("$ ", "$text-muted"),
+                    data["command"],
+                    (
+                        ""
+                        if exit_code is None
+                        else (f"  (exit code {exit_code})", "$text-muted")
+                    ),
+                )
+            )
+            blocks.append((event.id, note))
+        elif event.kind == "update":
+            match data:
+                case {
+                    "sessionUpdate": "agent_message_chunk",
+                    "content": {"type": "text", "text": text},
+                }:
+                    if not response:
+                        response_id = event.id
+                    response.append(text)
+                case {
+                    "sessionUpdate": "tool_call" | "tool_call_update",
+                    "toolCallId": tool_call_id,
+                }:
+                    if (tool_call := tool_calls.get(tool_call_id)) is None:
+                        end_response()
+                        tool_call = tool_calls[tool_call_id] = {
+                            "sessionUpdate": "tool_call",
+                            "toolCallId": tool_call_id,
+                            "title": "Tool call",
+                        }
+                        blocks.append((event.id, tool_call_id))
+                    for key, value in data.items():
+                        if value is not None and key != "sessionUpdate":
+                            tool_call[key] = value
+    end_response()
+    return [
+        (event_id, ToolCall(tool_calls[block]) if isinstance(block, str) else block)
+        for event_id, block in blocks
+    ]
+
+
+class SessionTranscript(containers.Vertical):
+    """A read-only transcript of a recorded session.
+
+    Pages are loaded as the transcript scrolls towards the start or end.
+    """
+
+    window = getters.query_one(Window)
+    contents = getters.query_one(Contents)
+
+    def __init__(
+        self,
+        pages: SessionPages,
+        *,
+        id: str | None = None,
+        classes: str | None = None,
+    ) -> None:
+        """
+
+        Args:
+            pages: Pages of the session.
+            id: The ID of the widget in the DOM.
+            classes: The CSS classes for the widget.
+        """
+        self.pages = pages
+        self._timeline: Timeline | None = None
+        self._loading = False
+        self._timeline_update_pending = False
+        super().__init__(id=id, classes=classes)
+
+    def compose(self) -> ComposeResult:
+        with Window():
+            yield Contents()
+
+    @property
+    def timeline(self) -> Timeline:
+        """The timeline, which parks blocks that are far from the viewport."""
+        if self._timeline is None:
+            self._timeline = Timeline(self.window, self.contents)
+        return self._timeline
+
+    async def on_mount(self) -> None:
+        self.watch(self.window, "scroll_y", self._on_window_scroll, init=False)
+        start = self.pages.start
+        if start is None:
+            # Follow the end, until the user scrolls
+            self.window.anchor()
+            await self.load_previous()
+            return
+        events = await asyncio.to_thread(self.pages.load_next)
+        blocks = build_session_blocks(events)
+        await self.contents.mount_all([block for _, block in blocks])
+        # Scroll to the block containing the start event
+        start_block = next(
+            (block for event_id, block in reversed(blocks) if event_id <= start), None
+        )
+        if start_block is not None:
+            self.call_after_refresh(
+                self.window.scroll_to_widget, start_block, animate=False, top=True
+            )
+        self.call_after_refresh(self._check_pages)
+
+    def _on_window_scroll(self) -> None:
+        self.schedule_timeline_update()
+        self._check_pages()
+
+    def _check_pages(self) -> None:
+        """Load another page, if near the start or end of those already loaded."""
+        if self._loading:
+            return
+        window = self.window
+        if window.scroll_y < PAGE_LOAD_MARGIN and not self.pages.exhausted:
+            self.call_later(self.load_previous)
+        elif (
+            window.max_scroll_y - window.scroll_y < PAGE_LOAD_MARGIN
+            and not self.pages.exhausted_next
+        ):
+            self.call_later(self.load_next)
+
+    async def load_previous(self) -> None:
+        """Load the page before the pages already displayed."""
+        if self._loading:
+            return
+        self._loading = True
+        try:
+            events = await asyncio.to_thread(self.pages.load_previous)
+            blocks = build_session_blocks(events)
+            await self.timeline.prepend([block for _, block in blocks])
+            self.schedule_timeline_update()
+        finally:
+            self._loading = False
+        self.call_after_refresh(self._check_pages)
+
+    async def load_next(self) -> None:
+        """Load the page after the pages already displayed."""
+        if self._loading:
+            return
+        self._loading = True
+        try:
+            events = await asyncio.to_thread(self.pages.load_next)
+            blocks = build_session_blocks(events)
+            await self.contents.mount_all([block for _, block in blocks])
+            self.schedule_timeline_update()
+        finally:
+            self._loading = False
+        self.call_after_refresh(self._check_pages)
+
+    def schedule_timeline_update(self) -> None:
+        """Update the timeline after the next refresh."""
+        if not self._timeline_update_pending:
+            self._timeline_update_pending = True
+            self.call_after_refresh(self.update_timeline)
+
+    async def update_timeline(self) -> None:
+        """Park blocks far from the viewport, and rebuild parked blocks near it."""
+        self._timeline_update_pending = False
+        if await self.timeline.update(lambda widget: widget.has_focus_within):
+            self.schedule_timeline_update()
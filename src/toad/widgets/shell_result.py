@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import Iterable
+from functools import partial
+from typing import Iterable, TYPE_CHECKING
 
 from textual.app import ComposeResult
 from textual import containers
@@ -7,8 +8,14 @@ from textual.highlight import highlight
 from textual.widgets import Static
 
 
+from toad.export import ExportBlock
 from toad.menus import MenuItem
+from toad.process_stats import format_duration
 from toad.widgets.non_selectable_label import NonSelectableLabel
+from toad.widgets.timeline import BlockModel
+
+if TYPE_CHECKING:
+    from toad.shell import ShellCommand
 
 
 class ShellResult(containers.HorizontalGroup):
@@ -16,20 +23,69 @@ class ShellResult(containers.HorizontalGroup):
         self,
         command: str,
         *,
+        shell_command: ShellCommand | None = None,
         name: str | None = None,
         id: str | None = None,
         classes: str | None = None,
         disabled: bool = False,
     ) -> None:
         self._command = command
+        self._shell_command = shell_command
         super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        if shell_command is not None:
+            self._update_classes(shell_command)
 
     def compose(self) -> ComposeResult:
         yield NonSelectableLabel("$", id="prompt")
-        yield Static(highlight(self._command, language="sh"))
+        yield Static(highlight(self._command, language="sh"), id="command")
+        yield NonSelectableLabel(self._get_status(), id="status")
+
+    def _get_status(self) -> str:
+        """Get the status text (exit code and duration)."""
+        if (shell_command := self._shell_command) is None:
+            return ""
+        status: list[str] = []
+        if (exit_code := shell_command.exit_code) is not None and exit_code != 0:
+            status.append(f"[{exit_code}]")
+        if (duration := shell_command.duration) is not None:
+            status.append(format_duration(duration))
+        return " ".join(status)
+
+    def _update_classes(self, shell_command: ShellCommand) -> None:
+        exit_code = shell_command.exit_code
+        self.set_class(exit_code == 0, "-success")
+        self.set_class(exit_code != 0, "-error")
+
+    def set_finished(self, shell_command: ShellCommand) -> None:
+        """Show the exit code and duration of the command.
+
+        Args:
+            shell_command: The finished command.
+        """
+        self._shell_command = shell_command
+        self.query_one("#status", NonSelectableLabel).update(self._get_status())
+        self._update_classes(shell_command)
 
     def get_block_menu(self) -> Iterable[MenuItem]:
         yield from ()
 
     def get_block_content(self, destination: str) -> str | None:
         return self._command
+
+    def get_block_model(self) -> BlockModel | None:
+        if self._shell_command is None:
+            # Still running
+            return None
+        return BlockModel(
+            partial(ShellResult, self._command, shell_command=self._shell_command),
+            export=self.get_block_export(),
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        data: dict[str, object] = {}
+        if (shell_command := self._shell_command) is not None:
+            data = {
+                "exitCode": shell_command.exit_code,
+                "duration": shell_command.duration,
+            }
+        return ExportBlock("shell", self._command, data=data)
@@ -1,5 +1,6 @@
 from typing import Iterable
 
+from toad.export import ExportBlock
 from toad.menus import MenuItem
 from toad.widgets.terminal import Terminal
 
@@ -16,3 +17,14 @@ class ShellTerminal(Terminal):
 
     def get_block_content(self, destination: str) -> str | None:
         return "\n".join(line.content.plain for line in self.state.buffer.lines)
+
+    def get_block_export(self) -> ExportBlock | None:
+        if self.state.buffer.is_blank:
+            return None
+        lines = list(self.state.buffer.lines)
+
+        def read() -> Iterable[str]:
+            for line in lines:
+                yield f"{line.content.plain}\n"
+
+        return ExportBlock("shell_output", data={"name": self.name}, read=read)
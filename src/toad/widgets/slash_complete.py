@@ -14,7 +14,7 @@ from textual import containers
 from textual import widgets
 from textual.widgets.option_list import Option
 
-from toad.fuzzy import FuzzySearch
+from toad.fuzzy import CandidateTable, FuzzySearch
 from toad.messages import Dismiss
 from toad.slash_command import SlashCommand
 from toad.visuals.columns import Columns
@@ -69,6 +69,7 @@ class SlashComplete(containers.VerticalGroup):
         super().__init__(id=id, classes=classes)
         self.slash_commands = list(slash_commands) if slash_commands else []
         self.fuzzy_search = FuzzySearch(case_sensitive=False)
+        self._candidate_table: tuple[list[SlashCommand], CandidateTable] | None = None
 
     def compose(self) -> ComposeResult:
         yield widgets.Input(compact=True, placeholder="fuzzy search")
@@ -93,6 +94,25 @@ class SlashComplete(containers.VerticalGroup):
     async def watch_slash_commands(self) -> None:
         self.filter_slash_commands(self.input.value)
 
+    def get_candidate_table(self, slash_commands: list[SlashCommand]) -> CandidateTable:
+        """Get a table of slash commands for fuzzy search.
+
+        Args:
+            slash_commands: Slash commands, sorted from `slash_commands`.
+
+        Returns:
+            A candidate table, built when the slash commands change.
+        """
+        if (
+            self._candidate_table is None
+            or self._candidate_table[0] is not self.slash_commands
+        ):
+            candidate_table = self.fuzzy_search.make_table(
+                [slash_command.command[1:] for slash_command in slash_commands]
+            )
+            self._candidate_table = (self.slash_commands, candidate_table)
+        return self._candidate_table[1]
+
     def filter_slash_commands(self, prompt: str) -> None:
         """Filter slash commands by the given prompt.
 
@@ -106,19 +126,19 @@ class SlashComplete(containers.VerticalGroup):
             self.slash_commands,
             key=lambda slash_command: slash_command.command.casefold(),
         )
-        deduplicated_slash_commands = {
-            slash_command.command: slash_command for slash_command in slash_commands
-        }
-        self.fuzzy_search.cache.grow(len(deduplicated_slash_commands))
 
         if prompt:
             slash_prompt = f"/{prompt}"
+            fuzzy_search = self.fuzzy_search
+            candidate_table = self.get_candidate_table(slash_commands)
+            matches = fuzzy_search.match_table(prompt, candidate_table)
             scores: list[tuple[float, Sequence[int], SlashCommand]] = [
                 (
-                    *self.fuzzy_search.match(prompt, slash_command.command[1:]),
-                    slash_command,
+                    score,
+                    fuzzy_search.get_table_offsets(prompt, candidate_table, index),
+                    slash_commands[index],
                 )
-                for slash_command in slash_commands
+                for index, score in zip(matches.indices, matches.scores)
             ]
 
             scores = sorted(
@@ -116,6 +116,11 @@ class Terminal(ScrollView, can_focus=True):
     def alternate_screen(self) -> bool:
         return self._alternate_screen
 
+    @property
+    def history_height(self) -> int:
+        """Number of rows of history, displayed above the terminal state."""
+        return 0
+
     def notify_style_update(self) -> None:
         """Clear cache when theme chages."""
         self._terminal_render_cache.clear()
@@ -249,14 +254,18 @@ class Terminal(ScrollView, can_focus=True):
             self.finalize()
         width = self.state.width
         height = self.state.scrollback_buffer.height
+        history_height = self.history_height
 
         if self.state.alternate_screen:
             height += self.state.alternate_buffer.height
-        self.virtual_size = Size(min(self.state.buffer.max_line_width, width), height)
+        self.virtual_size = Size(
+            min(self.state.buffer.max_line_width, width), history_height + height
+        )
         if self._anchored and not self._anchor_released:
             self.scroll_y = self.max_scroll_y
 
-        scroll_y = int(self.scroll_y)
+        # Scroll position relative to the terminal state
+        scroll_y = int(self.scroll_y) - history_height
         visible_lines = frozenset(range(scroll_y, scroll_y + height))
 
         if scrollback_delta is None and alternate_delta is None:
@@ -296,9 +305,25 @@ class Terminal(ScrollView, can_focus=True):
 
     def render_line(self, y: int) -> Strip:
         scroll_x, scroll_y = self.scroll_offset
-        strip = self._render_line(scroll_x, scroll_y + y, self._width)
+        y += scroll_y
+        if y < (history_height := self.history_height):
+            return self._render_history_line(scroll_x, y, self._width)
+        strip = self._render_line(scroll_x, y - history_height, self._width)
         return strip
 
+    def _render_history_line(self, x: int, y: int, width: int) -> Strip:
+        """Render a line of history.
+
+        Args:
+            x: Scroll X.
+            y: Line of history.
+            width: Width of strip.
+
+        Returns:
+            A strip.
+        """
+        return Strip.blank(width, self.visual_style.rich_style)
+
     def on_focus(self) -> None:
         self.border_subtitle = "Tap [b]esc[/b] [i]twice[/i] to exit"
 
@@ -1,54 +1,34 @@
 from __future__ import annotations
 
-import asyncio
-from asyncio.subprocess import Process
 import codecs
-import fcntl
+from functools import partial
 import os
-import pty
-import shlex
-from collections import deque
-from dataclasses import dataclass
-import struct
-import termios
-from typing import Mapping
 
+from rich.text import Text
+from textual import events
+from textual.cache import LRUCache
 from textual.content import Content
 from textual.reactive import var
+from textual.strip import Strip
+from textual.timer import Timer
 
-from toad.shell_read import shell_read
+from toad.acp.terminal import Command, TerminalProcess
+from toad.ansi import PlainTextDecoder
+from toad.export import ExportBlock, read_bytes
+from toad.process_stats import ProcessStats
 from toad.widgets.terminal import Terminal
+from toad.widgets.timeline import BlockModel
 
+MAX_SCROLLBACK_LINES = 5000
+"""Maximum lines in the terminal state; older lines are read from the spool."""
 
-@dataclass
-class Command:
-    """A command and corresponding environment."""
-
-    command: str
-    """Command to run."""
-    args: list[str]
-    """List of arguments."""
-    env: Mapping[str, str]
-    """Environment variables."""
-    cwd: str
-    """Current working directory."""
-
-    def __str__(self) -> str:
-        command_str = shlex.join([self.command, *self.args]).strip("'")
-        return command_str
-
-
-@dataclass
-class ToolState:
-    """Current state of the terminal."""
-
-    output: str
-    truncated: bool
-    return_code: int | None = None
-    signal: str | None = None
+PROCESS_STATS_INTERVAL = 1.0
+"""Time (in seconds) between updates of the resources summary."""
 
 
 class TerminalTool(Terminal):
+    """Displays the output of a terminal created by the agent."""
+
     DEFAULT_CSS = """
     TerminalTool {
         height: auto;
@@ -60,9 +40,8 @@ class TerminalTool(Terminal):
 
     def __init__(
         self,
-        command: Command,
+        process: TerminalProcess,
         *,
-        output_byte_limit: int | None = None,
         name: str | None = None,
         id: str | None = None,
         classes: str | None = None,
@@ -76,249 +55,150 @@ class TerminalTool(Terminal):
             disabled=disabled,
             minimum_terminal_width=minimum_terminal_width,
         )
-        self._command = command
-        self._output_byte_limit = output_byte_limit
-        self._command_task: asyncio.Task | None = None
-        self._output: deque[bytes] = deque()
-
-        self._process: Process | None = None
-        self._bytes_read = 0
-        self._output_bytes_count = 0
-        self._shell_fd: int | None = None
-        self._return_code: int | None = None
-        self._released: bool = False
-        self._ready_event = asyncio.Event()
-        self._exit_event = asyncio.Event()
+        self.process = process
+        process.attach_display()
+        self._command = process.command
+        self._history_render_cache: LRUCache[int, Strip] = LRUCache(1024)
+        self._stats_timer: Timer | None = None
+        self.state.max_scrollback_lines = MAX_SCROLLBACK_LINES
 
     @property
     def return_code(self) -> int | None:
         """The command return code, or `None` if not yet set."""
-        return self._return_code
+        return self.process.return_code
 
     @property
-    def released(self) -> bool:
-        """Has the terminal been released?"""
-        return self._released
-
-    @property
-    def tool_state(self) -> ToolState:
-        """Get the current terminal state."""
-        output, truncated = self.get_output()
-        # TODO: report signal
-        return ToolState(
-            output=output, truncated=truncated, return_code=self.return_code
-        )
-
-    @staticmethod
-    def resize_pty(fd: int, columns: int, rows: int) -> None:
-        """Resize the pseudo terminal.
-
-        Args:
-            fd: File descriptor.
-            columns: Columns (width).
-            rows: Rows (height).
-        """
-        # Pack the dimensions into the format expected by TIOCSWINSZ
-        size = struct.pack("HHHH", rows, columns, 0, 0)
-        fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
-
-    async def wait_for_exit(self) -> tuple[int | None, str | None]:
-        """Wait for the terminal process to exit."""
-        if self._process is None or self._command_task is None:
-            return None, None
-        # await self._task
-        await self._exit_event.wait()
-        return (self.return_code or 0, None)
-
-    def kill(self) -> bool:
-        """Kill the terminal process.
-
-        Returns:
-            Returns `True` if the process was killed, or `False` if there
-                was no running process.
-        """
-        if self.return_code is not None:
-            return False
-        if self._process is None:
-            return False
-        try:
-            self._process.kill()
-        except Exception:
-            return False
-        return True
-
-    def release(self) -> None:
-        """Release the terminal (may no longer be used from ACP)."""
-        self._released = True
+    def process_stats(self) -> ProcessStats | None:
+        """Resources used by the process, or `None` if not yet sampled."""
+        return self.process.process_stats
 
     def watch__command(self, command: Command) -> None:
         self.border_title = str(command)
 
-    async def start(self, width: int = 0, height: int = 0) -> None:
-        assert self._command is not None
-
-        self.update_size(width, height)
-        self._command_task = asyncio.create_task(
-            self.run(), name=f"Terminal {self._command}"
+    def on_mount(self) -> None:
+        self.run_worker(self._follow_output(), name="follow output", exclusive=True)
+        self._stats_timer = self.set_interval(
+            PROCESS_STATS_INTERVAL, self._update_process_stats
         )
-        await self._ready_event.wait()
-
-    async def run(self) -> None:
-        try:
-            await self._run()
-        except Exception:
-            from traceback import print_exc
-
-            print_exc()
-        finally:
-            self._exit_event.set()
-
-    async def _run(self) -> None:
-        self._command_task = asyncio.current_task()
 
-        assert self._command is not None
-        master, slave = pty.openpty()
-        self._shell_fd = master
-
-        flags = fcntl.fcntl(master, fcntl.F_GETFL)
-        fcntl.fcntl(master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
-        command = self._command
-        environment = os.environ | command.env
-
-        if " " in command.command:
-            run_command = command.command
-        else:
-            run_command = f"{command.command} {shlex.join(command.args)}"
-
-        shell = os.environ.get("SHELL", "sh")
-        run_command = shlex.join([shell, "-c", run_command])
-
-        try:
-            process = self._process = await asyncio.create_subprocess_shell(
-                run_command,
-                stdin=slave,
-                stdout=slave,
-                stderr=slave,
-                env=environment,
-                cwd=command.cwd,
-            )
-        except Exception as error:
-            self._ready_event.set()
-            print(error)
-            raise
-
-        self._ready_event.set()
-
-        self.resize_pty(
-            master,
-            self._width or 80,
-            self._height or 24,
-        )
-
-        os.close(slave)
-        BUFFER_SIZE = 64 * 1024 * 2
-        reader = asyncio.StreamReader(BUFFER_SIZE)
-        protocol = asyncio.StreamReaderProtocol(reader)
-
-        loop = asyncio.get_event_loop()
-        transport, _ = await loop.connect_read_pipe(
-            lambda: protocol, os.fdopen(master, "rb", 0)
-        )
-        # Create write transport
-        writer_protocol = asyncio.BaseProtocol()
-        write_transport, _ = await loop.connect_write_pipe(
-            lambda: writer_protocol,
-            os.fdopen(os.dup(master), "wb", 0),
-        )
-        self.writer = write_transport
+    async def _follow_output(self) -> None:
+        """Display the process output, until the process exits."""
+        process = self.process
+        output = process.output
+        offset = 0
+        if output.line_count > MAX_SCROLLBACK_LINES:
+            # Skip lines that would be trimmed from the state; they render from the spool
+            first_line = output.line_count - MAX_SCROLLBACK_LINES
+            offset = output.get_line_offset(first_line)
+            self.state.trimmed_lines = first_line
 
         unicode_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
-        try:
-            while True:
-                data = await shell_read(reader, BUFFER_SIZE)
-                if process_data := unicode_decoder.decode(data, final=not data):
-                    self._record_output(data)
-                    if await self.write(process_data):
-                        self.display = True
-                if not data:
-                    break
-        finally:
-            transport.close()
+        while True:
+            data = await process.read(offset)
+            offset += len(data)
+            if process_data := unicode_decoder.decode(data, final=not data):
+                if await self.write(process_data):
+                    self.display = True
+            if not data:
+                break
 
         self.finalize()
-        return_code = self._return_code = await process.wait()
-
-        if return_code == 0:
+        if self._stats_timer is not None:
+            self._stats_timer.stop()
+        self._update_process_stats()
+        if process.return_code == 0:
             self.add_class("-success")
         else:
             self.add_class("-error")
             self.border_title = Content.assemble(
-                f"{command} [{return_code}]",
+                f"{self._command} [{process.signal or process.return_code}]",
             )
 
-    def _record_output(self, data: bytes) -> None:
-        """Keep a record of the bytes left.
+    def update_size(self, width: int, height: int) -> None:
+        super().update_size(width, height)
+        process = self.process
+        columns, rows = process.size
+        # The height of the tool follows its output, so only the columns change
+        if self._width != columns and not process.has_exited:
+            process.resize(self._width, rows)
 
-        Store at most the limit set in self._output_byte_limit (if set).
-
-        """
+    def _update_process_stats(self) -> None:
+        """Update the resources summary."""
+        if (process_stats := self.process_stats) is not None and not self.has_focus:
+            self.border_subtitle = process_stats.summary
 
-        self._output.append(data)
-        self._output_bytes_count += len(data)
-        self._bytes_read += len(data)
+    def on_blur(self, event: events.Blur) -> None:
+        if (process_stats := self.process_stats) is not None:
+            event.prevent_default()
+            self.border_subtitle = process_stats.summary
 
-        if self._output_byte_limit is None:
-            return
-
-        while self._output_bytes_count > self._output_byte_limit and self._output:
-            oldest_bytes = self._output[0]
-            oldest_bytes_count = len(oldest_bytes)
-            if self._output_bytes_count - oldest_bytes_count < self._output_byte_limit:
-                break
-            self._output.popleft()
-            self._output_bytes_count -= oldest_bytes_count
-
-    def get_output(self) -> tuple[str, bool]:
-        """Get the output.
+    @property
+    def history_height(self) -> int:
+        return self.state.trimmed_lines
+
+    def _render_history_line(self, x: int, y: int, width: int) -> Strip:
+        visual_style = self.visual_style
+        if (strip := self._history_render_cache.get(y)) is None:
+            try:
+                line_bytes = self.process.output.get_line(y)
+            except (IndexError, ValueError):
+                return Strip.blank(width, visual_style.rich_style)
+            # Carriage returns overwrite the line (progress bars etc)
+            line_bytes = next(
+                (part for part in reversed(line_bytes.split(b"\r")) if part), b""
+            )
+            line = Content.from_rich_text(
+                Text.from_ansi(line_bytes.decode("utf-8", "replace"))
+            ).expand_tabs(8)
+            strip = Strip(
+                line.render_segments(visual_style), cell_length=line.cell_length
+            )
+            self._history_render_cache[y] = strip
+        strip = strip.crop(x, x + width)
+        strip = strip.adjust_cell_length(width, visual_style.rich_style)
+        return strip
+
+    def get_block_model(self) -> BlockModel | None:
+        if not self.process.has_exited or not self.is_finalized:
+            return None
+        process = self.process
+        terminal_id = self.id
+        minimum_terminal_width = self.minimum_terminal_width
+        # Keep the output while parked
+        process.attach_display()
+
+        def build() -> TerminalTool:
+            terminal_tool = TerminalTool(
+                process,
+                id=terminal_id,
+                minimum_terminal_width=minimum_terminal_width,
+            )
+            process.detach_display()
+            return terminal_tool
+
+        return BlockModel(build, export=self.get_block_export())
+
+    def get_block_export(self) -> ExportBlock | None:
+        process = self.process
+        output = process.output
+        data = {"command": str(process.command), "exitCode": process.return_code}
+        if not process.has_exited:
+            # Still being written to, so copy the recent output now
+            text = PlainTextDecoder().decode(output.tail(output.memory_limit), True)
+            return ExportBlock("terminal", text, data=data)
+        # Complete, so read in chunks when exported (the spool may be on disk)
+        return ExportBlock(
+            "terminal",
+            data=data,
+            read=partial(read_bytes, output.read, 0, output.size, plain_text=True),
+        )
 
-        Returns:
-            A tuple of the output and a bool to indicate if the output was truncated.
-        """
-        output_bytes = b"".join(self._output)
-
-        def is_continuation(byte_value: int) -> bool:
-            """Check if the given byte is a utf-8 continuation byte.
-
-            Args:
-                byte_value: Ordinal of the byte.
-
-            Returns:
-                `True` if the byte is a continuation, or `False` if it is the start of a character.
-            """
-            return (byte_value & 0b11000000) == 0b10000000
-
-        truncated = False
-        if (
-            self._output_byte_limit is not None
-            and len(output_bytes) > self._output_byte_limit
-        ):
-            truncated = True
-            output_bytes = output_bytes[-self._output_byte_limit :]
-            # Must start on a utf-8 boundary
-            # Discard initial bytes that aren't a utf-8 continuation byte.
-            for offset, byte_value in enumerate(output_bytes):
-                if not is_continuation(byte_value):
-                    if offset:
-                        output_bytes = output_bytes[offset:]
-                    break
-
-        output = output_bytes.decode("utf-8", "replace")
-        return output, truncated
+    def on_unmount(self) -> None:
+        self.process.detach_display()
 
 
 if __name__ == "__main__":
-    from textual.app import App, ComposeResult
+    from textual.app import App
 
     command = Command("python", ["mandelbrot.py"], os.environ.copy(), os.curdir)
 
@@ -329,10 +209,9 @@ if __name__ == "__main__":
         }
         """
 
-        def compose(self) -> ComposeResult:
-            yield TerminalTool(command)
-
-        def on_mount(self) -> None:
-            self.query_one(TerminalTool).start()
+        async def on_mount(self) -> None:
+            process = TerminalProcess("terminal-1", command)
+            await process.start()
+            await self.mount(TerminalTool(process))
 
     TApp().run()
@@ -0,0 +1,478 @@
+"""
+A virtualized conversation timeline.
+
+Only blocks near the viewport are mounted as widgets. Blocks further away are *parked*:
+the widget is removed and replaced with a lightweight model which can rebuild it. Runs of
+parked blocks are represented by a single spacer, whose height is calculated from the
+heights recorded for each model (per width), so the scrollbar stays accurate.
+
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Iterable, NamedTuple
+from weakref import WeakKeyDictionary
+
+from textual.geometry import Size
+from textual.widget import Widget
+
+from toad.protocol import ModelProtocol
+
+if TYPE_CHECKING:
+    from toad.export import ExportBlock
+
+KEEP_MARGIN = 1000
+"""Blocks within this many lines of the viewport are mounted."""
+
+PARK_MARGIN = 2000
+"""Blocks further than this many lines from the viewport are parked."""
+
+
+@dataclass
+class BlockModel:
+    """A parked block, which may be rebuilt as a widget."""
+
+    build: Callable[[], Widget]
+    """Callable which builds a new widget."""
+    heights: dict[int, int] = field(default_factory=dict)
+    """Height of the block (including top margin) keyed on width."""
+    export: ExportBlock | None = None
+    """The data to export, so parked blocks may be exported without a rebuild."""
+
+    def get_height(self, width: int) -> int:
+        """Get the height of the block.
+
+        If the block hasn't been laid out at the given width, the height is estimated
+        from the nearest width it has been laid out at.
+
+        Args:
+            width: Width of the timeline.
+
+        Returns:
+            Height in lines.
+        """
+        if (height := self.heights.get(width)) is not None:
+            return height
+        if not self.heights:
+            return 1
+        nearest_width = min(self.heights, key=lambda cached: abs(cached - width))
+        # Text reflows, so the height scales inversely with the width
+        return max(1, self.heights[nearest_width] * nearest_width // max(1, width))
+
+
+class TimelineSpacer(Widget):
+    """Takes the place of a run of parked blocks."""
+
+    DEFAULT_CSS = """
+    TimelineSpacer {
+        height: auto;
+        margin: 0;
+        padding: 0;
+    }
+    """
+
+    ALLOW_SELECT = False
+
+    def __init__(self, models: list[BlockModel], width: int) -> None:
+        """
+
+        Args:
+            models: Parked blocks, in timeline order.
+            width: Width of the timeline.
+        """
+        super().__init__()
+        self.models = models
+        self.spacer_height = sum(model.get_height(width) for model in models)
+
+    def update_height(self, width: int) -> None:
+        """Recalculate the height from the models.
+
+        Args:
+            width: Width of the timeline.
+        """
+        spacer_height = sum(model.get_height(width) for model in self.models)
+        if spacer_height != self.spacer_height:
+            self.spacer_height = spacer_height
+            self.refresh(layout=True)
+
+    def get_content_height(self, container: Size, viewport: Size, width: int) -> int:
+        return self.spacer_height
+
+
+class Placement(NamedTuple):
+    """Position of a child within the timeline."""
+
+    widget: Widget
+    top: int
+    """Top of the widget (including its top margin)."""
+    bottom: int
+    """Bottom of the widget."""
+
+
+class Timeline:
+    """Parks and rebuilds blocks, so that only those near the viewport are mounted."""
+
+    def __init__(
+        self,
+        window: Widget,
+        contents: Widget,
+        *,
+        keep_margin: int = KEEP_MARGIN,
+        park_margin: int = PARK_MARGIN,
+        on_park: Callable[[list[Widget]], None] | None = None,
+    ) -> None:
+        """
+
+        Args:
+            window: The scrolling container.
+            contents: The container with the blocks.
+            keep_margin: Blocks within this many lines of the viewport are mounted.
+            park_margin: Blocks further than this many lines from the viewport are parked.
+            on_park: Callable invoked with blocks before they are parked, or `None`.
+        """
+        assert park_margin >= keep_margin
+        self.window = window
+        self.contents = contents
+        self.keep_margin = keep_margin
+        self.park_margin = park_margin
+        self.on_park = on_park
+        self._models: WeakKeyDictionary[Widget, BlockModel] = WeakKeyDictionary()
+        """Models of mounted blocks which were rebuilt, so heights may be reused."""
+        self._updating = False
+        self._update_required = False
+
+    @property
+    def width(self) -> int:
+        """Width of the timeline."""
+        return self.contents.size.width
+
+    @property
+    def parked_count(self) -> int:
+        """Number of parked blocks."""
+        return sum(len(spacer.models) for spacer in self.spacers)
+
+    @property
+    def spacers(self) -> Iterable[TimelineSpacer]:
+        """Spacers in the timeline."""
+        for child in self.contents.children:
+            if isinstance(child, TimelineSpacer):
+                yield child
+
+    def get_placements(self) -> list[Placement]:
+        """Get the position of displayed children, as arranged by the stream layout.
+
+        Returns:
+            A list of placements, in timeline order.
+        """
+        placements: list[Placement] = []
+        children = self.contents.displayed_children
+        if not children:
+            return placements
+        y = 0
+        previous_margin = children[0].styles.margin.top
+        for child in children:
+            top_margin, _, bottom_margin, _ = child.styles.margin
+            top = y
+            y += max(top_margin, previous_margin)
+            y += child.outer_size.height
+            previous_margin = bottom_margin
+            placements.append(Placement(child, top, y))
+        return placements
+
+    def get_viewport(self) -> tuple[int, int]:
+        """Get the visible lines.
+
+        Returns:
+            A tuple of the top and bottom lines, relative to the timeline.
+        """
+        window = self.window
+        contents_top = self.contents.region.y - window.region.y + int(window.scroll_y)
+        top = int(window.scroll_y) - contents_top
+        return top, top + window.scrollable_content_region.height
+
+    @property
+    def is_following(self) -> bool:
+        """Is the window scrolled to the end, and following new content?
+
+        The window remains anchored after the user scrolls away from the end, but the
+        anchor is released.
+        """
+        window = self.window
+        return window.is_anchored and not window._anchor_released
+
+    def _get_model(self, widget: Widget) -> BlockModel | None:
+        """Get a model for a widget, if it may be parked.
+
+        Args:
+            widget: A mounted block.
+
+        Returns:
+            A model, or `None` if the widget can't be parked.
+        """
+        if not isinstance(widget, ModelProtocol):
+            return None
+        if (model := widget.get_block_model()) is None:
+            return None
+        if (previous_model := self._models.get(widget)) is not None:
+            model.heights.update(previous_model.heights)
+        top_margin = widget.styles.margin.top
+        model.heights[self.width] = widget.outer_size.height + top_margin
+        return model
+
+    async def update(self, is_live: Callable[[Widget], bool]) -> bool:
+        """Park blocks far from the viewport, or rebuild parked blocks near it.
+
+        Placements are only accurate once new blocks have been laid out, so each update
+        either parks or rebuilds. The caller should update again after a refresh, until
+        this method returns `False`.
+
+        Args:
+            is_live: Callable which returns `True` for blocks which must stay mounted.
+
+        Returns:
+            `True` if another update is required.
+        """
+        if self._updating:
+            self._update_required = True
+            return False
+        self._updating = True
+        try:
+            changed = await self._update(is_live)
+        finally:
+            self._updating = False
+        update_required = changed or self._update_required
+        self._update_required = False
+        return update_required
+
+    async def unpark(self, spacer: TimelineSpacer, *, last: bool = True) -> Widget:
+        """Rebuild a single block from the end of a spacer.
+
+        Args:
+            spacer: A spacer in the timeline.
+            last: Rebuild the last block if `True`, otherwise the first block.
+
+        Returns:
+            The rebuilt block.
+        """
+        models = spacer.models
+        model = models.pop() if last else models.pop(0)
+        widget = model.build()
+        self._models[widget] = model
+        if last:
+            await self.contents.mount(widget, after=spacer)
+        else:
+            await self.contents.mount(widget, before=spacer)
+        if models:
+            spacer.update_height(self.width)
+        else:
+            await spacer.remove()
+        return widget
+
+    async def prepend(self, widgets: list[Widget]) -> None:
+        """Mount blocks at the start of the timeline, without moving the viewport.
+
+        Returns once the viewport is restored, so that the layout is up to date for
+        the next call.
+
+        Args:
+            widgets: Blocks to mount, in timeline order.
+        """
+        contents = self.contents
+        if not widgets or not contents.is_attached:
+            return
+        # Regions are stale after a scroll, until the next refresh
+        await contents.wait_for_refresh()
+        view_top, _ = self.get_viewport()
+        anchor = self._get_anchor(self.get_placements(), view_top)
+        if contents.children:
+            await contents.mount_all(widgets, before=contents.children[0])
+        else:
+            await contents.mount_all(widgets)
+        if anchor is not None and not self.is_following:
+            contents.call_after_refresh(self._restore_anchor, *anchor)
+            await contents.wait_for_refresh()
+
+    async def _update(self, is_live: Callable[[Widget], bool]) -> bool:
+        """Park or rebuild blocks.
+
+        Args:
+            is_live: Callable which returns `True` for blocks which must stay mounted.
+
+        Returns:
+            `True` if any blocks were parked or rebuilt.
+        """
+        if not self.contents.is_attached or not (width := self.width):
+            return False
+        for spacer in self.spacers:
+            spacer.update_height(width)
+        view_top, view_bottom = self.get_viewport()
+        placements = self.get_placements()
+        anchor = self._get_anchor(placements, view_top)
+
+        changed = await self._park(
+            placements,
+            view_top - self.park_margin,
+            view_bottom + self.park_margin,
+            is_live,
+        ) or await self._rebuild(
+            placements,
+            view_top - self.keep_margin,
+            view_bottom + self.keep_margin,
+        )
+        if changed and anchor is not None and not self.is_following:
+            self.contents.call_after_refresh(self._restore_anchor, *anchor)
+        return changed
+
+    def _get_anchor(
+        self, placements: list[Placement], view_top: int
+    ) -> tuple[Widget, int] | None:
+        """Get a widget in the viewport, used to restore the scroll position.
+
+        Args:
+            placements: Current placements.
+            view_top: Top line of the viewport.
+
+        Returns:
+            A tuple of the widget and its offset from the top of the viewport.
+        """
+        for widget, top, bottom in placements:
+            if bottom > view_top and not isinstance(widget, TimelineSpacer):
+                return widget, top - view_top
+        return None
+
+    def _restore_anchor(self, widget: Widget, offset: int) -> None:
+        """Scroll so that the anchor widget is at the same position in the viewport.
+
+        Args:
+            widget: Anchor widget.
+            offset: Offset of the widget from the top of the viewport.
+        """
+        if not widget.is_attached or self.is_following:
+            return
+        view_top, _ = self.get_viewport()
+        for placement in self.get_placements():
+            if placement.widget is widget:
+                if (delta := (placement.top - view_top) - offset) != 0:
+                    self.window.scroll_to(
+                        y=self.window.scroll_y + delta, animate=False, immediate=True
+                    )
+                break
+
+    async def _park(
+        self,
+        placements: list[Placement],
+        keep_top: int,
+        keep_bottom: int,
+        is_live: Callable[[Widget], bool],
+    ) -> bool:
+        """Park blocks outside of a range.
+
+        Args:
+            placements: Current placements.
+            keep_top: Top of the range.
+            keep_bottom: Bottom of the range.
+            is_live: Callable which returns `True` for blocks which must stay mounted.
+
+        Returns:
+            `True` if any blocks were parked.
+        """
+        width = self.width
+        # Runs of consecutive blocks to park, with the spacer they merge in to
+        runs: list[tuple[list[Widget], list[BlockModel]]] = []
+        run_widgets: list[Widget] = []
+        run_models: list[BlockModel] = []
+
+        def end_run() -> None:
+            nonlocal run_widgets, run_models
+            if run_models:
+                runs.append((run_widgets, run_models))
+            run_widgets = []
+            run_models = []
+
+        for widget, top, bottom in placements:
+            if isinstance(widget, TimelineSpacer):
+                run_widgets.append(widget)
+                run_models.extend(widget.models)
+                continue
+            if (
+                (bottom < keep_top or top > keep_bottom)
+                and not is_live(widget)
+                and (model := self._get_model(widget)) is not None
+            ):
+                run_widgets.append(widget)
+                run_models.append(model)
+            else:
+                end_run()
+        end_run()
+
+        parked = False
+        contents = self.contents
+        for widgets, models in runs:
+            if len(widgets) == 1 and isinstance(widgets[0], TimelineSpacer):
+                continue
+            parked = True
+            if self.on_park is not None:
+                self.on_park(
+                    [
+                        widget
+                        for widget in widgets
+                        if not isinstance(widget, TimelineSpacer)
+                    ]
+                )
+            spacer = TimelineSpacer(models, width)
+            await contents.mount(spacer, before=widgets[0])
+            await contents.remove_children(widgets)
+        return parked
+
+    async def _rebuild(
+        self, placements: list[Placement], keep_top: int, keep_bottom: int
+    ) -> bool:
+        """Rebuild parked blocks within a range.
+
+        Args:
+            placements: Current placements.
+            keep_top: Top of the range.
+            keep_bottom: Bottom of the range.
+
+        Returns:
+            `True` if any blocks were rebuilt.
+        """
+        width = self.width
+        contents = self.contents
+        rebuilt = False
+        for spacer, top, bottom in placements:
+            if not isinstance(spacer, TimelineSpacer):
+                continue
+            if bottom < keep_top or top > keep_bottom:
+                continue
+            before: list[BlockModel] = []
+            rebuild: list[BlockModel] = []
+            after: list[BlockModel] = []
+            y = top
+            for model in spacer.models:
+                height = model.get_height(width)
+                if y + height < keep_top:
+                    before.append(model)
+                elif y > keep_bottom:
+                    after.append(model)
+                else:
+                    rebuild.append(model)
+                y += height
+            if not rebuild:
+                continue
+            rebuilt = True
+            widgets: list[Widget] = []
+            for model in rebuild:
+                widget = model.build()
+                self._models[widget] = model
+                widgets.append(widget)
+            if after:
+                await contents.mount(TimelineSpacer(after, width), after=spacer)
+            await contents.mount_all(widgets, after=spacer)
+            if before:
+                spacer.models = before
+                spacer.update_height(width)
+            else:
+                await spacer.remove()
+        return rebuilt
@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+from functools import partial
 import re  # re2 doesn't have MULTILINE
 from typing import Iterable
 from rich.text import Text
@@ -10,13 +12,16 @@ from textual import getters
 from textual.content import Content
 from textual.reactive import var
 from textual.css.query import NoMatches
+from textual.message import Message
 from textual import containers
 from textual.widgets import Static, Markdown
 
 from toad.app import ToadApp
 from toad.acp import protocol
+from toad.export import ExportBlock
 from toad.menus import MenuItem
 from toad.pill import pill
+from toad.widgets.timeline import BlockModel
 
 
 class TextContent(Static):
@@ -65,6 +70,16 @@ class ToolCall(containers.VerticalGroup):
     has_content: var[bool] = var(False, toggle_class="-has-content")
     expanded: var[bool] = var(False, toggle_class="-expanded")
 
+    @dataclass
+    class Mounted(Message):
+        """Tool call was mounted (or rebuilt after being parked)."""
+
+        tool_call: "ToolCall"
+
+        @property
+        def control(self) -> "ToolCall":
+            return self.tool_call
+
     def __init__(
         self,
         tool_call: protocol.ToolCall,
@@ -84,6 +99,10 @@ class ToolCall(containers.VerticalGroup):
         self._tool_call = tool_call
         self.refresh(recompose=True)
 
+    def on_mount(self) -> None:
+        if self.id is not None:
+            self.post_message(self.Mounted(self))
+
     def get_block_menu(self) -> Iterable[MenuItem]:
         if self.expanded:
             yield MenuItem("Collapse", "block.collapse", "x")
@@ -99,6 +118,23 @@ class ToolCall(containers.VerticalGroup):
     def get_block_content(self, destination: str) -> str | None:
         return None
 
+    def get_block_model(self) -> BlockModel | None:
+        if self._tool_call.get("status") not in ("completed", "failed"):
+            # May still be updated by the agent
+            return None
+        return BlockModel(
+            partial(ToolCall, self._tool_call, id=self.id),
+            export=self.get_block_export(),
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        tool_call = self._tool_call
+        return ExportBlock(
+            "tool_call",
+            tool_call.get("title") or "Tool call",
+            data={"status": tool_call.get("status"), "toolCall": tool_call},
+        )
+
     def can_expand(self) -> bool:
         return self.has_content
 
@@ -1,10 +1,13 @@
+from functools import partial
 from typing import Iterable
 from textual.app import ComposeResult
 from textual import containers
 from textual.widgets import Markdown
 
+from toad.export import ExportBlock
 from toad.menus import MenuItem
 from toad.widgets.non_selectable_label import NonSelectableLabel
+from toad.widgets.timeline import BlockModel
 
 
 class UserInput(containers.HorizontalGroup):
@@ -21,3 +24,11 @@ class UserInput(containers.HorizontalGroup):
 
     def get_block_content(self, destination: str) -> str | None:
         return self.content
+
+    def get_block_model(self) -> BlockModel | None:
+        return BlockModel(
+            partial(UserInput, self.content), export=self.get_block_export()
+        )
+
+    def get_block_export(self) -> ExportBlock | None:
+        return ExportBlock("prompt", self.content)
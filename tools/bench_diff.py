@@ -0,0 +1,138 @@
+"""
+Compare diff engines on synthetic edits to a 10,000 line file.
+
+"difflib" is the previous approach used by DiffView (a line-level SequenceMatcher for the
+hunks, and a character-level SequenceMatcher over the entire file for intra-line
+highlights). "toad" is `toad.diff` (a line-level diff, with character-level refinement
+only within replaced lines). Syntax highlighting is not included.
+
+The difflib baseline is quadratic, and takes more than ten minutes per edit at 10,000
+lines, so it is compared at 1,000 lines.
+
+Run with:
+
+    uv run python tools/bench_diff.py
+
+"""
+
+import difflib
+import random
+from time import perf_counter
+from typing import Callable
+
+from toad.diff import diff_lines, group_opcodes, refine
+
+LINES = 10_000
+BASELINE_LINES = 1_000
+SEED = 42
+
+
+def make_file(rng: random.Random, line_count: int) -> list[str]:
+    """Generate a Python-like file."""
+    lines: list[str] = []
+    function_no = 0
+    while len(lines) < line_count:
+        function_no += 1
+        lines.append(f"def function_{function_no}(value: int) -> int:")
+        lines.append(f'    """Calculate something for {function_no}."""')
+        for statement in range(rng.randint(3, 12)):
+            lines.append(f"    value = value * {rng.randint(1, 99)} + {statement}")
+        lines.append("    return value")
+        lines.append("")
+        lines.append("")
+    return lines[:line_count]
+
+
+def scattered_edits(rng: random.Random, lines: list[str]) -> list[str]:
+    edited = list(lines)
+    for index in rng.sample(range(len(edited)), 20):
+        edited[index] = edited[index].replace("value", "result") + "  # edited"
+    return edited
+
+
+def insert_block(rng: random.Random, lines: list[str]) -> list[str]:
+    edited = list(lines)
+    position = rng.randrange(len(edited))
+    edited[position:position] = [
+        f"    inserted_{index} = {index}" for index in range(200)
+    ]
+    return edited
+
+
+def delete_block(rng: random.Random, lines: list[str]) -> list[str]:
+    position = rng.randrange(len(lines) // 2)
+    return lines[:position] + lines[position + len(lines) // 20 :]
+
+
+def move_block(rng: random.Random, lines: list[str]) -> list[str]:
+    edited = list(lines)
+    size = len(edited)
+    block = edited[size // 10 : size // 10 + 300]
+    del edited[size // 10 : size // 10 + 300]
+    edited[size * 8 // 10 : size * 8 // 10] = block
+    return edited
+
+
+def rewrite(rng: random.Random, lines: list[str]) -> list[str]:
+    """Every line changed (worst case)."""
+    return [line.replace("value", "number") for line in lines]
+
+
+def difflib_diff(lines_a: list[str], lines_b: list[str]) -> None:
+    sequence_matcher = difflib.SequenceMatcher(
+        lambda character: character in " \t", lines_a, lines_b, autojunk=True
+    )
+    list(sequence_matcher.get_grouped_opcodes())
+    sequence_matcher = difflib.SequenceMatcher(
+        lambda character: character in " \t",
+        "\n".join(lines_a),
+        "\n".join(lines_b),
+        autojunk=True,
+    )
+    sequence_matcher.get_opcodes()
+
+
+def toad_diff(lines_a: list[str], lines_b: list[str]) -> None:
+    opcodes = diff_lines(lines_a, lines_b)
+    group_opcodes(opcodes)
+    refine(lines_a, lines_b, opcodes)
+
+
+def time_diff(
+    diff: Callable[[list[str], list[str]], None],
+    lines_a: list[str],
+    lines_b: list[str],
+) -> float:
+    start = perf_counter()
+    diff(lines_a, lines_b)
+    return perf_counter() - start
+
+
+def main() -> None:
+    edits = [scattered_edits, insert_block, delete_block, move_block, rewrite]
+
+    rng = random.Random(SEED)
+    lines = make_file(rng, BASELINE_LINES)
+    print(f"{BASELINE_LINES} lines")
+    print(f"{'edit':<16} {'difflib':>10} {'toad':>10}")
+    for edit in edits:
+        edited = edit(rng, lines)
+        difflib_time = time_diff(difflib_diff, lines, edited)
+        toad_time = time_diff(toad_diff, lines, edited)
+        print(
+            f"{edit.__name__:<16} {difflib_time * 1000:8.1f}ms {toad_time * 1000:8.1f}ms"
+        )
+
+    rng = random.Random(SEED)
+    lines = make_file(rng, LINES)
+    print()
+    print(f"{LINES} lines")
+    print(f"{'edit':<16} {'toad':>10}")
+    for edit in edits:
+        edited = edit(rng, lines)
+        toad_time = time_diff(toad_diff, lines, edited)
+        print(f"{edit.__name__:<16} {toad_time * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
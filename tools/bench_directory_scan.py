@@ -0,0 +1,144 @@
+"""
+Compare the directory walker with the previous scan, which listed a directory per
+asyncio task with `Path.iterdir`.
+
+Creates a synthetic project in a temporary directory (1,000,000 files by default, pass
+a different number as the first argument), and reports the time for each scan to
+complete, and the time to the first chunk of paths from the walker.
+
+Run with:
+
+    uv run python tools/bench_directory_scan.py [FILES]
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+from itertools import filterfalse
+from pathlib import Path
+import sys
+import tempfile
+from time import perf_counter
+
+from toad.directory import scan_chunks
+from toad.path_filter import PathFilter
+
+FILES = 1_000_000
+FILES_PER_DIRECTORY = 20
+FANOUT = 8
+"""Subdirectories per directory."""
+
+
+def make_project(root: Path, file_count: int) -> None:
+    """Make a tree of directories and files.
+
+    Args:
+        root: Root directory.
+        file_count: Number of files to create.
+    """
+    directories = [root]
+    for index in range(1, max(1, file_count // FILES_PER_DIRECTORY)):
+        directory = directories[(index - 1) // FANOUT] / f"package_{index}"
+        directory.mkdir()
+        directories.append(directory)
+    for directory in directories:
+        for index in range(FILES_PER_DIRECTORY):
+            (directory / f"module_{index}.py").touch()
+
+
+async def legacy_scan(
+    root: Path, path_filter: PathFilter | None, max_simultaneous: int = 5
+) -> list[Path]:
+    """The previous scan (without a time limit).
+
+    Args:
+        root: Root directory to scan.
+        path_filter: Path filter object.
+        max_simultaneous: Maximum number of scan jobs.
+
+    Returns:
+        A list of paths.
+    """
+    queue: asyncio.Queue[Path] = asyncio.Queue()
+    results: list[Path] = []
+
+    def scan_directory(path: Path) -> tuple[list[Path], list[Path]]:
+        try:
+            paths = list(path.iterdir())
+        except IOError:
+            paths = []
+        if path_filter is not None:
+            paths = list(filterfalse(path_filter.match, paths))
+        return (
+            [path for path in paths if not path.is_dir()],
+            [path for path in paths if path.is_dir()],
+        )
+
+    async def run() -> None:
+        while True:
+            try:
+                scan_path = await queue.get()
+            except asyncio.QueueShutDown:
+                break
+            paths, dir_paths = await asyncio.to_thread(scan_directory, scan_path)
+            results.extend(paths)
+            for path in dir_paths:
+                await queue.put(path)
+            queue.task_done()
+
+    await queue.put(root)
+    jobs = [asyncio.create_task(run()) for _ in range(max_simultaneous)]
+    await queue.join()
+    queue.shutdown(immediate=True)
+    await asyncio.gather(*jobs)
+    return results
+
+
+async def walker_scan(
+    root: Path, path_filter: PathFilter | None
+) -> tuple[list[str], float]:
+    """Scan with the walker.
+
+    Args:
+        root: Root directory to scan.
+        path_filter: Path filter object.
+
+    Returns:
+        A list of paths, and the time to the first chunk.
+    """
+    start = perf_counter()
+    first_chunk_time = 0.0
+    paths: list[str] = []
+    async for chunk in scan_chunks(root, path_filter=path_filter):
+        if not paths:
+            first_chunk_time = perf_counter() - start
+        paths.extend(chunk)
+    return paths, first_chunk_time
+
+
+def main() -> None:
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else FILES
+    with tempfile.TemporaryDirectory() as temp_path:
+        root = Path(temp_path) / "project"
+        root.mkdir()
+        print(f"creating {file_count:,} files...")
+        make_project(root, file_count)
+        path_filter = PathFilter.from_git_root(root)
+
+        start = perf_counter()
+        legacy_paths = asyncio.run(legacy_scan(root, path_filter))
+        print(f"legacy scan {perf_counter() - start:6.3f}s {len(legacy_paths):,} files")
+
+        start = perf_counter()
+        paths, first_chunk_time = asyncio.run(walker_scan(root, path_filter))
+        elapsed = perf_counter() - start
+        print(f"walker      {elapsed:6.3f}s {len(paths):,} files")
+        print(f"first chunk {first_chunk_time * 1000:6.1f}ms")
+
+        legacy = {str(path.relative_to(root)) for path in legacy_paths}
+        assert legacy == set(paths), "scans differ"
+
+
+if __name__ == "__main__":
+    main()
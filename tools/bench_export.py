@@ -0,0 +1,104 @@
+"""
+Measure the time and memory to export a long conversation.
+
+Builds the export blocks for a synthetic conversation of 500 turns, each with a prompt,
+a response, a tool call with a diff, and a terminal whose output (100KB) is spooled to
+disk. Reports the time to export to each format, and the peak memory allocated while
+exporting (which should not grow with the size of the conversation).
+
+Run with:
+
+    uv run python tools/bench_export.py
+
+"""
+
+from functools import partial
+from pathlib import Path
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+from toad.export import FORMATS, ExportBlock, export, read_bytes
+from toad.output_spool import OutputSpool
+
+TURNS = 500
+TERMINAL_LINES = 1000
+"""Lines of output per terminal (about 100 bytes each)."""
+
+
+def make_blocks() -> tuple[list[ExportBlock], list[OutputSpool]]:
+    """Make the blocks for a synthetic conversation.
+
+    Returns:
+        The blocks, and the spools which contain the terminal output.
+    """
+    blocks: list[ExportBlock] = []
+    spools: list[OutputSpool] = []
+    code = "".join(f"line_{line} = {line} * 2\n" for line in range(200))
+    for turn in range(TURNS):
+        blocks.append(ExportBlock("prompt", f"Please fix bug number {turn}"))
+        blocks.append(
+            ExportBlock(
+                "response",
+                f"## Bug {turn}\n\n" + "The `parse` function *fails* here. " * 50,
+            )
+        )
+        tool_call = {
+            "title": f"Edit src/module_{turn}.py",
+            "status": "completed",
+            "content": [
+                {
+                    "type": "diff",
+                    "path": f"src/module_{turn}.py",
+                    "oldText": code,
+                    "newText": code.replace("* 2", "* 3", 10),
+                }
+            ],
+        }
+        blocks.append(
+            ExportBlock(
+                "tool_call",
+                tool_call["title"],
+                data={"status": "completed", "toolCall": tool_call},
+            )
+        )
+        spool = OutputSpool(memory_limit=16 * 1024)
+        for line in range(TERMINAL_LINES):
+            output = f"\x1b[32mPASSED\x1b[0m tests/test_{turn}.py::test_{line}\n"
+            spool.write(output.encode())
+        spools.append(spool)
+        blocks.append(
+            ExportBlock(
+                "terminal",
+                data={"command": "pytest", "exitCode": 0},
+                read=partial(read_bytes, spool.read, 0, spool.size),
+            )
+        )
+    return blocks, spools
+
+
+def main() -> None:
+    blocks, spools = make_blocks()
+    print(f"{len(blocks):,} blocks")
+    with tempfile.TemporaryDirectory() as temp_path:
+        for export_format, (extension, _) in FORMATS.items():
+            path = Path(temp_path) / f"export{extension}"
+            start = perf_counter()
+            export(blocks, export_format, path)
+            elapsed = perf_counter() - start
+            # Measured separately, as tracing slows allocations
+            tracemalloc.start()
+            export(blocks, export_format, path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            size = path.stat().st_size
+            print(
+                f"{export_format:<9} {size / 1e6:7.1f}MB in {elapsed:5.2f}s  "
+                f"peak memory {peak / 1e6:5.2f}MB"
+            )
+    for spool in spools:
+        spool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Measure the time to fuzzy match a query against the paths in a large monorepo.
+
+Generates 100,000 deep paths from common words (so letters such as "e", "s", and "/"
+occur many times in each), and reports the time to match queries of increasing length
+against every path, and the slowest single match.
+
+Then generates 500,000 paths, and reports the time to build a candidate table, and to
+match queries against the table (where the character masks reject paths that don't
+contain every letter in the query), with the time until the first partial results are
+reported and the time to pick the top 20 matches. Finally, reports the time to match
+each keystroke as a query is typed, where each query is narrowed from the matches of
+the previous query.
+
+Run with:
+
+    uv run python tools/bench_fuzzy.py
+
+"""
+
+import random
+from time import perf_counter
+
+from toad.fuzzy import TableMatches
+from toad.widgets.path_search import PathFuzzySearch
+
+PATHS = 100_000
+TABLE_PATHS = 500_000
+QUERIES = ["s", "src", "seres", "sersee", "tests/ss", "services/se/test"]
+TABLE_QUERIES = ["kube", "jq", "graphql/sch", "vendor/yaml", "zookeeper"]
+TYPED_QUERIES = [
+    "graphql/sch"[:length] for length in range(1, len("graphql/sch") + 1)
+]
+"""A query typed a letter at a time (then a backspace)."""
+
+WORDS = [
+    "src",
+    "services",
+    "server",
+    "shared",
+    "tests",
+    "resources",
+    "messages",
+    "settings",
+    "sessions",
+    "release",
+    "serializers",
+    "schemas",
+    "utilities",
+    "packages",
+    "features",
+]
+
+RARE_WORDS = ["kubernetes", "graphql", "jquery", "vendor", "yaml", "zookeeper"]
+"""Words which occur in few paths."""
+
+
+def make_paths(rng: random.Random, count: int, rare: float = 0.0) -> list[str]:
+    """Make paths of between 4 and 10 components.
+
+    Args:
+        rng: Random number generator.
+        count: Number of paths.
+        rare: Probability of a path containing a rare word.
+    """
+    paths: list[str] = []
+    for index in range(count):
+        words = rng.choices(WORDS, k=rng.randint(3, 9))
+        if rng.random() < rare:
+            words[rng.randrange(len(words))] = rng.choice(RARE_WORDS)
+        paths.append("/".join(words) + f"/{rng.choice(WORDS)}_{index}.py")
+    return paths
+
+
+def bench_table(paths: list[str]) -> None:
+    """Measure matching against a candidate table."""
+    start = perf_counter()
+    table = PathFuzzySearch().make_table(paths)
+    print(f"built table of {len(table):,} paths in {perf_counter() - start:.2f}s")
+    for query in QUERIES + TABLE_QUERIES:
+        # A new object, so the query isn't narrowed from previous queries
+        fuzzy_search = PathFuzzySearch()
+        first_results: list[float] = []
+
+        def progress(matches: TableMatches) -> None:
+            if not first_results:
+                first_results.append(perf_counter() - start)
+                matches.get_best(20)
+
+        start = perf_counter()
+        matches = fuzzy_search.match_table(query, table, progress=progress)
+        elapsed = perf_counter() - start
+        start = perf_counter()
+        matches.get_best(20)
+        best_elapsed = perf_counter() - start
+        first_result = f"first results {first_results[0]:.2f}s" if first_results else ""
+        print(
+            f"{query!r:<20} {len(matches):>7,} matches  {elapsed:6.2f}s  "
+            f"top 20 in {best_elapsed * 1000:5.1f}ms  {first_result}"
+        )
+
+    print()
+    print("typing, with each query narrowed from the previous query")
+    fuzzy_search = PathFuzzySearch()
+    for query in [*TYPED_QUERIES, TYPED_QUERIES[-2]]:
+        start = perf_counter()
+        matches = fuzzy_search.match_table(query, table)
+        elapsed = perf_counter() - start
+        print(f"{query!r:<20} {len(matches):>7,} matches  {elapsed:6.2f}s")
+
+
+def main() -> None:
+    paths = make_paths(random.Random(1), PATHS)
+    print(f"{PATHS:,} paths, mean length {sum(map(len, paths)) / PATHS:.0f}")
+    for query in QUERIES:
+        # A new object, so the results aren't cached
+        fuzzy_search = PathFuzzySearch()
+        slowest = 0.0
+        matches = 0
+        start = perf_counter()
+        for path in paths:
+            match_start = perf_counter()
+            score, _ = fuzzy_search.match(query, path)
+            slowest = max(slowest, perf_counter() - match_start)
+            matches += bool(score)
+        elapsed = perf_counter() - start
+        print(
+            f"{query!r:<20} {matches:>7,} matches  {elapsed:6.2f}s  "
+            f"({elapsed / PATHS * 1e6:5.1f}µs per path, slowest {slowest * 1000:.1f}ms)"
+        )
+
+    print()
+    bench_table(make_paths(random.Random(2), TABLE_PATHS, rare=0.05))
+
+
+if __name__ == "__main__":
+    main()
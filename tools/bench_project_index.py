@@ -0,0 +1,73 @@
+"""
+Measure the time to load and refresh the project file index.
+
+Creates a synthetic project of 100,000 files (in 10,000 directories) in a temporary
+directory, and reports the time for the first (full) scan, to save the index, to load
+it again (as when Toad starts), to refresh an unchanged project, and to refresh after a
+file is added.
+
+Run with:
+
+    uv run python tools/bench_project_index.py
+
+"""
+
+from pathlib import Path
+import tempfile
+from time import perf_counter
+from typing import Any, Callable
+
+from toad.path_filter import PathFilter
+from toad.project_index import ProjectIndex
+
+DIRECTORIES = 10_000
+FILES_PER_DIRECTORY = 10
+FANOUT = 10
+"""Subdirectories per directory."""
+
+
+def make_project(root: Path) -> None:
+    """Make a tree of directories and files.
+
+    Args:
+        root: Root directory.
+    """
+    directories = [root]
+    for index in range(1, DIRECTORIES):
+        directory = directories[(index - 1) // FANOUT] / f"package_{index}"
+        directory.mkdir()
+        directories.append(directory)
+    for directory in directories:
+        for index in range(FILES_PER_DIRECTORY):
+            (directory / f"module_{index}.py").touch()
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as temp_path:
+        root = Path(temp_path) / "project"
+        root.mkdir()
+        make_project(root)
+        index_path = Path(temp_path) / "files.index"
+        path_filter = PathFilter.from_git_root(root)
+
+        def timed(name: str, function: Callable[..., Any], *args: Any) -> None:
+            start = perf_counter()
+            function(*args)
+            print(f"{name:<24} {perf_counter() - start:6.3f}s")
+
+        project_index = ProjectIndex(root, index_path)
+        timed("full scan", project_index.refresh, path_filter)
+        print(f"{len(project_index.get_paths()):,} paths")
+        timed("save", project_index.save)
+        print(f"index file {index_path.stat().st_size / 1e6:.1f}MB")
+
+        project_index = ProjectIndex(root, index_path)
+        timed("load", project_index.load)
+        timed("get paths", project_index.get_paths)
+        timed("refresh (unchanged)", project_index.refresh, path_filter)
+        (root / "package_1" / "package_11" / "new.py").touch()
+        timed("refresh (one new file)", project_index.refresh, path_filter)
+
+
+if __name__ == "__main__":
+    main()
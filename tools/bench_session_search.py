@@ -0,0 +1,140 @@
+"""
+Measure the time to search a year of recorded sessions.
+
+Records a synthetic history of 250 sessions (a session every working day), each of 100
+turns with a response, tool calls, and a terminal. Reports the time to index it, and the
+time to get the first and a later page of hits for common, rare, prefix, and multi-word
+queries.
+
+Run with:
+
+    uv run python tools/bench_session_search.py
+
+"""
+
+from pathlib import Path
+import random
+import statistics
+import tempfile
+from time import perf_counter
+
+from toad.session_store import SessionStore
+
+SESSIONS = 250
+TURNS = 100
+RESPONSE_CHUNKS = 10
+TOOL_CALLS = 3
+REPEAT = 20
+
+WORDS = [
+    f"{consonant}{vowel}{ending}{suffix}"
+    for consonant in "bcdfghklmnprstvw"
+    for vowel in "aeiou"
+    for ending in ("n", "r", "st", "ck", "mp", "ll")
+    for suffix in ("", "ing", "er", "ed", "s")
+]
+"""A vocabulary of 2,400 words."""
+
+QUERIES = [
+    ("common word", WORDS[0]),
+    ("rare word", "zebrafish"),
+    ("prefix", "ba"),
+    ("two words", f"{WORDS[1]} {WORDS[2]}"),
+    ("command", "pytest"),
+]
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    """Make text with a Zipfian distribution of words."""
+    return " ".join(
+        WORDS[min(int(rng.paretovariate(1.0)) - 1, len(WORDS) - 1)]
+        if rng.random() < 0.5
+        else rng.choice(WORDS)
+        for _ in range(words)
+    )
+
+
+def record_history(store: SessionStore, rng: random.Random) -> int:
+    """Record a synthetic history.
+
+    Returns:
+        The number of events.
+    """
+    event_count = 0
+    for session_index in range(SESSIONS):
+        session = store.new_session(f"/projects/project-{session_index % 7}", "bench")
+        for turn in range(TURNS):
+            session.record("prompt", {"text": make_text(rng, 30)})
+            for chunk in range(RESPONSE_CHUNKS):
+                session.record(
+                    "update",
+                    {
+                        "sessionUpdate": "agent_message_chunk",
+                        "content": {"type": "text", "text": make_text(rng, 20)},
+                    },
+                )
+            for tool_index in range(TOOL_CALLS):
+                tool_call_id = f"call-{turn}-{tool_index}"
+                session.record(
+                    "update",
+                    {
+                        "sessionUpdate": "tool_call",
+                        "toolCallId": tool_call_id,
+                        "title": f"Read src/{rng.choice(WORDS)}.py",
+                        "status": "pending",
+                    },
+                )
+                session.record(
+                    "update",
+                    {
+                        "sessionUpdate": "tool_call_update",
+                        "toolCallId": tool_call_id,
+                        "status": "completed",
+                    },
+                )
+            session.record(
+                "terminal",
+                {
+                    "command": "pytest -q" if turn % 10 == 0 else "ls -al",
+                    "output": make_text(rng, 50),
+                },
+            )
+            session.record("stop", {"stopReason": "end_turn"})
+            event_count += 2 + RESPONSE_CHUNKS + TOOL_CALLS * 2 + 1
+    # A single occurrence of a rare word
+    session.record("prompt", {"text": "Where did the zebrafish go?"})
+    return event_count + 1
+
+
+def main() -> None:
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as temp_path:
+        store = SessionStore(Path(temp_path) / "sessions.db")
+        start = perf_counter()
+        event_count = record_history(store, rng)
+        store.flush()
+        elapsed = perf_counter() - start
+        (documents,) = store._read("SELECT count(*) FROM search", ())[0]
+        print(f"{event_count:,} events, {documents:,} documents")
+        print(
+            f"recorded and indexed in {elapsed:.1f}s "
+            f"({elapsed / event_count * 1e6:.1f}µs per event)"
+        )
+        print()
+        for label, query in QUERIES:
+            for offset in (0, 500):
+                timings: list[float] = []
+                for _ in range(REPEAT):
+                    start = perf_counter()
+                    hits = store.search(query, 50, offset)
+                    timings.append(perf_counter() - start)
+                print(
+                    f"{label:<12} {query!r:<22} offset {offset:<4} "
+                    f"{len(hits):>3} hits  "
+                    f"median {statistics.median(timings) * 1000:7.2f}ms"
+                )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measure the cost of recording session events, and of reading a session back by page.
+
+Records a synthetic session of 100,000 events (message chunks, with a tool call and
+updates every 20 events). Reports the time `record` takes on the calling thread (which
+is the event loop in the app), the time for the background writer to catch up, and the
+time to read pages.
+
+Run with:
+
+    uv run python tools/bench_session_store.py
+
+"""
+
+from pathlib import Path
+import statistics
+import tempfile
+from time import perf_counter
+
+from toad.session_store import SessionPages, SessionStore
+
+EVENTS = 100_000
+TURN_EVENTS = 200
+"""Events per turn (each turn starts with a prompt)."""
+
+
+def make_event(index: int) -> tuple[str, dict]:
+    """Make a plausible event."""
+    if index % TURN_EVENTS == 0:
+        return "prompt", {"text": f"Prompt number {index // TURN_EVENTS}"}
+    if index % 20 == 0:
+        return "update", {
+            "sessionUpdate": "tool_call",
+            "toolCallId": f"call-{index}",
+            "title": "Read file",
+            "kind": "read",
+            "status": "pending",
+            "locations": [{"path": f"src/module_{index}.py"}],
+        }
+    if index % 20 < 4:
+        return "update", {
+            "sessionUpdate": "tool_call_update",
+            "toolCallId": f"call-{index - index % 20}",
+            "status": "completed",
+            "content": [
+                {"type": "content", "content": {"type": "text", "text": "x" * 500}}
+            ],
+        }
+    return "update", {
+        "sessionUpdate": "agent_message_chunk",
+        "content": {"type": "text", "text": f"Some text from the agent {index} "},
+    }
+
+
+def main() -> None:
+    events = [make_event(index) for index in range(EVENTS)]
+    with tempfile.TemporaryDirectory() as temp_path:
+        store = SessionStore(Path(temp_path) / "sessions.db")
+        session = store.new_session(temp_path, "bench")
+
+        timings: list[float] = []
+        start = perf_counter()
+        for kind, data in events:
+            record_start = perf_counter()
+            session.record(kind, data)
+            timings.append(perf_counter() - record_start)
+        record_time = perf_counter() - start
+        store.flush()
+        total_time = perf_counter() - start
+
+        timings.sort()
+        print(f"{EVENTS:,} events")
+        print(f"record (caller)  mean {statistics.mean(timings) * 1e6:6.2f}µs")
+        p99 = timings[int(len(timings) * 0.99)]
+        print(f"                 p99  {p99 * 1e6:6.2f}µs")
+        print(f"                 max  {timings[-1] * 1e6:6.2f}µs")
+        print(f"record total     {record_time * 1000:8.1f}ms")
+        print(
+            f"written          {total_time * 1000:8.1f}ms "
+            f"({total_time / EVENTS * 1e6:.2f}µs per event)"
+        )
+
+        pages = SessionPages(store, session.key)
+        page_timings: list[float] = []
+        page_events = 0
+        while True:
+            start = perf_counter()
+            page = pages.load_previous()
+            page_timings.append(perf_counter() - start)
+            if not page:
+                break
+            page_events += len(page)
+        assert page_events == EVENTS
+        print(
+            f"read page        mean {statistics.mean(page_timings) * 1000:6.2f}ms "
+            f"({len(page_timings) - 1} pages)"
+        )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Measure latency from terminal create to first output, with and without the PTY pool.
+
+Run with:
+
+    uv run python tools/bench_terminal_pool.py
+
+"""
+
+import asyncio
+import os
+import pty
+import shlex
+import statistics
+from time import perf_counter
+
+from toad.pty_pool import PTYPool
+
+COMMAND = "echo hello"
+RUNS = 100
+PAUSE = 0.2
+"""Pause between commands, as there would be between agent tool calls."""
+
+
+async def first_output(master: int) -> None:
+    """Wait for the first output on a master file descriptor."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(master, ready.set_result, None)
+    try:
+        await ready
+    finally:
+        loop.remove_reader(master)
+
+
+def run_command() -> str:
+    shell = os.environ.get("SHELL", "sh")
+    return shlex.join([shell, "-c", COMMAND])
+
+
+async def unpooled() -> float:
+    start = perf_counter()
+    master, slave = pty.openpty()
+    process = await asyncio.create_subprocess_shell(
+        run_command(), stdin=slave, stdout=slave, stderr=slave
+    )
+    os.close(slave)
+    await first_output(master)
+    elapsed = perf_counter() - start
+    await process.wait()
+    os.close(master)
+    return elapsed
+
+
+async def pooled(pool: PTYPool) -> float:
+    start = perf_counter()
+    pooled_terminal = await pool.acquire()
+    pooled_terminal.exec(COMMAND, os.getcwd(), {})
+    await first_output(pooled_terminal.master)
+    elapsed = perf_counter() - start
+    await pooled_terminal.process.wait()
+    os.close(pooled_terminal.master)
+    return elapsed
+
+
+def report(name: str, timings: list[float]) -> None:
+    quantiles = statistics.quantiles(timings, n=100)
+    p50 = quantiles[49] * 1000
+    p95 = quantiles[94] * 1000
+    print(f"{name:<10} p50={p50:6.2f}ms  p95={p95:6.2f}ms")
+
+
+async def main() -> None:
+    unpooled_timings: list[float] = []
+    for _ in range(RUNS):
+        await asyncio.sleep(PAUSE)
+        unpooled_timings.append(await unpooled())
+
+    pool = PTYPool(minimum=4)
+    pool.fill()
+    pooled_timings: list[float] = []
+    for _ in range(RUNS):
+        await asyncio.sleep(PAUSE)
+        pooled_timings.append(await pooled(pool))
+    pool.close()
+
+    report("unpooled", unpooled_timings)
+    report("pooled", pooled_timings)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Measure the cost of routing tool call updates to their widgets, for a session with
+2,000 tool calls.
+
+Compares a lookup in the DOM (`get_child_by_id`, with `NoMatches` for new tool calls)
+against the registry used by the conversation. Only the lookups are timed; the widgets
+are the same in both cases.
+
+Run with:
+
+    uv run python tools/bench_tool_calls.py
+
+"""
+
+import asyncio
+import statistics
+from time import perf_counter
+
+from textual.app import App, ComposeResult
+from textual import containers
+from textual.css.query import NoMatches
+from textual.widgets import Static
+
+TOOL_CALLS = 2000
+UPDATES = 4
+"""Updates per tool call (after the initial tool call)."""
+
+
+class Contents(containers.VerticalGroup):
+    pass
+
+
+class BenchApp(App):
+    def compose(self) -> ComposeResult:
+        yield Contents()
+
+
+def session() -> list[str]:
+    """Tool call IDs, in the order they are received."""
+    tool_ids: list[str] = []
+    for index in range(TOOL_CALLS):
+        tool_ids.extend([f"tool-{index}"] * (UPDATES + 1))
+    return tool_ids
+
+
+async def dom_lookup(contents: Contents, tool_ids: list[str]) -> list[float]:
+    timings: list[float] = []
+    for tool_id in tool_ids:
+        start = perf_counter()
+        try:
+            widget = contents.get_child_by_id(tool_id, Static)
+        except NoMatches:
+            timings.append(perf_counter() - start)
+            await contents.mount(Static(tool_id, id=tool_id))
+        else:
+            timings.append(perf_counter() - start)
+            widget.update(tool_id)
+    return timings
+
+
+async def registry_lookup(contents: Contents, tool_ids: list[str]) -> list[float]:
+    registry: dict[str, Static] = {}
+    timings: list[float] = []
+    for tool_id in tool_ids:
+        start = perf_counter()
+        widget = registry.get(tool_id)
+        timings.append(perf_counter() - start)
+        if widget is None:
+            registry[tool_id] = widget = Static(tool_id, id=tool_id)
+            await contents.mount(widget)
+        else:
+            widget.update(tool_id)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    quantiles = statistics.quantiles(timings, n=100)
+    p50 = quantiles[49] * 1_000_000
+    p95 = quantiles[94] * 1_000_000
+    total = sum(timings) * 1000
+    print(f"{name:<10} p50={p50:6.2f}µs  p95={p95:6.2f}µs  total={total:7.2f}ms")
+
+
+async def main() -> None:
+    tool_ids = session()
+    app = BenchApp()
+    async with app.run_test():
+        contents = app.query_one(Contents)
+        dom_timings = await dom_lookup(contents, tool_ids)
+        await contents.remove_children()
+        registry_timings = await registry_lookup(contents, tool_ids)
+
+    print(f"{TOOL_CALLS} tool calls, {len(tool_ids)} updates")
+    report("dom", dom_timings)
+    report("registry", registry_timings)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
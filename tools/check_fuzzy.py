@@ -0,0 +1,127 @@
+"""
+Check the fuzzy matcher finds the best score, by comparing it with an exhaustive search.
+
+Generates random queries and candidates from a small alphabet (so there are many
+possible alignments), and checks `FuzzySearch.match` and `PathFuzzySearch.match` (and
+a search which overrides `score`) return the same score as scoring every alignment of
+the query, and that matching a table of candidates agrees. Then types random queries,
+and checks the matches narrowed from cached queries are the same as matching every
+candidate. Exits with a non-zero status on the first difference.
+
+Run with:
+
+    uv run python tools/check_fuzzy.py
+
+"""
+
+from itertools import combinations
+import random
+import sys
+from typing import Sequence
+
+from toad.fuzzy import FuzzySearch
+from toad.widgets.path_search import PathFuzzySearch
+
+CASES = 20_000
+NARROWING_CASES = 2_000
+ALPHABET = "abe/_-. sA"
+SEED = 41
+
+
+class WeightedFuzzySearch(FuzzySearch):
+    """Overrides the public `score` hook, weighting first letters more heavily."""
+
+    def score(self, candidate: str, positions: Sequence[int]) -> float:
+        first_letters = self.get_first_letters(candidate)
+        groups = 1 + sum(
+            offset != previous + 1 for previous, offset in zip(positions, positions[1:])
+        )
+        return 3 * len(first_letters.intersection(positions)) + 10 - groups
+
+
+def exhaustive_score(fuzzy_search: FuzzySearch, query: str, candidate: str) -> float:
+    """Get the best score by scoring every alignment of the query.
+
+    Args:
+        fuzzy_search: Fuzzy search object, which scores alignments.
+        query: The fuzzy query.
+        candidate: A candidate to check.
+
+    Returns:
+        The best score, or 0 for no match.
+    """
+    if not fuzzy_search.case_sensitive:
+        query = query.lower()
+        candidate = candidate.lower()
+    best_score = 0.0
+    for positions in combinations(range(len(candidate)), len(query)):
+        if all(candidate[offset] == letter for offset, letter in zip(positions, query)):
+            best_score = max(best_score, fuzzy_search.score(candidate, positions))
+    return best_score
+
+
+def main() -> None:
+    rng = random.Random(SEED)
+    fuzzy_searches = [
+        FuzzySearch(),
+        FuzzySearch(case_sensitive=True),
+        PathFuzzySearch(),
+        WeightedFuzzySearch(),
+    ]
+    for case in range(CASES):
+        candidate = "".join(rng.choices(ALPHABET, k=rng.randint(0, 16)))
+        query = "".join(rng.choices(ALPHABET, k=rng.randint(1, 5)))
+        for fuzzy_search in fuzzy_searches:
+            score, offsets = fuzzy_search.match(query, candidate)
+            expected = exhaustive_score(fuzzy_search, query, candidate)
+            if abs(score - expected) > 1e-9:
+                print(
+                    f"{type(fuzzy_search).__name__} {query!r} in {candidate!r}: "
+                    f"score {score}, expected {expected}"
+                )
+                sys.exit(1)
+            # Matching a table (with the character mask prefilter) must agree
+            table_matches = fuzzy_search.match_table(
+                query, fuzzy_search.make_table([candidate])
+            )
+            table_score = table_matches.scores[0] if table_matches else 0.0
+            assert abs(table_score - score) < 1e-9, (query, candidate)
+            if score:
+                # The offsets must be an alignment with the reported score
+                folded = candidate if fuzzy_search.case_sensitive else candidate.lower()
+                letters = query if fuzzy_search.case_sensitive else query.lower()
+                assert list(offsets) == sorted(set(offsets))
+                assert "".join(folded[offset] for offset in offsets) == letters
+                assert abs(fuzzy_search.score(folded, offsets) - score) < 1e-9
+    print(f"{CASES:,} cases, scores identical to exhaustive search")
+    check_narrowing(rng)
+    print(f"{NARROWING_CASES:,} typed queries, narrowed matches identical")
+
+
+def check_narrowing(rng: random.Random) -> None:
+    """Check matches narrowed from the previous query are the same as a new search.
+
+    Args:
+        rng: Random number generator.
+    """
+    for _ in range(NARROWING_CASES):
+        candidates = [
+            "".join(rng.choices(ALPHABET, k=rng.randint(0, 16))) for _ in range(100)
+        ]
+        narrowing_search = PathFuzzySearch(table_cache_size=rng.choice([50, 10_000]))
+        table = narrowing_search.make_table(candidates)
+        query = ""
+        for _ in range(6):
+            # Type a character, or occasionally delete one
+            if query and rng.random() < 0.2:
+                query = query[:-1]
+            else:
+                query += rng.choice(ALPHABET)
+            narrowed = narrowing_search.match_table(query, table)
+            expected = PathFuzzySearch().match_table(query, table)
+            assert list(narrowed.indices) == list(expected.indices), query
+            assert list(narrowed.scores) == list(expected.scores), query
+
+
+if __name__ == "__main__":
+    main()
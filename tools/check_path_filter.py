@@ -0,0 +1,109 @@
+"""
+Check the path filter agrees with git, by comparing it with `git ls-files`.
+
+Generates random trees of files and directories in a temporary git repository, with
+.gitignore files (of patterns, negated patterns, anchored, and directory patterns) at
+random depths, and checks `PathFilter.match` ignores the same files as git. The files
+git doesn't ignore are those listed by `git ls-files -o --exclude-standard`, which
+(unlike `git check-ignore`) accounts for directories which are excluded. Exits with a
+non-zero status on the first difference.
+
+Requires git. Run with:
+
+    uv run python tools/check_path_filter.py
+
+"""
+
+from pathlib import Path
+import random
+import subprocess
+import sys
+import tempfile
+
+from toad.path_filter import PathFilter
+
+CASES = 200
+SEED = 48
+NAMES = ["src", "build", "a", "b", "keep", "x.log", "y.py", "z.txt"]
+PATTERNS = [
+    "build",
+    "build/",
+    "/build",
+    "a/b",
+    "*.log",
+    "!keep",
+    "!keep/",
+    "!x.log",
+    "*.py",
+    "!y.py",
+    "b/*",
+    "**/a",
+    "src/**/z.txt",
+    "!*.txt",
+    "keep",
+    "b/**",
+    "!b/z.txt",
+]
+
+
+def make_tree(root: Path, random: random.Random, depth: int = 0) -> None:
+    """Make a random tree of files and directories, with .gitignore files.
+
+    Args:
+        root: Directory to populate.
+        random: Random number generator.
+        depth: Depth of the directory.
+    """
+    if random.random() < 0.5:
+        patterns = random.sample(PATTERNS, random.randint(1, 4))
+        (root / ".gitignore").write_text("\n".join(patterns) + "\n")
+    for name in random.sample(NAMES, random.randint(1, 5)):
+        path = root / name
+        if depth < 3 and random.random() < 0.5:
+            path.mkdir()
+            make_tree(path, random, depth + 1)
+        else:
+            path.touch()
+
+
+def main() -> None:
+    generator = random.Random(SEED)
+    for case in range(CASES):
+        with tempfile.TemporaryDirectory() as temp_path:
+            repository = Path(temp_path).resolve()
+            subprocess.run(["git", "init", "-q"], cwd=repository, check=True)
+            make_tree(repository, generator)
+            # Filter a subdirectory, to check the .gitignore files above it
+            root = next(
+                (path for path in sorted(repository.iterdir()) if path.name == "src"),
+                repository,
+            )
+            paths = sorted(
+                path
+                for path in root.rglob("*")
+                if path.is_file()
+                and ".git" not in path.relative_to(repository).parts
+            )
+            relative_paths = [str(path.relative_to(repository)) for path in paths]
+            result = subprocess.run(
+                ["git", "ls-files", "-z", "--others", "--exclude-standard"],
+                cwd=repository,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            git_included = set(result.stdout.split("\0"))
+            path_filter = PathFilter.from_git_root(root)
+            for path, relative_path in zip(paths, relative_paths):
+                ignored = path_filter.match(path)
+                if ignored == (relative_path in git_included):
+                    print(f"case {case}: {relative_path} ignored={ignored}")
+                    for ignore_path in sorted(repository.rglob(".gitignore")):
+                        print(ignore_path.relative_to(repository))
+                        print(ignore_path.read_text())
+                    sys.exit(1)
+    print(f"{CASES} trees OK")
+
+
+if __name__ == "__main__":
+    main()